@@ -1,40 +1,321 @@
 from __future__ import annotations
 
-from typing import List, Optional, Dict, Any
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
-from .embeddings import embed_texts, top_k_similar
-from .models import LLMClient, LLMConfig
+import numpy as np
+
+from .chunking import chunk_text
+from .context import CONTEXT_CANDIDATES, CONTEXT_WEB_CHUNKS, Candidate, pack_context
+from .embeddings import embed_texts
+from .metrics import Trace, timed
+from .models import LLMClient
 from .prompts import build_generation_prompt, DEFAULT_CATEGORIES, SYSTEM_PROMPT
-from .storage import load_index
-from .web import web_search, fetch_page_text
+from .response_cache import exact_key, get_response_cache, semantic_scope
+from .routing import LLMRouter
+from .storage import DEFAULT_NAMESPACE, RETRIEVAL_DEPTH, get_index, normalize_namespace
+from .web import WEB_RESEARCH_BUDGET, fetch_pages, web_search
+
+# "single" asks for every category in one completion; "per_category" issues one
+# request per group of GENERATION_GROUP_SIZE categories, GENERATION_CONCURRENCY
+# at a time, and merges the sections.
+GENERATION_MODE = os.environ.get("GENERATION_MODE", "single")
+GENERATION_GROUP_SIZE = int(os.environ.get("GENERATION_GROUP_SIZE", "1"))
+GENERATION_CONCURRENCY = int(os.environ.get("GENERATION_CONCURRENCY", "4"))
+# Objectives generated at once by generate_batch.
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
 
+_DONE = object()
 
-def _collect_internal_context(query: str, k: int = 6) -> List[str]:
-    vecs, meta = load_index()
-    if vecs is None or len(meta) == 0:
+
+def _collect_internal_context(
+    query: str,
+    k: int = CONTEXT_CANDIDATES,
+    query_vec: Optional[np.ndarray] = None,
+    trace: Optional[Trace] = None,
+    namespace: str = DEFAULT_NAMESPACE,
+) -> List[Candidate]:
+    trace = trace or Trace()
+    with trace.span("load_index", namespace=namespace):
+        index = get_index(namespace)
+    if len(index) == 0:
         return []
-    qv = embed_texts([query])[0]
-    idxs = top_k_similar(qv, vecs, k=k)
-    return [meta[i]["text"][:1200] for i in idxs]
+    qv = query_vec
+    if qv is None:
+        with trace.span("embed_query"):
+            qv = embed_texts([query])[0]
+    with trace.span("retrieve", rows=len(index)):
+        return _candidates(index, index.hybrid_search(query, qv, k=k))
 
 
-def _collect_web_context(query: str, k: int = 3) -> List[str]:
-    hits = web_search(query, max_results=k)
-    snippets: List[str] = []
-    for h in hits:
-        url = h.get("href")
-        try:
-            text = fetch_page_text(url)
+def _candidates(index, hits: List[Tuple[int, float]]) -> List[Candidate]:
+    """Retrieved chunks with their stored vectors, so packing needs no re-embedding.
+
+    Text and metadata are read from the doc store for these rows only; rows
+    deleted by a connection refresh since the search are skipped.
+    """
+    if not hits:
+        return []
+    state = index.state
+    ids = [i for i, _ in hits]
+    rows = [(meta, pos) for meta, pos in zip(index.meta_for(ids), state.positions(ids)) if meta and pos >= 0]
+    vectors = state.gather(np.array([pos for _, pos in rows], dtype=np.int64))
+    return [Candidate(meta["text"], meta.get("source", ""), vec) for (meta, _), vec in zip(rows, vectors)]
+
+
+def _collect_web_context(
+    query: str, k: int = 3, budget: float = WEB_RESEARCH_BUDGET, trace: Optional[Trace] = None
+) -> List[Candidate]:
+    trace = trace or Trace()
+    deadline = time.monotonic() + budget
+    with trace.span("web_search"):
+        hits = web_search(query, max_results=k)
+    with trace.span("web_fetch", urls=len(hits)):
+        pages = fetch_pages([h.get("href") for h in hits], deadline=deadline)
+    chunks = []
+    for url, text in pages.items():
+        if text:
+            chunks.extend((url, chunk) for chunk in itertools.islice(chunk_text(text), CONTEXT_WEB_CHUNKS))
+    if not chunks:
+        return []
+    with trace.span("web_embed", chunks=len(chunks)):
+        vectors = embed_texts([chunk for _, chunk in chunks])
+    return [Candidate(chunk, url, vec) for (url, chunk), vec in zip(chunks, vectors)]
+
+
+@dataclass
+class _Prepared:
+    result: Dict[str, Any]
+    trace: Trace = field(default_factory=Trace)
+    groups: List[List[str]] = field(default_factory=list)
+    prompts: List[str] = field(default_factory=list)
+    # (exact key, semantic scope, objective vector) to store the completion under
+    pending: Optional[Tuple[str, str, Optional[np.ndarray]]] = None
+
+    @property
+    def cached(self) -> bool:
+        return not self.prompts
+
+
+def _merge_sections(groups: List[List[str]], parts: List[List[str]], errors: Dict[int, BaseException]) -> str:
+    sections = []
+    for i, group in enumerate(groups):
+        if i in errors:
+            sections.append(f"### {', '.join(group)}\n_Generation failed: {errors[i]}_")
+        else:
+            text = "".join(parts[i]).strip()
             if text:
-                snippets.append(text[:1500])
-        except Exception:
-            continue
-    return snippets
+                sections.append(text)
+    return "\n\n".join(sections)
 
 
 class InitiativeAgent:
-    def __init__(self, llm: Optional[LLMClient] = None):
-        self.llm = llm or LLMClient(LLMConfig())
+    def __init__(self, llm: Optional[Union[LLMClient, LLMRouter]] = None):
+        # Default: the LLM_ROUTES list (or LLM_PROVIDER alone) with failover and optional hedging
+        self.llm = llm or LLMRouter()
+
+    def _llm_params(self) -> Dict[str, Any]:
+        c = self.llm.config
+        return {
+            "provider": c.provider,
+            "model": c.model,
+            "max_new_tokens": c.max_new_tokens,
+            "temperature": c.temperature,
+            "top_p": c.top_p,
+            "stop": c.stop,
+        }
+
+    def _prepare(
+        self,
+        objective: str,
+        categories: Optional[List[str]],
+        use_internal: bool,
+        use_web: bool,
+        constraints: Optional[List[str]],
+        num_per_category: int,
+        mode: str,
+        group_size: int,
+        query_vec: Optional[np.ndarray] = None,
+        internal_candidates: Optional[List[Candidate]] = None,
+        namespace: str = DEFAULT_NAMESPACE,
+    ) -> _Prepared:
+        """Retrieve and pack context, then build one prompt per category group,
+        or answer from the response cache.
+
+        ``query_vec``/``internal_candidates`` are supplied by ``generate_batch``,
+        which embeds and retrieves for all objectives up front.
+        """
+        trace = Trace()
+        cats = categories or DEFAULT_CATEGORIES
+        cache = get_response_cache()
+        result: Dict[str, Any] = {
+            "prompt": "",
+            "output_markdown": "",
+            "used_internal": use_internal,
+            "used_web": use_web,
+            "context_count": 0,
+            "mode": mode,
+        }
+        qv = query_vec
+        if qv is None and (use_internal or cache is not None):
+            with trace.span("embed_query"):
+                qv = embed_texts([objective])[0]
+        scope = ""
+        if cache is not None:
+            generation = -1
+            if use_internal:
+                with trace.span("load_index", namespace=namespace):
+                    generation = get_index(namespace).generation
+            scope = semantic_scope(
+                cats,
+                constraints,
+                self._llm_params(),
+                generation,
+                use_internal=use_internal,
+                namespace=namespace if use_internal else None,
+                use_web=use_web,
+                num_per_category=num_per_category,
+                mode=mode,
+                group_size=group_size,
+            )
+            with trace.span("cache_lookup", tier="semantic"):
+                hit = cache.get_semantic(scope, qv)
+            if hit is not None:
+                return _Prepared(self._from_cache(result, hit, cache), trace)
+
+        candidates: List[Candidate] = []
+        if use_internal:
+            if internal_candidates is None:
+                internal_candidates = _collect_internal_context(
+                    objective, query_vec=qv, trace=trace, namespace=namespace
+                )
+            candidates.extend(internal_candidates)
+        if use_web:
+            candidates.extend(_collect_web_context(objective, k=3, trace=trace))
+        if candidates and qv is None:
+            with trace.span("embed_query"):
+                qv = embed_texts([objective])[0]
+        # Token budget is measured with the target model's tokenizer
+        with trace.span("pack_context", candidates=len(candidates)):
+            context_snippets, result["context"] = pack_context(qv, candidates, self.llm.count_tokens)
+
+        if mode == "per_category":
+            group_size = max(1, group_size)
+            groups = [cats[i : i + group_size] for i in range(0, len(cats), group_size)]
+        elif mode == "single":
+            groups = [cats]
+        else:
+            raise ValueError(f"Unsupported generation mode: {mode}")
+        with trace.span("prompt_build", groups=len(groups)):
+            prompts = [
+                f"{SYSTEM_PROMPT}\n\n"
+                + build_generation_prompt(
+                    objective=objective,
+                    categories=group,
+                    context_snippets=context_snippets,
+                    constraints=constraints,
+                    num_per_category=num_per_category,
+                )
+                for group in groups
+            ]
+        result["prompt"] = "\n\n---\n\n".join(prompts)
+        result["context_count"] = len(context_snippets)
+        prepared = _Prepared(result, trace, groups, prompts)
+        if cache is None:
+            return prepared
+        key = exact_key(result["prompt"], self._llm_params())
+        with trace.span("cache_lookup", tier="exact"):
+            hit = cache.get_exact(key)
+        if hit is not None:
+            return _Prepared(self._from_cache(result, hit, cache), trace)
+        cache.miss()
+        result["cache"] = {"tier": None, **cache.stats()}
+        prepared.pending = (key, scope, qv)
+        return prepared
+
+    @staticmethod
+    def _from_cache(result: Dict[str, Any], hit: Dict[str, Any], cache) -> Dict[str, Any]:
+        result["prompt"] = hit["prompt"]
+        result["output_markdown"] = hit["output"]
+        result["cache"] = {"tier": hit["tier"], "similarity": hit["similarity"], **cache.stats()}
+        return result
+
+    def _store(self, prepared: _Prepared):
+        cache = get_response_cache()
+        result = prepared.result
+        if prepared.pending is not None and cache is not None and result["output_markdown"]:
+            key, scope, qv = prepared.pending
+            with prepared.trace.span("cache_store"):
+                cache.put(key, scope, qv, result["prompt"], result["output_markdown"])
+
+    def _fan_out(self, prepared: _Prepared, stream: bool) -> Iterator[str]:
+        """Run one request per category group concurrently; yield the merged Markdown as it grows.
+
+        A failed group becomes a short note in its section; if every group
+        fails the first error is raised.
+        """
+        groups, prompts = prepared.groups, prepared.prompts
+        events: "queue.Queue[Tuple[int, Any]]" = queue.Queue()
+        parts: List[List[str]] = [[] for _ in prompts]
+        errors: Dict[int, BaseException] = {}
+
+        def work(i: int, prompt: str):
+            try:
+                with prepared.trace.span("llm", group=", ".join(groups[i])):
+                    if stream:
+                        for delta in self.llm.generate_stream(prompt, trace=prepared.trace):
+                            events.put((i, delta))
+                    else:
+                        events.put((i, self.llm.generate(prompt, trace=prepared.trace)))
+            except Exception as ex:  # reported per section below
+                events.put((i, ex))
+            finally:
+                events.put((i, _DONE))
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(GENERATION_CONCURRENCY, len(prompts))))
+        try:
+            for i, prompt in enumerate(prompts):
+                pool.submit(work, i, prompt)
+            remaining = len(prompts)
+            while remaining:
+                i, item = events.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(item, BaseException):
+                    errors[i] = item
+                else:
+                    parts[i].append(item)
+                yield _merge_sections(groups, parts, errors)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if len(errors) == len(prompts):
+            raise errors[0]
+        if errors:
+            prepared.result["failed_categories"] = [c for i in sorted(errors) for c in groups[i]]
+            # Incomplete plans are not cached
+            prepared.pending = None
+
+    def _run(self, prepared: _Prepared, stream: bool) -> Iterator[str]:
+        trace = prepared.trace
+        if len(prepared.prompts) == 1 and stream:
+            parts: List[str] = []
+            with trace.span("llm"):
+                for delta in self.llm.generate_stream(prepared.prompts[0], trace=trace):
+                    parts.append(delta)
+                    yield "".join(parts)
+        elif len(prepared.prompts) == 1:
+            with trace.span("llm"):
+                output = self.llm.generate(prepared.prompts[0], trace=trace)
+            yield output
+        else:
+            yield from self._fan_out(prepared, stream)
 
     def generate(
         self,
@@ -44,27 +325,159 @@ class InitiativeAgent:
         use_web: bool = False,
         constraints: Optional[List[str]] = None,
         num_per_category: int = 3,
+        mode: str = GENERATION_MODE,
+        group_size: int = GENERATION_GROUP_SIZE,
+        namespace: str = DEFAULT_NAMESPACE,
     ) -> Dict[str, Any]:
-        cats = categories or DEFAULT_CATEGORIES
-        context_snippets: List[str] = []
-        if use_internal:
-            context_snippets.extend(_collect_internal_context(objective, k=6))
-        if use_web:
-            context_snippets.extend(_collect_web_context(objective, k=3))
-
-        prompt = f"{SYSTEM_PROMPT}\n\n" + build_generation_prompt(
-            objective=objective,
-            categories=cats,
-            context_snippets=context_snippets,
-            constraints=constraints,
-            num_per_category=num_per_category,
+        """Generate a plan.
+
+        ``mode="per_category"`` issues one smaller request per group of
+        ``group_size`` categories concurrently over the same retrieved context,
+        so latency tracks one group rather than the whole plan. Internal
+        context is retrieved from ``namespace``'s index only.
+        """
+        prepared = self._prepare(
+            objective,
+            categories,
+            use_internal,
+            use_web,
+            constraints,
+            num_per_category,
+            mode,
+            group_size,
+            namespace=namespace,
         )
-        output = self.llm.generate(prompt)
-        return {
-            "prompt": prompt,
-            "output_markdown": output,
-            "used_internal": use_internal,
-            "used_web": use_web,
-            "context_count": len(context_snippets),
-        }
+        return self._complete(prepared)
+
+    def _complete(self, prepared: _Prepared) -> Dict[str, Any]:
+        if not prepared.cached:
+            for output in self._run(prepared, stream=False):
+                prepared.result["output_markdown"] = output
+            self._store(prepared)
+        prepared.result["trace"] = prepared.trace.to_dict()
+        return prepared.result
+
+    def generate_batch(
+        self, items: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Generate plans for many objectives, yielding ``(position, result)`` as each finishes.
+
+        Each item holds ``generate``'s keyword arguments. All objectives are
+        embedded in one ``embed_texts`` call and the cosine half of internal
+        retrieval is a single batched search per namespace; LLM calls then run ``concurrency``
+        objectives at a time, subject to the per-provider ``LLM_RATE_LIMITS``.
+        A failing objective yields ``{"objective": ..., "error": ...}`` instead
+        of aborting the batch; so does each objective of a namespace that is
+        invalid or whose index cannot be searched.
+        """
+        if not items:
+            return
+        with timed("batch_embed"):
+            vecs = embed_texts([item["objective"] for item in items])
+        contexts: Dict[int, List[Candidate]] = {}
+        errors: Dict[int, str] = {}
+        namespaces: Dict[int, str] = {}
+        by_namespace: Dict[str, List[int]] = {}
+        for i, item in enumerate(items):
+            try:
+                namespaces[i] = normalize_namespace(item.get("namespace", DEFAULT_NAMESPACE))
+            except ValueError as ex:
+                errors[i] = f"{type(ex).__name__}: {ex}"
+                continue
+            if item.get("use_internal", True):
+                by_namespace.setdefault(namespaces[i], []).append(i)
+        for namespace, internal in by_namespace.items():
+            with timed("batch_retrieve"):
+                try:
+                    index = get_index(namespace)
+                    vector_hits = index.search_batch(vecs[internal], k=max(CONTEXT_CANDIDATES, RETRIEVAL_DEPTH))
+                    for i, hits in zip(internal, vector_hits):
+                        fused = index.hybrid_search(
+                            items[i]["objective"], vecs[i], CONTEXT_CANDIDATES, vector_hits=hits
+                        )
+                        contexts[i] = _candidates(index, fused)
+                except Exception as ex:  # only this namespace's rows fail
+                    errors.update((i, f"{type(ex).__name__}: {ex}") for i in internal)
+
+        def run(i: int) -> Tuple[int, Dict[str, Any]]:
+            item = items[i]
+            if i in errors:
+                return i, {"objective": item["objective"], "error": errors[i]}
+            try:
+                prepared = self._prepare(
+                    item["objective"],
+                    item.get("categories"),
+                    item.get("use_internal", True),
+                    item.get("use_web", False),
+                    item.get("constraints"),
+                    item.get("num_per_category", 3),
+                    item.get("mode", GENERATION_MODE),
+                    item.get("group_size", GENERATION_GROUP_SIZE),
+                    query_vec=vecs[i],
+                    internal_candidates=contexts.get(i, []),
+                    namespace=namespaces[i],
+                )
+                return i, self._complete(prepared)
+            except Exception as ex:  # one bad row must not sink the batch
+                return i, {"objective": item["objective"], "error": f"{type(ex).__name__}: {ex}"}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as pool:
+            for future in as_completed([pool.submit(run, i) for i in range(len(items))]):
+                yield future.result()
+
+    def generate_stream(
+        self,
+        objective: str,
+        categories: Optional[List[str]] = None,
+        use_internal: bool = True,
+        use_web: bool = False,
+        constraints: Optional[List[str]] = None,
+        num_per_category: int = 3,
+        mode: str = GENERATION_MODE,
+        group_size: int = GENERATION_GROUP_SIZE,
+        namespace: str = DEFAULT_NAMESPACE,
+    ) -> Iterator[Dict[str, Any]]:
+        """Like ``generate`` but yields the result repeatedly as the Markdown grows.
+
+        The first yield carries the prompt with empty output (before the LLM call),
+        so callers can render context immediately; the last yield is complete.
+        A cached response is yielded once, whole.
+        """
+        prepared = self._prepare(
+            objective,
+            categories,
+            use_internal,
+            use_web,
+            constraints,
+            num_per_category,
+            mode,
+            group_size,
+            namespace=namespace,
+        )
+        result = prepared.result
+        # Retrieval-stage timings first; the final yield carries the full trace
+        result["trace"] = prepared.trace.to_dict()
+        if prepared.cached:
+            yield result
+            return
+        yield dict(result)
+        for output in self._run(prepared, stream=True):
+            result["output_markdown"] = output
+            yield dict(result)
+        self._store(prepared)
+        result["trace"] = prepared.trace.to_dict()
+        yield dict(result)
+
+
+_AGENT: Optional[InitiativeAgent] = None
+_AGENT_LOCK = threading.Lock()
+
 
+def get_agent() -> InitiativeAgent:
+    """Shared default agent, built on first use (or by the startup warm-up)."""
+    global _AGENT
+    if _AGENT is None:
+        with _AGENT_LOCK:
+            if _AGENT is None:
+                _AGENT = InitiativeAgent()
+    return _AGENT
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .embeddings import top_k_with_scores
+
+# Backend used once the index holds at least ANN_MIN_ROWS rows; below that (or
+# with ANN_BACKEND=exact) search is brute force, which is also the reference
+# for recall measurements. ANN is opt-in: recall depends on the data and on
+# ANN_NPROBE/HNSW_EF_SEARCH, so check quantize.recall_report before enabling it.
+ANN_BACKEND = os.environ.get("ANN_BACKEND", "exact")  # exact|ivf|hnsw
+ANN_MIN_ROWS = int(os.environ.get("ANN_MIN_ROWS", "20000"))
+# IVF-flat knobs: more lists -> fewer candidates per probe; more probes -> higher recall.
+ANN_NLIST = int(os.environ.get("ANN_NLIST", "0"))  # 0 = 4 * sqrt(rows)
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "8"))
+# HNSW knobs (requires the optional `hnswlib` package).
+HNSW_M = int(os.environ.get("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", "64"))
+
+Gather = Callable[[np.ndarray], np.ndarray]
+
+
+def default_nlist(n_rows: int) -> int:
+    return ANN_NLIST or max(1, int(4 * np.sqrt(n_rows)))
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, batch: int = 65536) -> np.ndarray:
+    """Nearest centroid (by inner product) for each row."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch):
+        out[start : start + batch] = np.argmax(np.asarray(vectors[start : start + batch]) @ centroids.T, axis=1)
+    return out
+
+
+def kmeans(x: np.ndarray, nlist: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over unit vectors; returns unit-norm float32 centroids."""
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, dtype=np.float32)
+    nlist = min(nlist, len(x))
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+    return centroids
+
+
+def train_ivf(sample: np.ndarray, nlist: Optional[int] = None, seed: int = 0) -> np.ndarray:
+    return kmeans(sample, nlist or default_nlist(len(sample)), seed=seed)
+
+
+class IVFFlatIndex:
+    """Inverted-file index over k-means cells; vectors stay in the segments.
+
+    Inverted lists are kept per segment so inserting a segment is O(its rows).
+    Candidate rows are fetched through ``gather`` and scored exactly.
+    """
+
+    name = "ivf"
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = ANN_NPROBE):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self._parts: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def copy(self) -> "IVFFlatIndex":
+        """Shallow copy sharing existing lists, so a published index is never mutated."""
+        other = IVFFlatIndex(self.centroids, self.nprobe)
+        other._parts = list(self._parts)
+        return other
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.centroids.nbytes + sum(order.nbytes + bounds.nbytes for order, bounds in self._parts))
+
+    def add(self, assignments: np.ndarray, offset: int):
+        """Register rows ``offset .. offset+len(assignments)`` with their cells."""
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=self.nlist))])
+        self._parts.append((order.astype(np.int64) + offset, bounds))
+
+    def search(self, query: np.ndarray, k: int, gather: Gather, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        probe = top_k_with_scores(query, self.centroids, nprobe or self.nprobe)[0]
+        ids = np.concatenate(
+            [order[bounds[c] : bounds[c + 1]] for order, bounds in self._parts for c in probe]
+            or [np.empty(0, dtype=np.int64)]
+        )
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float32)
+        local, scores = top_k_with_scores(query, gather(ids), k)
+        return ids[local], scores
+
+
+class HNSWIndex:
+    """Thin wrapper over ``hnswlib`` with incremental insertion.
+
+    hnswlib does not allow inserts/resizes concurrently with queries, so all
+    access goes through one lock.
+    """
+
+    name = "hnsw"
+
+    def __init__(self, dim: int, index=None, ef_search: int = HNSW_EF_SEARCH):
+        import hnswlib  # type: ignore
+
+        if index is None:
+            index = hnswlib.Index(space="ip", dim=dim)
+            index.init_index(max_elements=1024, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        self.index = index
+        self.index.set_ef(ef_search)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, dim: int) -> "HNSWIndex":
+        import hnswlib  # type: ignore
+
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(path, allow_replace_deleted=False)
+        return cls(dim, index=index)
+
+    def __len__(self) -> int:
+        return self.index.get_current_count()
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate graph size: per allocated element its vector, level-0 links and label."""
+        return self.index.get_max_elements() * (self.index.dim * 4 + (2 * HNSW_M + 1) * 4 + 8)
+
+    def add(self, vectors: np.ndarray, offset: int):
+        with self._lock:
+            needed = len(self) + len(vectors)
+            if needed > self.index.get_max_elements():
+                self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+            self.index.add_items(np.asarray(vectors, dtype=np.float32), np.arange(offset, offset + len(vectors)))
+
+    def save(self, path: str):
+        with self._lock:
+            self.index.save_index(path)
+
+    def search(self, query: np.ndarray, k: int, gather: Gather, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        with self._lock:
+            labels, dists = self.index.knn_query(np.asarray(query, dtype=np.float32).reshape(1, -1), k=k)
+        return labels[0].astype(np.int64), (1.0 - dists[0]).astype(np.float32)
+
+
+def hnsw_available() -> bool:
+    try:
+        import hnswlib  # type: ignore  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def recall_at_k(approx_ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    """Fraction of the exact top-k recovered by an approximate search."""
+    exact = set(np.asarray(exact_ids).tolist())
+    if not exact:
+        return 1.0
+    return len(exact.intersection(np.asarray(approx_ids).tolist())) / len(exact)
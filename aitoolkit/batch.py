@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .agent import BATCH_CONCURRENCY, InitiativeAgent
+from .storage import normalize_namespace
+
+_LIST_FIELDS = ("categories", "constraints")
+_BOOL_FIELDS = ("use_internal", "use_web")
+_INT_FIELDS = ("num_per_category", "group_size")
+
+
+def _split_list(value: Any) -> Optional[List[str]]:
+    """Lists pass through; CSV cells are comma-separated like the UI's constraints box."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def _normalize(row: Dict[str, Any], line: int) -> Dict[str, Any]:
+    objective = str(row.get("objective") or "").strip()
+    if not objective:
+        raise ValueError(f"row {line}: missing objective")
+    item: Dict[str, Any] = {"id": str(row.get("id") or line), "objective": objective}
+    for key in _LIST_FIELDS:
+        values = _split_list(row.get(key))
+        if values:
+            item[key] = values
+    for key in _BOOL_FIELDS:
+        if row.get(key) not in (None, ""):
+            item[key] = _to_bool(row[key])
+    for key in _INT_FIELDS:
+        if row.get(key) not in (None, ""):
+            item[key] = int(row[key])
+    if row.get("mode"):
+        item["mode"] = str(row["mode"])
+    if row.get("namespace"):
+        try:
+            item["namespace"] = normalize_namespace(str(row["namespace"]))
+        except ValueError:
+            # Kept as given: generate_batch reports it on this row alone
+            item["namespace"] = str(row["namespace"])
+    return item
+
+
+def read_objectives(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows from a .jsonl or .csv file with an ``objective`` column and optional
+    ``id``, ``categories``, ``constraints``, ``use_internal``, ``use_web``,
+    ``num_per_category``, ``mode``, ``group_size`` and ``namespace``. Rows
+    without an ``id`` are keyed by their line number, which is what resuming
+    matches on.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for line, row in enumerate(csv.DictReader(f), start=1):
+                yield _normalize(row, line)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line, raw in enumerate(f, start=1):
+            if raw.strip():
+                yield _normalize(json.loads(raw), line)
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already written without an error; a torn final line is ignored."""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for raw in f:
+            try:
+                rec = json.loads(raw)
+            except ValueError:
+                continue
+            if "error" not in rec:
+                done.add(str(rec.get("id")))
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return True
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    agent: Optional[InitiativeAgent] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    resume: bool = True,
+    defaults: Optional[Dict[str, Any]] = None,
+) -> Dict[str, int]:
+    """Generate a plan per input row, appending one JSON line per result as it finishes.
+
+    With ``resume`` the output file is kept and rows that already succeeded
+    are skipped, so an interrupted run continues where it stopped (failed rows
+    are retried). ``defaults`` fill in generate() arguments a row leaves unset.
+    """
+    agent = agent or InitiativeAgent()
+    done = completed_ids(output_path) if resume else set()
+    items = [{**(defaults or {}), **item} for item in read_objectives(input_path) if item["id"] not in done]
+    summary = {"skipped": len(done), "succeeded": 0, "failed": 0}
+    if not items:
+        return summary
+    mode = "a" if resume else "w"
+    prefix = "" if (not resume or _ends_with_newline(output_path)) else "\n"
+    with open(output_path, mode, encoding="utf-8") as out:
+        out.write(prefix)
+        requests = [{k: v for k, v in item.items() if k != "id"} for item in items]
+        for i, result in agent.generate_batch(requests, concurrency=concurrency):
+            record = {"id": items[i]["id"], "objective": items[i]["objective"], **result}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            summary["failed" if "error" in result else "succeeded"] += 1
+    return summary
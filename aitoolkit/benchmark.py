@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+BENCH_SEED = 0
+# all-MiniLM-L6-v2's width; synthetic vectors need not come from the model.
+BENCH_DIM = 384
+SUITES = ("index", "embed", "connectors", "generate")
+
+_WORDS = (
+    "latency throughput checkout payments churn retention onboarding search ranking cache queue "
+    "deploy rollback incident alert dashboard metric budget forecast revenue support ticket "
+    "customer partner pipeline warehouse schema migration api gateway mobile web release"
+).split()
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/mean in milliseconds over per-operation durations in seconds."""
+    if not samples:
+        return {"n": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "n": len(samples),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "total_s": round(float(ms.sum()) / 1000.0, 3),
+    }
+
+
+def _timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark (Linux >= 4.0) so a phase reports its own peak."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _process_peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size since the last reset (VmHWM), else since process start."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return _process_peak_rss_mb()
+
+
+def _phase(results: Dict[str, Any], name: str, fn: Callable[[], Dict[str, Any]]):
+    _reset_peak_rss()
+    (stats, seconds) = _timed(fn)
+    results[name] = {**stats, "wall_s": round(seconds, 3), "peak_rss_mb": peak_rss_mb()}
+
+
+def synthetic_text(rng: np.random.Generator, i: int, words: int = 60) -> str:
+    """Chunk-sized text over a small vocabulary, with an identifier-like token now and then."""
+    body = " ".join(_WORDS[j] for j in rng.integers(0, len(_WORDS), size=words))
+    return f"Row {i}: {body}. Error code ERR-{i % 997:04d}."
+
+
+def synthetic_vectors(rng: np.random.Generator, n: int, dim: int = BENCH_DIM) -> np.ndarray:
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def synthetic_corpus(n: int, batch: int, dim: int = BENCH_DIM, seed: int = BENCH_SEED) -> Iterator[Tuple[list, np.ndarray]]:
+    """``(documents, unit vectors)`` groups totalling ``n`` chunks, generated lazily."""
+    from .embed_cache import content_hash
+    from .storage import Document
+
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, batch):
+        size = min(batch, n - start)
+        docs = []
+        for i in range(start, start + size):
+            text = synthetic_text(rng, i)
+            docs.append(Document(text=text, source=f"bench://{i // 1000}", metadata={"chunk": i, "hash": content_hash(text)}))
+        yield docs, synthetic_vectors(rng, size, dim)
+
+
+def _queries(n: int, dim: int, seed: int = BENCH_SEED + 1) -> Tuple[List[str], np.ndarray]:
+    rng = np.random.default_rng(seed)
+    texts = [f"{_WORDS[i % len(_WORDS)]} {_WORDS[(i * 7) % len(_WORDS)]} ERR-{i:04d}" for i in range(n)]
+    return texts, synthetic_vectors(rng, n, dim)
+
+
+def _wait_for_maintenance(timeout: float = 600.0) -> float:
+    """Block until background compaction / ANN builds started by appends finish."""
+    start = time.perf_counter()
+    for thread in [t for t in threading.enumerate() if t.name == "index-maintenance"]:
+        thread.join(max(0.0, timeout - (time.perf_counter() - start)))
+    return time.perf_counter() - start
+
+
+def bench_index(size: int, dim: int = BENCH_DIM, queries: int = 50, repeats: int = 3) -> Dict[str, Any]:
+    """``append_to_index`` in ingest-sized groups, then ``load_index``, ``top_k_similar`` and index search."""
+    from .embeddings import top_k_similar
+    from .ingest import INGEST_COMMIT_ROWS
+    from .storage import append_to_index, get_index, load_index
+
+    results: Dict[str, Any] = {"size": size, "dim": dim}
+
+    def append() -> Dict[str, Any]:
+        samples = []
+        for docs, vecs in synthetic_corpus(size, INGEST_COMMIT_ROWS, dim):
+            samples.append(_timed(lambda: append_to_index(docs, vecs))[1])
+        total = sum(samples)
+        return {**summarize(samples), "rows_per_s": round(size / total, 1) if total else None}
+
+    _phase(results, "append_to_index", append)
+    results["maintenance_wait_s"] = round(_wait_for_maintenance(), 3)
+
+    loaded: Dict[str, Any] = {}
+
+    def load() -> Dict[str, Any]:
+        samples = []
+        for _ in range(repeats):
+            (loaded["index"], seconds) = _timed(load_index)
+            samples.append(seconds)
+        return summarize(samples)
+
+    _phase(results, "load_index", load)
+    texts, qvecs = _queries(queries, dim)
+
+    def brute_force() -> Dict[str, Any]:
+        vecs = loaded["index"][0]
+        return summarize([_timed(lambda: top_k_similar(q, vecs, k=5))[1] for q in qvecs])
+
+    _phase(results, "top_k_similar", brute_force)
+    # Free the fully loaded copy before the memory-mapped search phases
+    loaded.clear()
+    index = get_index()
+
+    def search() -> Dict[str, Any]:
+        return summarize([_timed(lambda: index.search(q, k=5))[1] for q in qvecs])
+
+    def hybrid() -> Dict[str, Any]:
+        return summarize([_timed(lambda: index.hybrid_search(t, q, k=5))[1] for t, q in zip(texts, qvecs)])
+
+    _phase(results, "index_search", search)
+    _phase(results, "hybrid_search", hybrid)
+    results["footprint"] = index.memory_footprint()
+    return results
+
+
+def bench_embed(texts: int = 1000, batch: int = 0) -> Dict[str, Any]:
+    """``embed_texts`` per batch: a cold pass (model + cache misses), then a cached pass."""
+    from .embed_cache import get_cache
+    from .embeddings import _ensure_model, embed_texts
+    from .ingest import EMBED_BATCH_SIZE
+
+    batch = batch or EMBED_BATCH_SIZE
+    rng = np.random.default_rng(BENCH_SEED)
+    corpus = [synthetic_text(rng, i) for i in range(texts)]
+    results: Dict[str, Any] = {"texts": texts, "batch": batch}
+    results["model_load_s"] = round(_timed(_ensure_model)[1], 3)
+
+    def run() -> Dict[str, Any]:
+        samples = [_timed(lambda: embed_texts(corpus[i : i + batch]))[1] for i in range(0, texts, batch)]
+        total = sum(samples)
+        return {**summarize(samples), "texts_per_s": round(texts / total, 1) if total else None}
+
+    _phase(results, "cold", run)
+    _phase(results, "cached", run)
+    cache = get_cache()
+    results["cache"] = cache.stats() if cache is not None else None
+    return results
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for a data source: ``/page`` (HTML) and ``/api`` (JSON)."""
+
+    page = b""
+    api = b""
+
+    def do_GET(self):
+        body, ctype = (self.page, "text/html") if self.path.startswith("/page") else (self.api, "application/json")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _write_uploads(directory: str, rows: int) -> Dict[str, str]:
+    rng = np.random.default_rng(BENCH_SEED)
+    texts = [synthetic_text(rng, i, words=20) for i in range(rows)]
+    paths = {kind: os.path.join(directory, f"bench.{kind}") for kind in ("csv", "jsonl", "json", "txt")}
+    with open(paths["csv"], "w", encoding="utf-8") as f:
+        f.write("id,team,text\n")
+        f.writelines(f"{i},{_WORDS[i % len(_WORDS)]},\"{t}\"\n" for i, t in enumerate(texts))
+    with open(paths["jsonl"], "w", encoding="utf-8") as f:
+        f.writelines(json.dumps({"id": i, "text": t}) + "\n" for i, t in enumerate(texts))
+    with open(paths["json"], "w", encoding="utf-8") as f:
+        json.dump([{"id": i, "text": t} for i, t in enumerate(texts)], f)
+    with open(paths["txt"], "w", encoding="utf-8") as f:
+        f.writelines(t + "\n" for t in texts)
+    return paths
+
+
+def bench_connectors(rows: int = 10000, repeats: int = 5) -> Dict[str, Any]:
+    """``UploadConnector`` over synthetic files and ``HTTPConnector`` against a local server."""
+    from .connectors.base import ConnectorConfig
+    from .connectors.http import HTTPConnector
+    from .connectors.upload import UploadConnector
+    from .storage import DATA_DIR
+
+    results: Dict[str, Any] = {"rows": rows}
+    directory = os.path.join(DATA_DIR, "bench_sources")
+    os.makedirs(directory, exist_ok=True)
+    for kind, path in _write_uploads(directory, rows).items():
+        cfg = ConnectorConfig(type="upload", name=kind, params={"filename": os.path.basename(path), "path": path})
+        mb = os.path.getsize(path) / (1024.0 * 1024.0)
+
+        def upload() -> Dict[str, Any]:
+            samples = [_timed(lambda: sum(1 for _ in UploadConnector(cfg).fetch()))[1] for _ in range(repeats)]
+            return {**summarize(samples), "mb": round(mb, 2), "mb_per_s": round(mb * repeats / sum(samples), 1)}
+
+        _phase(results, f"upload_{kind}", upload)
+
+    rng = np.random.default_rng(BENCH_SEED)
+    paragraphs = "".join(f"<p>{synthetic_text(rng, i, words=20)}</p>" for i in range(min(rows, 2000)))
+    _StandIn.page = f"<html><body><script>var x=1;</script>{paragraphs}</body></html>".encode("utf-8")
+    _StandIn.api = json.dumps([{"id": i, "value": _WORDS[i % len(_WORDS)]} for i in range(min(rows, 2000))]).encode()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, name="bench-http", daemon=True).start()
+    try:
+        for name in ("page", "api"):
+            url = f"http://127.0.0.1:{server.server_port}/{name}"
+            cfg = ConnectorConfig(type="http", name=name, params={"url": url, "auth_type": "none"})
+
+            def http() -> Dict[str, Any]:
+                return summarize([_timed(lambda: HTTPConnector(cfg).fetch())[1] for _ in range(repeats)])
+
+            _phase(results, f"http_{name}", http)
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_generate(requests: int = 20, corpus: int = 1000) -> Dict[str, Any]:
+    """``InitiativeAgent.generate`` end to end against ``provider=stub``, over an ingested corpus.
+
+    Distinct objectives keep the response cache from answering; retrieval,
+    packing and prompt building are also timed on their own (``prepare``).
+    """
+    from .agent import InitiativeAgent
+    from .ingest import ingest_documents
+    from .models import LLMClient, LLMConfig
+    from .storage import Document
+
+    rng = np.random.default_rng(BENCH_SEED)
+    results: Dict[str, Any] = {"requests": requests, "corpus": corpus}
+    docs = (Document(text=synthetic_text(rng, i), source=f"bench://{i}") for i in range(corpus))
+    results["ingest_s"] = round(_timed(lambda: ingest_documents(docs))[1], 3)
+    agent = InitiativeAgent(LLMClient(LLMConfig(provider="stub")))
+    objectives = [f"Improve {_WORDS[i % len(_WORDS)]} for {_WORDS[(i * 5) % len(_WORDS)]} (run {i})" for i in range(requests)]
+
+    def prepare() -> Dict[str, Any]:
+        return summarize(
+            [
+                _timed(lambda: agent._prepare(o, None, True, False, None, 3, "single", 1))[1]
+                for o in objectives
+            ]
+        )
+
+    def generate(mode: str) -> Callable[[], Dict[str, Any]]:
+        def run() -> Dict[str, Any]:
+            return summarize(
+                [_timed(lambda: agent.generate(f"{o} [{mode}]", use_web=False, mode=mode))[1] for o in objectives]
+            )
+
+        return run
+
+    _phase(results, "prepare", prepare)
+    _phase(results, "generate_single", generate("single"))
+    _phase(results, "generate_per_category", generate("per_category"))
+    return results
+
+
+_SUITE_FUNCS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "index": bench_index,
+    "embed": bench_embed,
+    "connectors": bench_connectors,
+    "generate": bench_generate,
+}
+
+
+def run_suite(suite: str, **kwargs: Any) -> Dict[str, Any]:
+    """Run one suite in this process; failures are reported, not raised."""
+    start = time.perf_counter()
+    try:
+        result = _SUITE_FUNCS[suite](**kwargs)
+    except Exception as ex:  # e.g. the embedding model is unavailable
+        result = {"error": f"{type(ex).__name__}: {ex}"}
+    result.update({"suite": suite, "wall_s": round(time.perf_counter() - start, 3)})
+    result["process_peak_rss_mb"] = _process_peak_rss_mb()
+    return result
+
+
+def _isolated(suite: str, kwargs: Dict[str, Any], env: Dict[str, str]) -> Dict[str, Any]:
+    """Run a suite in a fresh interpreter with its own empty ``DATA_DIR``."""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{suite}-") as data_dir:
+        child_env = {**os.environ, **env, "DATA_DIR": data_dir}
+        proc = subprocess.run(
+            [sys.executable, "-m", "aitoolkit.benchmark", suite, json.dumps(kwargs)],
+            cwd=_ROOT,
+            env=child_env,
+            capture_output=True,
+            text=True,
+        )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {"suite": suite, **kwargs, "error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1])
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=_ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(
+    suites: List[str],
+    sizes: List[int],
+    dim: int = BENCH_DIM,
+    queries: int = 50,
+    embed_texts: int = 1000,
+    rows: int = 10000,
+    requests: int = 20,
+) -> Dict[str, Any]:
+    """Run the selected suites (``index`` once per corpus size), each in its own process.
+
+    Isolation gives every run an empty index and its own peak RSS. Caches are
+    disabled except where the suite measures them (``embed``), and generation
+    uses the deterministic ``stub`` provider, so runs are comparable across
+    commits.
+    """
+    env = {"HTTP_CACHE": "0", "RESPONSE_CACHE": "0"}
+    plan: List[Tuple[str, Dict[str, Any], Dict[str, str]]] = []
+    for suite in suites:
+        if suite == "index":
+            plan.extend(("index", {"size": n, "dim": dim, "queries": queries}, {"EMBED_CACHE": "0"}) for n in sizes)
+        elif suite == "embed":
+            plan.append(("embed", {"texts": embed_texts}, {}))
+        elif suite == "connectors":
+            plan.append(("connectors", {"rows": rows}, {}))
+        elif suite == "generate":
+            plan.append(("generate", {"requests": requests}, {"LLM_PROVIDER": "stub"}))
+        else:
+            raise ValueError(f"Unknown suite: {suite}")
+    report: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "started_at": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            key: os.environ.get(key)
+            for key in ("ANN_BACKEND", "INDEX_QUANTIZATION", "EMBEDDING_MODEL", "RETRIEVAL_HYBRID", "EMBED_BATCH_SIZE")
+            if os.environ.get(key) is not None
+        },
+        "results": [],
+    }
+    for suite, kwargs, suite_env in plan:
+        print(f"bench: {suite} {kwargs}", file=sys.stderr, flush=True)
+        report["results"].append(_isolated(suite, kwargs, {**env, **suite_env}))
+    return report
+
+
+if __name__ == "__main__":
+    # Worker entry used by run_benchmarks: python -m aitoolkit.benchmark SUITE KWARGS_JSON
+    print(json.dumps(run_suite(sys.argv[1], **json.loads(sys.argv[2]))))
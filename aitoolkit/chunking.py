@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import re
+import zlib
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from .embed_cache import content_hash
+from .embeddings import count_tokens, max_tokens, split_by_tokens
+from .storage import Document
+
+# 0 = the embedding model's own limit, so no chunk is silently truncated.
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "0"))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "32"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_COUNT_BATCH = 256
+# Anchored chunks end after a unit picked by its hash (aiming at this fraction
+# of the budget per chunk, and no earlier than _ANCHOR_MIN of it), so their
+# boundaries move with the content instead of with everything before it.
+_ANCHOR_TARGET = 0.5
+_ANCHOR_MIN = 0.25
+
+Counter = Callable[[List[str]], List[int]]
+
+
+def _budget() -> int:
+    return CHUNK_TOKENS or max_tokens()
+
+
+def _units(text: str) -> Iterator[str]:
+    """Lines, with long lines further split into sentences."""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) > 400:
+            yield from (s for s in _SENTENCE_END.split(line) if s)
+        else:
+            yield line
+
+
+def _counted(units: Iterable[str], count: Counter) -> Iterator[tuple]:
+    batch: List[str] = []
+    for u in units:
+        batch.append(u)
+        if len(batch) == _COUNT_BATCH:
+            yield from zip(batch, count(batch))
+            batch = []
+    if batch:
+        yield from zip(batch, count(batch))
+
+
+def _anchor(unit: str, n: int, target: int) -> bool:
+    """Whether a chunk ends after ``unit``: chance ``n / target``, decided by the unit's hash."""
+    return zlib.crc32(unit.encode("utf-8", "ignore")) < n / target * (1 << 32)
+
+
+def pack(
+    units: Iterable[str],
+    max_len: Optional[int] = None,
+    overlap: int = CHUNK_OVERLAP,
+    count: Counter = count_tokens,
+    header: Optional[str] = None,
+    joiner: str = "\n",
+    anchored: bool = False,
+) -> Iterator[str]:
+    """Greedily pack units into chunks of at most ``max_len`` tokens.
+
+    Trailing units worth up to ``overlap`` tokens are repeated at the start of
+    the next chunk (sliding window). A unit longer than the budget is split on
+    token boundaries. ``header`` (e.g. a CSV header) prefixes every chunk and
+    counts against the budget. ``anchored`` also ends a chunk, without
+    overlap, after units whose hash marks a cut point (content-defined
+    chunking): inserting a unit then changes only the chunk it lands in.
+    """
+    max_len = max_len or _budget()
+    head_len = count([header])[0] + 1 if header else 0
+    room = max(1, max_len - head_len)
+    target = max(1, int(room * _ANCHOR_TARGET))
+    current: List[tuple] = []
+    size = 0
+
+    def emit() -> str:
+        body = joiner.join(u for u, _ in current)
+        return f"{header}\n{body}" if header else body
+
+    for unit, n in _counted(units, count):
+        if n > room:
+            pieces = split_by_tokens(unit, room)
+            pairs = list(zip(pieces, count(pieces)))
+        else:
+            pairs = [(unit, n)]
+        for piece, n in pairs:
+            if current and size + n > room:
+                yield emit()
+                kept: List[tuple] = []
+                kept_size = 0
+                for u, m in reversed(current):
+                    if kept_size + m > overlap:
+                        break
+                    kept.insert(0, (u, m))
+                    kept_size += m
+                current, size = kept, kept_size
+                if size + n > room:
+                    current, size = [], 0
+            current.append((piece, n))
+            size += n
+            if anchored and size >= room * _ANCHOR_MIN and _anchor(piece, n, target):
+                yield emit()
+                current, size = [], 0
+    if current:
+        yield emit()
+
+
+def chunk_text(text: str, max_len: Optional[int] = None, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """Token-aware sliding-window chunking over lines/sentences."""
+    return pack(_units(text), max_len=max_len, overlap=overlap)
+
+
+def chunk_records(records: Iterable[str], header: Optional[str] = None, max_len: Optional[int] = None) -> Iterator[str]:
+    """Row-group chunking: whole records per chunk, never split mid-row unless a row exceeds the budget.
+
+    Boundaries are anchored to the records' content, so adding or removing a
+    row re-chunks only its neighbourhood and a refresh re-embeds little.
+    """
+    return pack(records, max_len=max_len, overlap=0, header=header, anchored=True)
+
+
+def _csv_records(text: str):
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+
+    def fmt(row: List[str]) -> str:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerow(row)
+        return buf.getvalue()[:-1]
+
+    return (fmt(header) if header else None), (fmt(row) for row in reader if row)
+
+
+def _json_records(data: Any) -> Iterator[str]:
+    """One record per list element; dict keys become records (list values fan out)."""
+    if isinstance(data, list):
+        for item in data:
+            yield json.dumps(item, ensure_ascii=False)
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            for item in value if isinstance(value, list) else [value]:
+                yield json.dumps({key: item}, ensure_ascii=False)
+    else:
+        yield json.dumps(data, ensure_ascii=False)
+
+
+def _kind(doc: Document) -> str:
+    meta = doc.metadata or {}
+    hint = " ".join(str(meta.get(k, "")) for k in ("mime", "content_type", "filename")) + " " + doc.source
+    if "csv" in hint:
+        return "csv"
+    if "json" in hint:
+        return "json"
+    return "text"
+
+
+def chunk_document(doc: Document) -> Iterator[str]:
+    """Pick row-group chunking for CSV/JSON documents and sliding windows otherwise."""
+    kind = _kind(doc)
+    if kind == "csv":
+        header, rows = _csv_records(doc.text)
+        return chunk_records(rows, header=header)
+    if kind == "json":
+        try:
+            data = json.loads(doc.text)
+        except ValueError:
+            return chunk_text(doc.text)
+        return chunk_records(_json_records(data))
+    return chunk_text(doc.text)
+
+
+def iter_chunks(docs: Iterable[Document]) -> Iterator[Document]:
+    """Lazily expand documents into chunk documents carrying their position and content hash."""
+    for doc in docs:
+        for i, text in enumerate(chunk_document(doc)):
+            meta = {**(doc.metadata or {}), "chunk": i, "hash": content_hash(text)}
+            yield Document(text=text, source=doc.source, metadata=meta)
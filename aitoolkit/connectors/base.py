@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Optional
 
 from ..storage import Document
 
@@ -17,6 +17,6 @@ class BaseConnector:
     def __init__(self, config: ConnectorConfig):
         self.config = config
 
-    def fetch(self) -> List[Document]:  # pragma: no cover - abstract
+    def fetch(self) -> Iterable[Document]:  # pragma: no cover - abstract
         raise NotImplementedError
 
@@ -3,13 +3,15 @@ from __future__ import annotations
 from typing import Any, Dict, List, Optional
 
 import requests
-from bs4 import BeautifulSoup
 
 from .base import BaseConnector, ConnectorConfig
+from ..http_cache import cached_get_text
 from ..storage import Document
 
 
 def _extract_text_from_html(html: str) -> str:
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     for tag in soup(["script", "style", "noscript"]):
         tag.decompose()
@@ -19,6 +21,12 @@ def _extract_text_from_html(html: str) -> str:
     return "\n".join(lines)
 
 
+def _extract_text(r: requests.Response) -> str:
+    if "html" in r.headers.get("content-type", ""):
+        return _extract_text_from_html(r.text)
+    return r.text
+
+
 class HTTPConnector(BaseConnector):
     """Fetches text from a URL with optional auth.
 
@@ -41,12 +49,8 @@ class HTTPConnector(BaseConnector):
         elif auth_type == "bearer":
             token = p.get("token", "")
             headers = {**headers, "Authorization": f"Bearer {token}"}
-        r = requests.get(url, headers=headers, auth=auth, timeout=30)
-        r.raise_for_status()
-        content_type = r.headers.get("content-type", "")
-        if "html" in content_type:
-            text = _extract_text_from_html(r.text)
-        else:
-            text = r.text
+        text, content_type = cached_get_text(
+            url, _extract_text, headers=headers, auth=auth, timeout=30, variant="connector"
+        )
         return [Document(text=text, source=url, metadata={"content_type": content_type})]
 
@@ -1,56 +1,272 @@
 from __future__ import annotations
 
 import io
+import itertools
 import json
-from typing import Any, Dict, List
-
-import pandas as pd
+import os
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, TextIO, Tuple, TypeVar
 
 from .base import BaseConnector, ConnectorConfig
 from ..storage import Document
 
+# Rows (CSV) or records (JSON/JSONL) per yielded Document on average, and
+# characters per Document for plain text. Only one such group is in memory at a
+# time. Row and record groups end after a record picked by its hash (or at
+# _MAX_GROUP times the size), so inserting a row changes only its own group.
+UPLOAD_CSV_CHUNK_ROWS = int(os.environ.get("UPLOAD_CSV_CHUNK_ROWS", "2000"))
+UPLOAD_JSON_CHUNK_RECORDS = int(os.environ.get("UPLOAD_JSON_CHUNK_RECORDS", "1000"))
+UPLOAD_TEXT_CHUNK_CHARS = int(os.environ.get("UPLOAD_TEXT_CHUNK_CHARS", str(1 << 20)))
+_MAX_GROUP = 4
+
+_READ_SIZE = 1 << 16
+_WS = " \t\r\n"
+_DELIMITERS = _WS + ",]}:"
+
+
+T = TypeVar("T")
+
+
+def _anchored(records: Iterable[T], size: int, key: Callable[[T], str]) -> Iterator[List[T]]:
+    """Groups of about ``size`` records, each ending after a record whose ``key`` hashes into the bottom 1/size."""
+    cut = (1 << 32) // max(1, size)
+    group: List[T] = []
+    for record in records:
+        group.append(record)
+        if len(group) >= _MAX_GROUP * size or zlib.crc32(key(record).encode("utf-8", "ignore")) < cut:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def _csv_parts(fh: BinaryIO) -> Iterator[str]:
+    """CSV text per group of about ``UPLOAD_CSV_CHUNK_ROWS`` rows, each with the header row."""
+    import pandas as pd
+
+    reader = pd.read_csv(
+        fh, chunksize=UPLOAD_CSV_CHUNK_ROWS, dtype=str, keep_default_na=False, encoding_errors="ignore"
+    )
+    columns: List[str] = []
+
+    def rows() -> Iterator[Tuple[str, ...]]:
+        for frame in reader:
+            columns[:] = list(frame.columns)
+            yield from frame.itertuples(index=False, name=None)
+
+    empty = True
+    for group in _anchored(rows(), UPLOAD_CSV_CHUNK_ROWS, "\x1f".join):
+        empty = False
+        yield pd.DataFrame(group, columns=columns).to_csv(index=False)
+    if empty and columns:
+        yield pd.DataFrame(columns=columns).to_csv(index=False)
+
+
+class _JSONStream:
+    """Incremental parser for one top-level JSON array or object.
+
+    Array elements and object members are decoded one at a time from a
+    growing buffer, so memory is bounded by the largest single element.
+    Parsing stops at the first malformed element without raising: ``failed``
+    is set and ``rest()`` returns the text from that element on.
+    """
+
+    def __init__(self, fh: TextIO):
+        self.fh = fh
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.failed = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        # Read at least as much as is buffered, so one huge element costs
+        # O(log n) re-decodes rather than O(n).
+        data = self.fh.read(max(_READ_SIZE, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + data
+        self.pos = 0
+        return True
 
-def _text_from_csv_bytes(b: bytes, max_rows: int = 500) -> str:
-    df = pd.read_csv(io.BytesIO(b))
-    if len(df) > max_rows:
-        df = df.head(max_rows)
-    return df.to_csv(index=False)
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
 
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number cut by the end of the buffer ("1.5" of "1.5e10") may
+                # continue in the next read; accept only if a delimiter follows.
+                if self.eof or (end < len(self.buf) and self.buf[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                # Re-decode once more now that eof is known.
+                continue
 
-def _text_from_json_bytes(b: bytes) -> str:
-    try:
-        data = json.loads(b.decode("utf-8"))
-        return json.dumps(data, indent=2)
-    except Exception:
-        return b.decode("utf-8", errors="ignore")
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"expected {char!r} in JSON stream")
+        self.pos += 1
+
+    def rest(self) -> Iterator[str]:
+        """Lines of the input from the current position on."""
+        head = self.buf[self.pos :] + ("" if self.eof else self.fh.readline())
+        self.buf, self.pos = "", 0
+        return itertools.chain(io.StringIO(head), self.fh)
+
+    def records(self) -> Iterator[Any]:
+        """Array elements; for an object, ``{key: value}`` per member (list values fan out).
+
+        Anything after the top-level value (NDJSON saved as ``.json``) is read
+        as JSON lines.
+        """
+        try:
+            first = self._peek()
+            if first not in ("[", "{"):
+                yield self._value()
+            else:
+                self.pos += 1
+                yield from self._members(first)
+                self.pos += 1
+            trailing = self._peek() != ""
+        except ValueError:
+            self.failed = True
+            return
+        if trailing:
+            yield from _jsonl_records(self.rest())
+
+    def _members(self, first: str) -> Iterator[Any]:
+        close = "]" if first == "[" else "}"
+        while True:
+            start = self.pos
+            char = self._peek()
+            if char == ",":
+                self.pos += 1
+                continue
+            if char == close:
+                return
+            if char == "":
+                raise ValueError("unterminated JSON stream")
+            try:
+                if first == "[":
+                    yield self._value()
+                else:
+                    key = self._value()
+                    self._expect(":")
+                    value = self._value()
+                    for item in value if isinstance(value, list) else [value]:
+                        yield {key: item}
+            except ValueError:
+                # rest() then starts at the broken element
+                self.pos = start
+                raise
+
+
+def _jsonl_records(fh: Iterable[str]) -> Iterator[Any]:
+    for line in fh:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def _grouped(records: Iterator[Any], size: int) -> Iterator[str]:
+    """JSON array text per about ``size`` records, which chunking splits back into records."""
+    for group in _anchored(records, size, lambda record: json.dumps(record, sort_keys=True)):
+        yield json.dumps(group, ensure_ascii=False)
+
+
+def _text_parts(fh: Iterable[str]) -> Iterator[str]:
+    """Whole lines, about ``UPLOAD_TEXT_CHUNK_CHARS`` characters at a time."""
+    lines: List[str] = []
+    size = 0
+    for line in fh:
+        lines.append(line)
+        size += len(line)
+        if size >= UPLOAD_TEXT_CHUNK_CHARS:
+            yield "".join(lines)
+            lines, size = [], 0
+    if lines:
+        yield "".join(lines)
+
+
+def _kind(filename: str, mime: str) -> str:
+    name = filename.lower()
+    if mime in ("text/csv", "application/csv") or name.endswith(".csv"):
+        return "csv"
+    if mime in ("application/jsonl", "application/x-ndjson") or name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if mime in ("application/json",) or name.endswith(".json"):
+        return "json"
+    return "text"
 
 
 class UploadConnector(BaseConnector):
-    """Handles CSV/JSON/TXT uploads provided as bytes in params.
+    """Streams CSV/JSON/JSONL/TXT uploads into Documents in bounded memory.
 
     params expected:
       - filename: str
       - mime: str
-      - content: bytes
+      - path: str (preferred; the file is read incrementally)
+      - content: bytes (small in-memory uploads)
     """
 
-    def fetch(self) -> List[Document]:
+    def _open(self) -> BinaryIO:
+        p: Dict[str, Any] = self.config.params
+        if p.get("path"):
+            return open(p["path"], "rb")
+        return io.BytesIO(p.get("content", b""))
+
+    def _parts(self, kind: str, fh: BinaryIO) -> Iterator[Tuple[str, str]]:
+        """``(document mime, text)`` per bounded group of the file."""
+        if kind == "csv":
+            for text in _csv_parts(fh):
+                yield "text/csv", text
+            return
+        text_fh = io.TextIOWrapper(fh, encoding="utf-8", errors="ignore")
+        if kind == "text":
+            for text in _text_parts(text_fh):
+                yield "text/plain", text
+            return
+        if kind == "jsonl":
+            for text in _grouped(_jsonl_records(text_fh), UPLOAD_JSON_CHUNK_RECORDS):
+                yield "application/json", text
+            return
+        stream = _JSONStream(text_fh)
+        for text in _grouped(stream.records(), UPLOAD_JSON_CHUNK_RECORDS):
+            yield "application/json", text
+        if stream.failed:
+            # Malformed JSON: index what did not parse as plain text rather than fail the job
+            for text in _text_parts(stream.rest()):
+                yield "text/plain", text
+
+    def fetch(self) -> Iterator[Document]:
         p: Dict[str, Any] = self.config.params
         filename = p.get("filename", "upload")
         mime = p.get("mime", "text/plain")
-        content: bytes = p.get("content", b"")
-        text = ""
-        if mime in ("text/csv", "application/csv") or filename.endswith(".csv"):
-            text = _text_from_csv_bytes(content)
-        elif mime in ("application/json",) or filename.endswith(".json"):
-            text = _text_from_json_bytes(content)
-        else:
-            text = content.decode("utf-8", errors="ignore")
-        return [
-            Document(
-                text=text,
-                source=f"upload://{filename}",
-                metadata={"filename": filename, "mime": mime},
-            )
-        ]
-
+        kind = _kind(filename, mime)
+        with self._open() as fh:
+            for part, (doc_mime, text) in enumerate(self._parts(kind, fh)):
+                yield Document(
+                    text=text,
+                    source=f"upload://{filename}",
+                    metadata={"filename": filename, "mime": doc_mime, "part": part},
+                )
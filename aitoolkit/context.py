@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+# Prompt tokens (target-model tokenizer) available for retrieved context.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+# MMR trade-off: 1.0 = pure relevance, 0.0 = pure diversity.
+CONTEXT_MMR_LAMBDA = float(os.environ.get("CONTEXT_MMR_LAMBDA", "0.7"))
+# Candidates at least this similar to an already selected one are dropped outright.
+CONTEXT_DUPLICATE_SIM = float(os.environ.get("CONTEXT_DUPLICATE_SIM", "0.95"))
+# A snippet trimmed below this many tokens is not worth its slot.
+CONTEXT_MIN_TOKENS = int(os.environ.get("CONTEXT_MIN_TOKENS", "32"))
+# Retrieved chunks offered to the packer, and leading chunks taken per web page.
+CONTEXT_CANDIDATES = int(os.environ.get("CONTEXT_CANDIDATES", "12"))
+CONTEXT_WEB_CHUNKS = int(os.environ.get("CONTEXT_WEB_CHUNKS", "3"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+Counter = Callable[[List[str]], List[int]]
+
+
+@dataclass
+class Candidate:
+    text: str
+    source: str
+    vector: np.ndarray
+
+
+def _sentences(text: str) -> List[str]:
+    return [s for s in (p.strip() for p in _SENTENCE_END.split(text)) if s]
+
+
+def _trim(text: str, budget: int, count: Counter) -> Tuple[str, int]:
+    """Longest run of leading whole sentences within ``budget`` tokens."""
+    sentences = _sentences(text)
+    if not sentences:
+        return "", 0
+    sizes = count(sentences)
+    kept, used = [], 0
+    for sentence, size in zip(sentences, sizes):
+        if used + size > budget:
+            break
+        kept.append(sentence)
+        used += size
+    return " ".join(kept), used
+
+
+def pack_context(
+    query_vec: np.ndarray,
+    candidates: List[Candidate],
+    count: Counter,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+) -> Tuple[List[str], Dict[str, Any]]:
+    """Select snippets by maximal marginal relevance until ``budget`` tokens are used.
+
+    Relevance and redundancy are cosine similarities over the candidates'
+    existing embeddings. A snippet that does not fit is trimmed to whole
+    sentences; if too little remains it is dropped. Returns the snippets in
+    selection order and a report of every candidate's fate and scores.
+    """
+    report: Dict[str, Any] = {"budget": budget, "used_tokens": 0, "selected": [], "dropped": []}
+    if not candidates:
+        return [], report
+    vecs = np.vstack([np.asarray(c.vector, dtype=np.float32) for c in candidates])
+    relevance = vecs @ np.asarray(query_vec, dtype=np.float32)
+    pairwise = vecs @ vecs.T
+    tokens = count([c.text for c in candidates])
+    remaining = list(range(len(candidates)))
+    chosen: List[int] = []
+    snippets: List[str] = []
+    used = 0
+
+    def entry(i: int, mmr: float, status: str, n_tokens: int) -> Dict[str, Any]:
+        return {
+            "source": candidates[i].source,
+            "relevance": round(float(relevance[i]), 4),
+            "mmr": round(float(mmr), 4),
+            "tokens": n_tokens,
+            "status": status,
+            "preview": candidates[i].text[:120],
+        }
+
+    while remaining:
+        redundancy = pairwise[np.ix_(remaining, chosen)].max(axis=1) if chosen else np.zeros(len(remaining))
+        mmr = mmr_lambda * relevance[remaining] - (1.0 - mmr_lambda) * redundancy
+        pos = int(np.argmax(mmr))
+        i = remaining.pop(pos)
+        if chosen and redundancy[pos] >= CONTEXT_DUPLICATE_SIM:
+            report["dropped"].append(entry(i, mmr[pos], "duplicate", tokens[i]))
+            continue
+        left = budget - used
+        text, n_tokens, status = candidates[i].text, tokens[i], "selected"
+        if n_tokens > left:
+            text, n_tokens = _trim(text, left, count) if left >= CONTEXT_MIN_TOKENS else ("", 0)
+            status = "trimmed"
+            if n_tokens < min(CONTEXT_MIN_TOKENS, tokens[i]) or not text:
+                report["dropped"].append(entry(i, mmr[pos], "over budget", tokens[i]))
+                continue
+        chosen.append(i)
+        snippets.append(text)
+        used += n_tokens
+        report["selected"].append(entry(i, mmr[pos], status, n_tokens))
+    report["used_tokens"] = used
+    return snippets, report
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+# Query terms kept for the BM25 match; very common words only add postings to scan.
+_MAX_TERMS = 32
+_TERM = re.compile(r"\w(?:[\w.\-/]*\w)?")
+# What the unicode61 tokenizer keeps of a term (it splits on "_", "-", "." etc.).
+_TOKEN = re.compile(r"[^\W_]+")
+# Terms in fewer rows than this are always matched; scoring that many is cheap.
+_MIN_DF_LIMIT = 1000
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how in into is it its of on or our so that the their this to "
+    "we what when which with".split()
+)
+
+
+def query_terms(query: str) -> List[str]:
+    terms: List[str] = []
+    for term in _TERM.findall(query.lower()):
+        if term not in _STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms[:_MAX_TERMS]
+
+
+def match_expression(terms: List[str]) -> str:
+    """FTS5 MATCH string OR-ing ``terms``, each quoted as a phrase.
+
+    Quoting keeps identifiers such as ``ERR_TIMEOUT`` or ``checkout-v2`` intact:
+    FTS5 tokenizes the phrase like the indexed text and matches the pieces
+    adjacently, and no query text can be read as FTS5 syntax.
+    """
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+class DocStore:
+    """Chunk text and metadata keyed by index row id, with an FTS5 index.
+
+    Rows are written alongside each vector segment and read back by id only
+    for the hits a query keeps, so no query loads the full metadata. Chunks
+    are stored once per content hash; ``doc_owners`` records every connection
+    whose fetch contained a hash, so a refresh of one connection does not
+    remove rows another still references. The FTS5
+    table is external-content (it indexes ``docs`` without a second copy of
+    the text); if this SQLite build lacks FTS5, lexical search returns nothing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fts = False
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # term -> number of rows containing it; cleared on every write.
+        self._doc_freq: Dict[str, int] = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "id INTEGER PRIMARY KEY, text TEXT NOT NULL, source TEXT NOT NULL, metadata TEXT, hash TEXT, "
+                "connection TEXT)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(docs)")}
+            if "connection" not in columns:
+                # Stores written before connections were tracked; their rows stay NULL
+                self._conn.execute("ALTER TABLE docs ADD COLUMN connection TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS docs_hash ON docs(hash)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS docs_connection ON docs(connection, source)")
+            tables = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if "doc_owners" not in tables:
+                with self._conn:
+                    self._conn.execute(
+                        "CREATE TABLE doc_owners (connection TEXT NOT NULL, hash TEXT NOT NULL, "
+                        "PRIMARY KEY (connection, hash)) WITHOUT ROWID"
+                    )
+                    self._conn.execute("CREATE INDEX doc_owners_hash ON doc_owners(hash)")
+                    # Stores from before ownership was shared: each row's own connection owns it
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO doc_owners SELECT connection, hash FROM docs "
+                        "WHERE connection IS NOT NULL AND hash IS NOT NULL"
+                    )
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5("
+                    "text, source, content='docs', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                )
+                self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS docs_vocab USING fts5vocab(docs_fts, 'row')")
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+        return self._conn
+
+    def close(self):
+        """Close the connection and drop cached term frequencies; the next call reopens it."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._doc_freq = {}
+
+    def _truncate(self, db: sqlite3.Connection, start: int):
+        """Drop rows at or past ``start`` (left by an append that never reached the manifest)."""
+        if self.fts:
+            db.execute(
+                "INSERT INTO docs_fts(docs_fts, rowid, text, source) "
+                "SELECT 'delete', id, text, source FROM docs WHERE id >= ?",
+                (start,),
+            )
+        db.execute("DELETE FROM docs WHERE id >= ?", (start,))
+
+    def put(self, start: int, metas: Sequence[Dict[str, Any]]):
+        """Store ``metas`` (``asdict(Document)``) as rows ``start, start + 1, ...``."""
+        rows = [
+            (
+                start + i,
+                m["text"],
+                m.get("source", ""),
+                json.dumps(m.get("metadata")),
+                (m.get("metadata") or {}).get("hash"),
+                (m.get("metadata") or {}).get("connection"),
+            )
+            for i, m in enumerate(metas)
+        ]
+        with self._lock:
+            db = self._db()
+            self._doc_freq = {}
+            with db:
+                self._truncate(db, start)
+                db.executemany(
+                    "INSERT INTO docs (id, text, source, metadata, hash, connection) VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                db.executemany(
+                    "INSERT OR IGNORE INTO doc_owners (connection, hash) VALUES (?, ?)",
+                    [(row[5], row[4]) for row in rows if row[4] and row[5]],
+                )
+                if self.fts:
+                    db.execute(
+                        "INSERT INTO docs_fts(rowid, text, source) SELECT id, text, source FROM docs WHERE id >= ?",
+                        (start,),
+                    )
+
+    @staticmethod
+    def _meta(row: Tuple[str, str, Optional[str]]) -> Dict[str, Any]:
+        return {"text": row[0], "source": row[1], "metadata": json.loads(row[2]) if row[2] else None}
+
+    def delete(self, ids: Sequence[int]):
+        """Remove rows (tombstoned or compacted away) from the table and the FTS index."""
+        unique = list(dict.fromkeys(int(i) for i in ids))
+        with self._lock:
+            db = self._db()
+            self._doc_freq = {}
+            with db:
+                for start in range(0, len(unique), 500):
+                    part = unique[start : start + 500]
+                    marks = ",".join("?" * len(part))
+                    if self.fts:
+                        db.execute(
+                            "INSERT INTO docs_fts(docs_fts, rowid, text, source) "
+                            f"SELECT 'delete', id, text, source FROM docs WHERE id IN ({marks})",
+                            part,
+                        )
+                    db.execute(f"DELETE FROM docs WHERE id IN ({marks})", part)
+
+    def get(self, ids: Sequence[int]) -> List[Optional[Dict[str, Any]]]:
+        """Metadata for ``ids``, in the given order; None for rows deleted meanwhile."""
+        found: Dict[int, Dict[str, Any]] = {}
+        unique = list(dict.fromkeys(int(i) for i in ids))
+        with self._lock:
+            db = self._db()
+            for start in range(0, len(unique), 500):
+                part = unique[start : start + 500]
+                rows = db.execute(
+                    f"SELECT id, text, source, metadata FROM docs WHERE id IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update((row[0], self._meta(row[1:])) for row in rows)
+        return [found.get(int(i)) for i in ids]
+
+    def scan(self, stop: int, batch: int = 5000) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """``(id, metadata)`` of rows below ``stop`` in id order, read ``batch`` at a time."""
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._db().execute(
+                    "SELECT id, text, source, metadata FROM docs WHERE id > ? AND id < ? ORDER BY id LIMIT ?",
+                    (last, stop, batch),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], self._meta(row[1:])
+            last = rows[-1][0]
+
+    def hashes(self, stop: int) -> Set[str]:
+        with self._lock:
+            rows = self._db().execute("SELECT hash FROM docs WHERE hash IS NOT NULL AND id < ?", (stop,))
+            return {h for (h,) in rows.fetchall()}
+
+    def owned(self, connection: str, sources: Sequence[str], stop: int) -> List[Tuple[int, Optional[str]]]:
+        """``(id, hash)`` of the rows holding a hash the connection owns.
+
+        Rows written before connections were recorded (``connection`` NULL)
+        are attributed by ``sources`` instead.
+        """
+        sql = (
+            "SELECT id, hash FROM docs WHERE id < ? AND (connection = ? "
+            "OR hash IN (SELECT hash FROM doc_owners WHERE connection = ?)"
+        )
+        params: List[Any] = [stop, connection, connection]
+        if sources:
+            sql += f" OR (connection IS NULL AND source IN ({','.join('?' * len(sources))}))"
+            params.extend(sources)
+        with self._lock:
+            return [(int(i), h) for i, h in self._db().execute(sql + ")", params).fetchall()]
+
+    def claim(self, connection: str, hashes: Sequence[str]):
+        """Record that ``connection``'s latest fetch contains these hashes."""
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "INSERT OR IGNORE INTO doc_owners (connection, hash) VALUES (?, ?)",
+                    [(connection, h) for h in hashes],
+                )
+
+    def adopt(self, connection: str, sources: Sequence[str]):
+        """Tag rows from before connections were recorded with the connection that claims them.
+
+        Only rows from ``sources`` whose hash the connection claims are tagged,
+        so later refreshes find them without the connection's original sources.
+        """
+        if not sources:
+            return
+        with self._lock:
+            db = self._db()
+            with db:
+                marks = ",".join("?" * len(sources))
+                db.execute(
+                    f"UPDATE docs SET connection = ? WHERE connection IS NULL AND source IN ({marks}) "
+                    "AND hash IN (SELECT hash FROM doc_owners WHERE connection = ?)",
+                    [connection, *sources, connection],
+                )
+
+    def release(self, connection: str, hashes: Sequence[str]) -> Set[str]:
+        """Drop ``connection``'s claim on ``hashes``; returns those no connection claims any more."""
+        hashes = list(dict.fromkeys(hashes))
+        kept: Set[str] = set()
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    "DELETE FROM doc_owners WHERE connection = ? AND hash = ?", [(connection, h) for h in hashes]
+                )
+                for start in range(0, len(hashes), 500):
+                    part = hashes[start : start + 500]
+                    rows = db.execute(
+                        f"SELECT DISTINCT hash FROM doc_owners WHERE hash IN ({','.join('?' * len(part))})", part
+                    )
+                    kept.update(h for (h,) in rows.fetchall())
+        return set(hashes) - kept
+
+    def _frequencies(self, db: sqlite3.Connection, tokens: List[str]) -> Dict[str, int]:
+        missing = [t for t in tokens if t not in self._doc_freq]
+        if missing:
+            rows = db.execute(
+                f"SELECT term, doc FROM docs_vocab WHERE term IN ({','.join('?' * len(missing))})", missing
+            ).fetchall()
+            self._doc_freq.update(dict.fromkeys(missing, 0))
+            self._doc_freq.update(rows)
+        return {t: self._doc_freq[t] for t in tokens}
+
+    def _selective(self, db: sqlite3.Connection, terms: List[str], limit: float) -> List[str]:
+        """Terms matching at least one and at most ``limit`` rows.
+
+        A term in most rows barely moves BM25 but makes FTS5 score every row
+        it occurs in; a phrase is bounded by its rarest token.
+        """
+        parts = {t: _TOKEN.findall(t) for t in terms}
+        freq = self._frequencies(db, sorted({tok for toks in parts.values() for tok in toks}))
+        return [t for t, toks in parts.items() if toks and 0 < min(freq[tok] for tok in toks) <= limit]
+
+    def search(self, query: str, k: int, stop: int, max_df: float = 1.0) -> List[Tuple[int, float]]:
+        """Top-k ``(row_id, score)`` by BM25 among rows below ``stop``; higher scores are better.
+
+        Terms found in more than ``max_df`` of the rows (and over ``_MIN_DF_LIMIT``
+        rows) are left out of the match.
+        """
+        terms = query_terms(query)
+        if not terms or k <= 0:
+            return []
+        with self._lock:
+            db = self._db()
+            if not self.fts:
+                return []
+            if max_df < 1.0:
+                terms = self._selective(db, terms, max(_MIN_DF_LIMIT, max_df * stop))
+            expr = match_expression(terms)
+            if not expr:
+                return []
+            try:
+                rows = db.execute(
+                    "SELECT rowid, bm25(docs_fts) AS rank FROM docs_fts "
+                    "WHERE docs_fts MATCH ? AND rowid < ? ORDER BY rank LIMIT ?",
+                    (expr, stop, k),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        # FTS5's bm25() is negative, more negative meaning more relevant.
+        return [(int(i), -float(rank)) for i, rank in rows]
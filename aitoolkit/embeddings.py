@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import threading
 from dataclasses import dataclass
 from typing import List, Tuple, Dict, Any
 
@@ -8,29 +9,80 @@ import numpy as np
 
 _MODEL_ID = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 _EMB = None
+_EMB_LOCK = threading.Lock()
 
 
 def _ensure_model():
+    """Load the model once; concurrent callers (e.g. warm-up and a first query) share it."""
     global _EMB
     if _EMB is None:
-        from sentence_transformers import SentenceTransformer
+        with _EMB_LOCK:
+            if _EMB is None:
+                from sentence_transformers import SentenceTransformer
 
-        _EMB = SentenceTransformer(_MODEL_ID)
+                _EMB = SentenceTransformer(_MODEL_ID)
     return _EMB
 
 
-def embed_texts(texts: List[str]) -> np.ndarray:
+def _encode(texts: List[str]) -> np.ndarray:
     model = _ensure_model()
     vectors = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
     return vectors.astype(np.float32)
 
 
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed texts, consulting the persistent embedding cache before the model."""
+    from .embed_cache import get_cache
+
+    cache = get_cache()
+    if cache is None or not texts:
+        return _encode(texts)
+    keys = [cache.key(_MODEL_ID, t) for t in texts]
+    found = cache.get_many(keys)
+    missing = {k: t for k, t in zip(keys, texts) if k not in found}
+    if missing:
+        computed = dict(zip(missing, _encode(list(missing.values()))))
+        cache.put_many(computed)
+        found.update(computed)
+    return np.vstack([found[k] for k in keys]).astype(np.float32)
+
+
+def max_tokens() -> int:
+    """Token budget per text before the model truncates (special tokens excluded)."""
+    return int(_ensure_model().max_seq_length) - 2
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    tokenizer = _ensure_model().tokenizer
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+
+def split_by_tokens(text: str, max_len: int) -> List[str]:
+    """Hard-split one text into pieces of at most ``max_len`` tokens."""
+    enc = _ensure_model().tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = enc["offset_mapping"]
+    pieces = []
+    for start in range(0, len(offsets), max_len):
+        window = offsets[start : start + max_len]
+        pieces.append(text[window[0][0] : window[-1][1]])
+    return pieces
+
+
 def cosine_sim_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
     return a @ b.T
 
 
-def top_k_similar(query_vec: np.ndarray, doc_vecs: np.ndarray, k: int = 5) -> List[int]:
+def top_k_with_scores(query_vec: np.ndarray, doc_vecs: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k by inner product; O(n) selection instead of a full sort."""
     sims = (doc_vecs @ query_vec).reshape(-1)
-    idx = np.argsort(-sims)[:k]
-    return idx.tolist()
+    k = min(k, len(sims))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    idx = np.argpartition(-sims, k - 1)[:k]
+    idx = idx[np.argsort(-sims[idx])]
+    return idx, sims[idx]
+
+
+def top_k_similar(query_vec: np.ndarray, doc_vecs: np.ndarray, k: int = 5) -> List[int]:
+    return top_k_with_scores(query_vec, doc_vecs, k)[0].tolist()
 
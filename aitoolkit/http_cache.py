@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+from . import transport
+from .storage import DATA_DIR, ensure_data_dir
+
+HTTP_CACHE_PATH = os.path.join(DATA_DIR, "http_cache.sqlite")
+# Freshness used when the response carries no Cache-Control max-age/Expires.
+HTTP_CACHE_TTL = float(os.environ.get("HTTP_CACHE_TTL", "3600"))
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+HTTP_CACHE_ENABLED = os.environ.get("HTTP_CACHE", "1") != "0"
+
+Extract = Callable[[requests.Response], str]
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)")
+
+
+def auth_identity(headers: Optional[Dict[str, str]] = None, auth: Optional[Tuple[str, str]] = None) -> str:
+    """Stable digest of the credentials a request is made with; secrets are never stored."""
+    parts = [f"{k.lower()}={v}" for k, v in sorted((headers or {}).items()) if k.lower() in ("authorization", "cookie")]
+    if auth:
+        parts.append(f"basic={auth[0]}:{auth[1]}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest() if parts else ""
+
+
+def _freshness(r: requests.Response, default_ttl: float) -> Optional[float]:
+    """Seconds the response may be served without revalidation; None = do not store."""
+    cc = r.headers.get("Cache-Control", "").lower()
+    if "no-store" in cc:
+        return None
+    if "no-cache" in cc:
+        return 0.0
+    m = _MAX_AGE.search(cc)
+    if m:
+        return float(m.group(1))
+    expires = r.headers.get("Expires")
+    if expires:
+        try:
+            return max(0.0, parsedate_to_datetime(expires).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+    return default_ttl
+
+
+class HTTPCache:
+    """SQLite-backed cache of *extracted text* per (URL, auth identity).
+
+    Fresh entries are served without a request; stale entries with an ETag or
+    Last-Modified are revalidated with a conditional GET. Total stored text is
+    capped, evicting least recently used entries.
+    """
+
+    def __init__(self, path: str = HTTP_CACHE_PATH, ttl: float = HTTP_CACHE_TTL, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_data_dir()
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, url TEXT NOT NULL, text TEXT NOT NULL, content_type TEXT, "
+                "etag TEXT, last_modified TEXT, expires_at REAL NOT NULL, size INTEGER NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        return self._conn
+
+    @staticmethod
+    def key(url: str, identity: str = "", variant: str = "") -> str:
+        return hashlib.sha256(f"{variant}\n{url}\n{identity}".encode("utf-8")).hexdigest()
+
+    def _get(self, key: str):
+        with self._lock:
+            return self._db().execute(
+                "SELECT text, content_type, etag, last_modified, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _touch(self, key: str, expires_at: Optional[float] = None):
+        with self._lock:
+            db = self._db()
+            if expires_at is None:
+                db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            else:
+                db.execute(
+                    "UPDATE responses SET last_used = ?, expires_at = ? WHERE key = ?", (time.time(), expires_at, key)
+                )
+            db.commit()
+
+    def _put(self, key: str, url: str, text: str, r: requests.Response, fresh_for: float):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    text,
+                    r.headers.get("content-type", ""),
+                    r.headers.get("ETag"),
+                    r.headers.get("Last-Modified"),
+                    now + fresh_for,
+                    size,
+                    now,
+                ),
+            )
+            (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if total > self.max_bytes:
+                # Drop oldest entries until the running total fits again.
+                excess = total - self.max_bytes
+                doomed = []
+                for k, s in db.execute("SELECT key, size FROM responses ORDER BY last_used ASC"):
+                    if excess <= 0:
+                        break
+                    doomed.append((k,))
+                    excess -= s
+                db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            db.commit()
+
+    def fetch(
+        self,
+        url: str,
+        extract: Extract,
+        headers: Optional[Dict[str, str]] = None,
+        auth: Optional[Tuple[str, str]] = None,
+        timeout: float = 30,
+        variant: str = "",
+        retries: bool = True,
+    ) -> Tuple[str, str]:
+        """Return ``(text, content_type)`` for ``url``, from cache when possible.
+
+        ``variant`` separates callers that extract different text from the same URL;
+        ``retries=False`` makes a single attempt, for callers working to a deadline.
+        """
+        key = self.key(url, auth_identity(headers, auth), variant)
+        row = self._get(key)
+        req_headers = dict(headers or {})
+        if row is not None:
+            text, content_type, etag, last_modified, expires_at = row
+            if time.time() < expires_at:
+                self.hits += 1
+                self._touch(key)
+                return text, content_type
+            if etag:
+                req_headers["If-None-Match"] = etag
+            if last_modified:
+                req_headers["If-Modified-Since"] = last_modified
+        with transport.get(url, headers=req_headers, auth=auth, timeout=timeout, retries=retries, stream=True) as r:
+            if r.status_code == 304 and row is not None:
+                self.revalidated += 1
+                fresh_for = _freshness(r, self.ttl)
+                self._touch(key, time.time() + (fresh_for or 0.0))
+                return row[0], row[1]
+            r.raise_for_status()
+            self.misses += 1
+            text = extract(r)
+            fresh_for = _freshness(r, self.ttl)
+            if fresh_for is not None:
+                self._put(key, url, text, r, fresh_for)
+            return text, r.headers.get("content-type", "")
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.revalidated + self.misses
+        served = self.hits + self.revalidated
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": served / total if total else 0.0,
+        }
+
+
+_CACHE: Optional[HTTPCache] = None
+
+
+def get_http_cache() -> HTTPCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = HTTPCache()
+    return _CACHE
+
+
+def cached_get_text(
+    url: str,
+    extract: Extract,
+    headers: Optional[Dict[str, str]] = None,
+    auth: Optional[Tuple[str, str]] = None,
+    timeout: float = 30,
+    variant: str = "",
+    retries: bool = True,
+) -> Tuple[str, str]:
+    """Fetch ``url`` and extract text, going through the shared cache unless disabled."""
+    if HTTP_CACHE_ENABLED:
+        return get_http_cache().fetch(
+            url, extract, headers=headers, auth=auth, timeout=timeout, variant=variant, retries=retries
+        )
+    with transport.get(url, headers=headers, auth=auth, timeout=timeout, retries=retries, stream=True) as r:
+        r.raise_for_status()
+        return extract(r), r.headers.get("content-type", "")
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .chunking import iter_chunks
+from .embeddings import embed_texts
+from .metrics import INGEST_CHUNKS, METRICS_ENABLED, observe_stage, timed
+from .storage import DEFAULT_NAMESPACE, Document, append_to_index, get_index, tombstone_rows
+
+# Chunks per encode() call, and chunks per committed index segment. Memory is
+# bounded by the commit size regardless of how large the source is.
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+INGEST_COMMIT_ROWS = int(os.environ.get("INGEST_COMMIT_ROWS", "4096"))
+
+Progress = Callable[[int], None]
+# Both receive the target namespace as their last argument
+Append = Callable[[List[Document], np.ndarray, str], None]
+Remove = Callable[[List[int], str], int]
+
+
+def ingest_documents(
+    docs: Iterable[Document],
+    batch_size: int = EMBED_BATCH_SIZE,
+    commit_rows: int = INGEST_COMMIT_ROWS,
+    progress: Optional[Progress] = None,
+    append: Append = append_to_index,
+    connection: Optional[str] = None,
+    fetched: Optional[Set[str]] = None,
+    namespace: str = DEFAULT_NAMESPACE,
+) -> int:
+    """Chunk -> embed in fixed-size batches -> append incrementally.
+
+    ``docs`` may be a generator; nothing beyond one commit group of chunks and
+    their vectors is held at a time. Chunks whose content hash is already in
+    the index (or earlier in this run) are skipped rather than stored twice.
+    ``progress`` receives the number of chunks embedded so far after every
+    batch; ``append`` commits a group (the job queue routes it through its
+    single index writer). Embedding and commit time are exported per batch
+    as the ``ingest_embed``/``ingest_commit`` stages, the whole call as
+    ``ingest``. Chunks are tagged with ``connection`` and the connection
+    claims every chunk hash seen (stored or deduplicated), so a later refresh
+    can find them; those hashes are also added to ``fetched``. Everything is read from and written to ``namespace``'s
+    index. Returns the number of chunks indexed.
+    """
+    start = time.perf_counter()
+    pending: List[Document] = []
+    vectors: List[np.ndarray] = []
+    batch: List[Document] = []
+    total = 0
+    index = get_index(namespace)
+    known = index.content_hashes()
+    seen: Set[str] = set()
+
+    def embed_batch():
+        with timed("ingest_embed"):
+            vectors.append(embed_texts([d.text for d in batch]))
+        pending.extend(batch)
+        batch.clear()
+        if progress is not None:
+            progress(total + len(pending))
+
+    def commit():
+        nonlocal total
+        with timed("ingest_commit"):
+            append(pending, np.vstack(vectors), namespace)
+        if METRICS_ENABLED:
+            INGEST_CHUNKS.inc(len(pending))
+        total += len(pending)
+        pending.clear()
+        vectors.clear()
+
+    for chunk in iter_chunks(docs):
+        digest = chunk.metadata["hash"]
+        if fetched is not None:
+            fetched.add(digest)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        if digest in known:
+            continue
+        if connection is not None:
+            chunk.metadata["connection"] = connection
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            embed_batch()
+            if len(pending) >= commit_rows:
+                commit()
+    if batch:
+        embed_batch()
+    if pending:
+        commit()
+    if connection is not None:
+        index.claim(connection, seen)
+    observe_stage("ingest", time.perf_counter() - start)
+    return total
+
+
+def sync_documents(
+    docs: Iterable[Document],
+    connection: str,
+    sources: Sequence[str] = (),
+    progress: Optional[Progress] = None,
+    append: Append = append_to_index,
+    remove: Remove = tombstone_rows,
+    namespace: str = DEFAULT_NAMESPACE,
+) -> Tuple[int, int]:
+    """Bring a connection's rows in line with a fresh fetch of it.
+
+    Chunks are diffed by content hash against the hashes the connection
+    owns (``sources`` attributes rows from before connections were recorded):
+    only new or changed chunks are embedded and appended. Hashes gone from the
+    fetch lose this connection's claim, and their rows are tombstoned once the
+    additions are committed (so retrieval never sees the source half-updated)
+    unless another connection still claims them. Rows attributed by
+    ``sources`` that survive are then tagged with ``connection``, since the
+    sources change once an upload is refreshed under a new file name.
+    Returns ``(added, removed)``.
+    """
+    index = get_index(namespace)
+    owned = index.connection_rows(connection, list(sources))
+    fetched: Set[str] = set()
+    added = ingest_documents(
+        docs, progress=progress, append=append, connection=connection, fetched=fetched, namespace=namespace
+    )
+    orphaned = index.release(connection, [digest for digest in owned if digest not in fetched])
+    stale = [row_id for digest in orphaned for row_id in owned[digest]]
+    removed = remove(stale, namespace) if stale else 0
+    index.adopt(connection, sources)
+    return added, removed
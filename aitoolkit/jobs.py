@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import json
+import mimetypes
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .connectors.base import ConnectorConfig
+from .ingest import ingest_documents, sync_documents
+from .storage import (
+    DATA_DIR,
+    DEFAULT_NAMESPACE,
+    Document,
+    append_to_index,
+    ensure_data_dir,
+    load_connections,
+    new_connection_id,
+    normalize_namespace,
+    save_connections,
+)
+
+JOBS_PATH = os.path.join(DATA_DIR, "jobs.sqlite")
+# Uploads are copied here when queued so a job survives the temp file and restarts.
+UPLOADS_DIR = os.path.join(DATA_DIR, "uploads")
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+# Commit groups waiting for the index writer before workers block.
+INGEST_WRITE_QUEUE = int(os.environ.get("INGEST_WRITE_QUEUE", "4"))
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+# Minimum seconds between progress writes for one job.
+_PROGRESS_INTERVAL = 0.5
+
+_JOB_FIELDS = ("id", "type", "name", "status", "docs", "chunks", "removed", "error", "created", "started", "finished")
+# Job params that steer the run and are not saved with the connection.
+_RUN_PARAMS = ("path", "connection", "refresh", "sources", "namespace")
+
+
+class IndexWriter:
+    """Single thread that performs every index commit for the job workers.
+
+    Workers fetch, chunk and embed in parallel; their commit groups are
+    applied one at a time in arrival order. The bounded queue applies
+    back-pressure when embedding outpaces writing.
+    """
+
+    def __init__(self, maxsize: int = INGEST_WRITE_QUEUE):
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._loop, name="index-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, docs: List[Document], vectors: np.ndarray, namespace: str = DEFAULT_NAMESPACE):
+        done: Future = Future()
+        self._queue.put((list(docs), np.array(vectors, dtype=np.float32), namespace, done))
+        done.result()
+
+    def _loop(self):
+        while True:
+            docs, vectors, namespace, done = self._queue.get()
+            try:
+                append_to_index(docs, vectors, namespace)
+                done.set_result(None)
+            except Exception as ex:  # surfaced to the submitting job
+                done.set_exception(ex)
+
+
+def _fetch(kind: str, cfg: ConnectorConfig) -> Iterable[Document]:
+    if kind == "upload":
+        from .connectors.upload import UploadConnector
+
+        return UploadConnector(cfg).fetch()
+    if kind == "http":
+        from .connectors.http import HTTPConnector
+
+        return HTTPConnector(cfg).fetch()
+    raise ValueError(f"Unsupported source type: {kind}")
+
+
+def _sources(conn: Dict[str, Any]) -> List[str]:
+    """``Document.source`` values of a connection's rows, for rows stored before connection ids."""
+    params = conn.get("params") or {}
+    if conn["type"] == "upload" and params.get("filename"):
+        return [f"upload://{params['filename']}"]
+    if conn["type"] == "http" and params.get("url"):
+        return [params["url"]]
+    return []
+
+
+class JobQueue:
+    """Persistent (SQLite) queue of ingestion jobs served by a worker pool.
+
+    Jobs record status and progress (documents fetched, chunks embedded) as
+    they run; jobs left ``running`` by a previous process are re-queued on
+    start. A finished job adds its connection to ``connections.json``; a
+    refresh job re-syncs a saved connection and updates its entry. Each job
+    writes to the index of the namespace in its ``namespace`` param.
+    """
+
+    def __init__(self, path: str = JOBS_PATH, workers: int = INGEST_WORKERS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wake = threading.Condition()
+        self._writer = IndexWriter()
+        with self._lock:
+            self._db().execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._db().commit()
+        self._workers = [
+            threading.Thread(target=self._loop, name=f"ingest-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_data_dir()
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, name TEXT NOT NULL, "
+                "params TEXT NOT NULL, status TEXT NOT NULL, docs INTEGER NOT NULL DEFAULT 0, "
+                "chunks INTEGER NOT NULL DEFAULT 0, removed INTEGER NOT NULL DEFAULT 0, error TEXT, "
+                "created REAL NOT NULL, started REAL, finished REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "removed" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN removed INTEGER NOT NULL DEFAULT 0")
+        return self._conn
+
+    def submit(self, kind: str, name: str, params: Dict[str, Any], namespace: str = DEFAULT_NAMESPACE) -> int:
+        """Queue a source for ingestion into ``namespace``; uploads are copied out of their temp location first.
+
+        Raises ValueError for a malformed namespace name.
+        """
+        params = dict(params)
+        params.setdefault("connection", new_connection_id())
+        params["namespace"] = normalize_namespace(namespace)
+        if kind == "upload" and params.get("path"):
+            os.makedirs(UPLOADS_DIR, exist_ok=True)
+            dest = os.path.join(UPLOADS_DIR, f"{time.time_ns()}-{os.path.basename(params['path'])}")
+            shutil.copyfile(params["path"], dest)
+            params["path"] = dest
+        with self._lock:
+            cur = self._db().execute(
+                "INSERT INTO jobs (type, name, params, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (kind, name, json.dumps(params), time.time()),
+            )
+            self._db().commit()
+            job_id = int(cur.lastrowid)
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def refresh(self, connection_id: str, path: Optional[str] = None) -> int:
+        """Queue a re-sync of a saved connection.
+
+        URLs are fetched again; an upload's file is not kept after ingestion,
+        so refreshing one needs the new version at ``path``.
+        """
+        conn = next((c for c in load_connections() if c["id"] == connection_id), None)
+        if conn is None:
+            raise ValueError(f"Unknown connection: {connection_id}")
+        params = {k: v for k, v in conn["params"].items() if k != "size"}
+        if conn["type"] == "upload":
+            if not path:
+                raise ValueError("Refreshing an upload needs the new file.")
+            filename = os.path.basename(path)
+            params.update(filename=filename, mime=mimetypes.guess_type(filename)[0] or "text/plain", path=path)
+        params.update(connection=connection_id, refresh=True, sources=_sources(conn))
+        return self.submit(conn["type"], conn["name"], params, conn.get("namespace", DEFAULT_NAMESPACE))
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT id, type, name, params FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._db().execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row[0]))
+            self._db().commit()
+        return {"id": row[0], "type": row[1], "name": row[2], "params": json.loads(row[3])}
+
+    def _update(self, job_id: int, **fields: Any):
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._db().execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+            self._db().commit()
+
+    def _run(self, job: Dict[str, Any]):
+        job_id, params = job["id"], job["params"]
+        progress = {"docs": 0, "chunks": 0}
+        last_write = 0.0
+
+        def report(**counts: int):
+            nonlocal last_write
+            progress.update(counts)
+            now = time.monotonic()
+            if now - last_write >= _PROGRESS_INTERVAL:
+                last_write = now
+                self._update(job_id, **progress)
+
+        def counted(docs: Iterable[Document]) -> Iterator[Document]:
+            for doc in docs:
+                report(docs=progress["docs"] + 1)
+                yield doc
+
+        cfg = ConnectorConfig(type=job["type"], name=job["name"], params=params)
+        docs = counted(_fetch(job["type"], cfg))
+        # Jobs queued before connection ids existed get one here
+        connection = params.get("connection") or new_connection_id()
+        namespace = params.get("namespace", DEFAULT_NAMESPACE)
+        removed = 0
+        if params.get("refresh"):
+            chunks, removed = sync_documents(
+                docs,
+                connection,
+                params.get("sources", []),
+                progress=lambda n: report(chunks=n),
+                append=self._writer.append,
+                namespace=namespace,
+            )
+        else:
+            chunks = ingest_documents(
+                docs,
+                progress=lambda n: report(chunks=n),
+                append=self._writer.append,
+                connection=connection,
+                namespace=namespace,
+            )
+        self._update(
+            job_id, status="done", docs=progress["docs"], chunks=chunks, removed=removed, finished=time.time()
+        )
+        self._save_connection(job, connection)
+
+    def _save_connection(self, job: Dict[str, Any], connection: str):
+        path = job["params"].get("path")
+        safe_params = {k: v for k, v in job["params"].items() if k not in _RUN_PARAMS}
+        if path and os.path.exists(path):
+            safe_params["size"] = os.path.getsize(path)
+            os.remove(path)
+        entry = {
+            "id": connection,
+            "namespace": job["params"].get("namespace", DEFAULT_NAMESPACE),
+            "type": job["type"],
+            "name": job["name"],
+            "params": safe_params,
+        }
+        with self._lock:
+            conns = load_connections()
+            if job["params"].get("refresh"):
+                conns = [entry if c["id"] == connection else c for c in conns]
+            else:
+                conns.append(entry)
+            save_connections(conns)
+
+    def _loop(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                with self._wake:
+                    self._wake.wait(timeout=5.0)
+                continue
+            try:
+                self._run(job)
+            except Exception as ex:  # recorded on the job; the worker keeps serving
+                self._update(job["id"], status="failed", error=f"{type(ex).__name__}: {ex}", finished=time.time())
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent jobs first."""
+        with self._lock:
+            rows = self._db().execute(f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+            return [dict(zip(_JOB_FIELDS, row)) for row in rows.fetchall()]
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(_JOB_FIELDS, row)) if row else None
+
+
+_QUEUE: Optional[JobQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """The process-wide job queue; its workers start (and resume pending jobs) on first use."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = JobQueue()
+        return _QUEUE
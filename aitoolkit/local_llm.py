@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import copy
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Dynamic batching for provider=local: prompts arriving within
+# LOCAL_BATCH_WAIT_MS of each other are generated together, up to
+# LOCAL_MAX_BATCH at once. Within a batch, prompts are bucketed so the longest
+# is at most LOCAL_BUCKET_RATIO times the shortest, limiting wasted padding.
+LOCAL_MAX_BATCH = int(os.environ.get("LOCAL_MAX_BATCH", "8"))
+LOCAL_BATCH_WAIT_MS = float(os.environ.get("LOCAL_BATCH_WAIT_MS", "20"))
+LOCAL_BUCKET_RATIO = float(os.environ.get("LOCAL_BUCKET_RATIO", "1.5"))
+# none|int8: int8 applies torch dynamic quantization to Linear layers (CPU only).
+LOCAL_QUANTIZE = os.environ.get("LOCAL_QUANTIZE", "none")
+# Keep the KV cache of the static prompt prefix (prompts.prompt_prefix) and
+# prefill only each request's tail.
+LOCAL_PREFIX_CACHE = os.environ.get("LOCAL_PREFIX_CACHE", "1") != "0"
+
+_STOP = object()
+
+
+@dataclass
+class _Request:
+    prompt: str
+    params: Tuple[int, float, float]  # max_new_tokens, temperature, top_p
+    future: Future = field(default_factory=Future)
+    # Receives text deltas as tokens are generated; None for non-streaming calls.
+    deltas: Optional["queue.Queue[Any]"] = None
+    use_prefix: bool = True
+    n_tokens: int = 0
+    # Token ids after the cached prefix, when the prompt starts with it.
+    tail_ids: Optional[List[int]] = None
+
+
+def load_local_model(model_id: str, quantize: str = LOCAL_QUANTIZE):
+    """Tokenizer + causal LM; float16 on GPU, float32 (optionally int8-dynamic) on CPU."""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id, padding_side="left")
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    cuda = torch.cuda.is_available()
+    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float16 if cuda else torch.float32)
+    if cuda:
+        model = model.to("cuda")
+    elif quantize == "int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif quantize != "none":
+        raise ValueError(f"Unsupported LOCAL_QUANTIZE: {quantize}")
+    model.eval()
+    return tokenizer, model
+
+
+class _BatchStreamer:
+    """``generate(streamer=...)`` hook that notes time-to-first-token, decodes each
+    row's new tokens as they are produced and pushes the text delta to that
+    request's queue."""
+
+    def __init__(self, tokenizer, requests: List[_Request]):
+        self.tokenizer = tokenizer
+        self.requests = requests
+        self.tokens: List[List[int]] = [[] for _ in requests]
+        self.text = ["" for _ in requests]
+        self._prompt_seen = False
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        # Whether any text reached a caller's queue (a retry would then repeat it)
+        self.emitted = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            # The first call carries the (padded) prompt ids.
+            self._prompt_seen = True
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+        for row, token in enumerate(value.reshape(len(self.requests), -1).tolist()):
+            req = self.requests[row]
+            if req.deltas is None:
+                continue
+            self.tokens[row].extend(token)
+            text = self.tokenizer.decode(self.tokens[row], skip_special_tokens=True)
+            # Hold back text ending in an incomplete multi-byte character.
+            if text.endswith("�"):
+                continue
+            if len(text) > len(self.text[row]):
+                req.deltas.put(text[len(self.text[row]) :])
+                self.text[row] = text
+                self.emitted = True
+
+    def end(self):
+        pass
+
+
+class LocalBatchingWorker:
+    """Serves one local model from a single thread, batching concurrent requests.
+
+    Callers block on (or iterate) their own request while the worker groups
+    whatever arrived within the wait window by sampling parameters and prompt
+    length, runs one ``model.generate`` per group and hands back per-request
+    completions (prompt excluded).
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        max_batch: int = LOCAL_MAX_BATCH,
+        wait_ms: float = LOCAL_BATCH_WAIT_MS,
+        quantize: str = LOCAL_QUANTIZE,
+    ):
+        self.model_id = model_id
+        self.max_batch = max(1, max_batch)
+        self.wait = wait_ms / 1000.0
+        self.tokenizer, self.model = load_local_model(model_id, quantize)
+        self.batches = 0
+        self.requests_served = 0
+        self.prefix_text = ""
+        self._prefix_ids: List[int] = []
+        self._prefix_cache = None
+        self._prefix_error: Optional[str] = None
+        if LOCAL_PREFIX_CACHE:
+            from .prompts import prompt_prefix
+
+            self.prefix_text = prompt_prefix()
+            self._prefix_ids = self.tokenizer(self.prefix_text)["input_ids"]
+        self._ttft: Dict[str, deque] = {"prefix": deque(maxlen=256), "full": deque(maxlen=256)}
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"local-llm-{model_id}", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        prompt: str,
+        max_new_tokens: int,
+        temperature: float,
+        top_p: float,
+        stream: bool = False,
+        use_prefix: bool = True,
+    ) -> _Request:
+        req = _Request(
+            prompt, (max_new_tokens, temperature, top_p), deltas=queue.Queue() if stream else None, use_prefix=use_prefix
+        )
+        self._queue.put(req)
+        return req
+
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float) -> str:
+        return self.submit(prompt, max_new_tokens, temperature, top_p).future.result()
+
+    def generate_stream(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float) -> Iterator[str]:
+        req = self.submit(prompt, max_new_tokens, temperature, top_p, stream=True)
+        while True:
+            item = req.deltas.get()
+            if item is _STOP:
+                break
+            yield item
+        req.future.result()  # re-raise a failed generation
+
+    def close(self):
+        self._queue.put(_STOP)
+
+    def _collect(self) -> Optional[List[_Request]]:
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _split_prefix(self, req: _Request):
+        """Set ``tail_ids`` when the prompt's tokens are exactly prefix ids + tail ids.
+
+        Tokenizers may merge across the boundary; such prompts take the full path.
+        """
+        ids = self.tokenizer(req.prompt)["input_ids"]
+        req.n_tokens = len(ids)
+        if not (req.use_prefix and self._prefix_ids and self._prefix_error is None):
+            return
+        if not req.prompt.startswith(self.prefix_text):
+            return
+        tail = self.tokenizer(req.prompt[len(self.prefix_text) :], add_special_tokens=False)["input_ids"]
+        if list(self._prefix_ids) + list(tail) == list(ids):
+            req.tail_ids = list(tail)
+            req.n_tokens = len(tail)
+
+    def _buckets(self, batch: List[_Request]) -> List[List[_Request]]:
+        """Group by sampling parameters and prefix reuse, then by similar prompt length."""
+        for req in batch:
+            self._split_prefix(req)
+        groups: Dict[Tuple[Tuple[int, float, float], bool], List[_Request]] = {}
+        for req in sorted(batch, key=lambda r: r.n_tokens):
+            groups.setdefault((req.params, req.tail_ids is not None), []).append(req)
+        buckets: List[List[_Request]] = []
+        for reqs in groups.values():
+            current: List[_Request] = []
+            for req in reqs:
+                if current and req.n_tokens > LOCAL_BUCKET_RATIO * current[0].n_tokens:
+                    buckets.append(current)
+                    current = []
+                current.append(req)
+            buckets.append(current)
+        return buckets
+
+    def _ensure_prefix_cache(self):
+        """Prefill the static prefix once; later requests start from a copy of its KV cache."""
+        if self._prefix_cache is None:
+            import torch
+            from transformers import DynamicCache
+
+            cache = DynamicCache()
+            ids = torch.tensor([self._prefix_ids], device=self.model.device)
+            with torch.inference_mode():
+                self.model(input_ids=ids, past_key_values=cache, use_cache=True)
+            self._prefix_cache = cache
+        return self._prefix_cache
+
+    def _prefixed_inputs(self, bucket: List[_Request]) -> Dict[str, Any]:
+        """``[prefix][left padding][tail]`` per row, with the prefix cache repeated per row.
+
+        Padding sits between prefix and tail; it is masked out and position ids
+        are derived from the attention mask, as with ordinary left padding.
+        """
+        import torch
+
+        width = max(len(r.tail_ids) for r in bucket)
+        pad = self.tokenizer.pad_token_id
+        ids = [self._prefix_ids + [pad] * (width - len(r.tail_ids)) + r.tail_ids for r in bucket]
+        mask = [[1] * len(self._prefix_ids) + [0] * (width - len(r.tail_ids)) + [1] * len(r.tail_ids) for r in bucket]
+        cache = copy.deepcopy(self._ensure_prefix_cache())
+        if len(bucket) > 1:
+            cache.batch_repeat_interleave(len(bucket))
+        device = self.model.device
+        return {
+            "input_ids": torch.tensor(ids, device=device),
+            "attention_mask": torch.tensor(mask, device=device),
+            "past_key_values": cache,
+        }
+
+    def _generate(self, bucket: List[_Request], prefixed: bool, streamer: _BatchStreamer):
+        import torch
+
+        max_new_tokens, temperature, top_p = bucket[0].params
+        if prefixed:
+            inputs = self._prefixed_inputs(bucket)
+        else:
+            inputs = dict(self.tokenizer([r.prompt for r in bucket], return_tensors="pt", padding=True).to(self.model.device))
+        with torch.inference_mode():
+            out = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                do_sample=True,
+                pad_token_id=self.tokenizer.pad_token_id,
+                streamer=streamer,
+            )
+        if streamer.first_token is not None:
+            self._ttft["prefix" if prefixed else "full"].append(streamer.first_token)
+        return out[:, inputs["input_ids"].shape[1] :]
+
+    def _run(self, bucket: List[_Request]):
+        prefixed = bucket[0].tail_ids is not None
+        streamer = _BatchStreamer(self.tokenizer, bucket)
+        try:
+            new_tokens = self._generate(bucket, prefixed, streamer)
+        except Exception as ex:
+            if not prefixed:
+                raise
+            # e.g. a model/transformers version that cannot resume from a cache;
+            # stop using the prefix cache either way.
+            self._prefix_error = f"{type(ex).__name__}: {ex}"
+            if streamer.emitted:
+                # Streaming callers already hold part of an answer; a retry would repeat it
+                raise
+            new_tokens = self._generate(bucket, False, _BatchStreamer(self.tokenizer, bucket))
+        for req, row in zip(bucket, new_tokens):
+            req.future.set_result(self.tokenizer.decode(row, skip_special_tokens=True))
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self.batches += 1
+            self.requests_served += len(batch)
+            for bucket in self._buckets(batch):
+                try:
+                    self._run(bucket)
+                except Exception as ex:  # fail this bucket's callers, keep serving
+                    for req in bucket:
+                        if not req.future.done():
+                            req.future.set_exception(ex)
+                finally:
+                    for req in bucket:
+                        if req.deltas is not None:
+                            req.deltas.put(_STOP)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters and median time-to-first-token with and without the prefix cache."""
+        return {
+            "batches": self.batches,
+            "requests": self.requests_served,
+            "mean_batch_size": self.requests_served / self.batches if self.batches else 0.0,
+            "prefix_tokens": len(self._prefix_ids),
+            "prefix_error": self._prefix_error,
+            "ttft_ms_prefix": _median_ms(self._ttft["prefix"]),
+            "ttft_ms_full": _median_ms(self._ttft["full"]),
+        }
+
+    def measure_prefix_ttft(self, tails: List[str], repeats: int = 3) -> Dict[str, Any]:
+        """Time-to-first-token for ``prefix + tail`` prompts with and without the prefix cache.
+
+        Each prompt is generated for one token (prefill + first decode step),
+        sequentially, so the numbers are not affected by batching.
+        """
+        timings: Dict[str, List[float]] = {"prefix": [], "full": []}
+        for _ in range(repeats):
+            for tail in tails:
+                for kind in ("prefix", "full"):
+                    started = time.perf_counter()
+                    self.submit(self.prefix_text + tail, 1, 1.0, 1.0, use_prefix=kind == "prefix").future.result()
+                    timings[kind].append(time.perf_counter() - started)
+        prefix_ms, full_ms = _median_ms(timings["prefix"]), _median_ms(timings["full"])
+        return {
+            "prefix_tokens": len(self._prefix_ids),
+            "ttft_ms_prefix": prefix_ms,
+            "ttft_ms_full": full_ms,
+            "saved_ms": full_ms - prefix_ms,
+        }
+
+
+def _median_ms(values) -> float:
+    return statistics.median(values) * 1000.0 if values else 0.0
+
+
+_WORKERS: Dict[str, LocalBatchingWorker] = {}
+_WORKERS_LOCK = threading.Lock()
+
+
+def get_local_worker(model_id: str) -> LocalBatchingWorker:
+    """One worker (and one copy of the weights) per model id, shared by all clients."""
+    with _WORKERS_LOCK:
+        if model_id not in _WORKERS:
+            _WORKERS[model_id] = LocalBatchingWorker(model_id)
+        return _WORKERS[model_id]
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get("METRICS", "1") != "0"
+# Path of the Prometheus text endpoint mounted on the Gradio server.
+METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0.0)]
+        return [f"{self.name}{_label_text(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = _BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Labels, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total, n) in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_label_text(names, key + (_number(bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {n}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {n}")
+        return lines
+
+
+_REGISTRY: List[_Metric] = []
+
+STAGE_SECONDS = Histogram(
+    "aitoolkit_stage_seconds", "Duration of generation and ingest pipeline stages.", ["stage"]
+)
+LLM_REQUESTS = Counter("aitoolkit_llm_requests_total", "LLM requests by provider and outcome.", ["provider", "status"])
+LLM_TOKENS = Counter(
+    "aitoolkit_llm_tokens_total", "Prompt and completion tokens (target-model tokenizer).", ["provider", "kind"]
+)
+LLM_SECONDS = Histogram("aitoolkit_llm_request_seconds", "LLM request duration.", ["provider"])
+LLM_TOKENS_PER_SECOND = Gauge(
+    "aitoolkit_llm_tokens_per_second", "Completion tokens per second of the latest request.", ["provider"]
+)
+LLM_ROUTE_DECISIONS = Counter(
+    "aitoolkit_llm_route_decisions_total",
+    "LLM routing outcomes per route (ok, error, cancelled, breaker_open).",
+    ["route", "outcome"],
+)
+INGEST_CHUNKS = Counter("aitoolkit_ingest_chunks_total", "Chunks embedded and committed to the index.")
+INDEX_POOL_BYTES = Gauge("aitoolkit_index_pool_bytes", "Heap bytes of the namespace indexes currently loaded (memory-mapped vectors excluded).")
+INDEX_POOL_EVICTIONS = Counter(
+    "aitoolkit_index_pool_evictions_total", "Namespace indexes dropped from memory by the pool.", ["namespace"]
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the duration of the ``with`` body under ``aitoolkit_stage_seconds{stage=...}``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_llm(
+    provider: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    seconds: float,
+    ttft: Optional[float] = None,
+    error: Optional[BaseException] = None,
+) -> Dict[str, Any]:
+    """Export one LLM call's usage and return it as a dict for the request trace."""
+    tokens_per_sec = completion_tokens / seconds if seconds > 0 else 0.0
+    if METRICS_ENABLED:
+        LLM_REQUESTS.inc(provider=provider, status="error" if error is not None else "ok")
+        LLM_SECONDS.observe(seconds, provider=provider)
+        if error is None:
+            LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+            LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+            LLM_TOKENS_PER_SECOND.set(tokens_per_sec, provider=provider)
+    usage: Dict[str, Any] = {
+        "provider": provider,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "ms": round(seconds * 1000.0, 1),
+        "tokens_per_sec": round(tokens_per_sec, 1),
+    }
+    if ttft is not None:
+        usage["ttft_ms"] = round(ttft * 1000.0, 1)
+    if error is not None:
+        usage["error"] = f"{type(error).__name__}: {error}"
+    return usage
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """Hit/miss counters of the process-wide caches (disabled caches are omitted)."""
+    from .embed_cache import get_cache
+    from .http_cache import HTTP_CACHE_ENABLED, get_http_cache
+    from .response_cache import get_response_cache
+
+    stats: Dict[str, Dict[str, float]] = {}
+    embed = get_cache()
+    if embed is not None:
+        stats["embedding"] = embed.stats()
+    response = get_response_cache()
+    if response is not None:
+        stats["response"] = response.stats()
+    if HTTP_CACHE_ENABLED:
+        stats["http"] = get_http_cache().stats()
+    return stats
+
+
+class Trace:
+    """Timing spans, LLM usage and routing decisions for one request; recorded from any thread."""
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self.llm: List[Dict[str, Any]] = []
+        self.routing: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def span(self, stage: str, **attrs: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            observe_stage(stage, seconds)
+            entry = {"stage": stage, "start_ms": round((start - self._t0) * 1000.0, 1), "ms": round(seconds * 1000.0, 1)}
+            with self._lock:
+                self.spans.append({**entry, **attrs})
+
+    def add_llm(self, usage: Dict[str, Any]):
+        with self._lock:
+            self.llm.append(usage)
+
+    def add_route(self, decision: Dict[str, Any]):
+        with self._lock:
+            self.routing.append(decision)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+            llm = list(self.llm)
+            routing = list(self.routing)
+        completion = sum(u["completion_tokens"] for u in llm)
+        llm_ms = max((u["ms"] for u in llm), default=0.0)
+        return {
+            "total_ms": round((time.perf_counter() - self._t0) * 1000.0, 1),
+            "spans": spans,
+            "llm": {
+                "requests": llm,
+                "prompt_tokens": sum(u["prompt_tokens"] for u in llm),
+                "completion_tokens": completion,
+                # Requests may run concurrently, so throughput is over the longest one
+                "tokens_per_sec": round(completion / (llm_ms / 1000.0), 1) if llm_ms else 0.0,
+            },
+            "routing": routing,
+            "caches": cache_stats(),
+        }
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format, cache hit rates included."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    caches = cache_stats()
+    lines += ["# HELP aitoolkit_cache_hit_ratio Hit rate per cache since start.", "# TYPE aitoolkit_cache_hit_ratio gauge"]
+    lines += [f'aitoolkit_cache_hit_ratio{{cache="{name}"}} {_number(s["hit_rate"])}' for name, s in caches.items()]
+    lines += ["# HELP aitoolkit_cache_lookups_total Cache lookups by result.", "# TYPE aitoolkit_cache_lookups_total counter"]
+    for name, s in caches.items():
+        for result, value in s.items():
+            if result != "hit_rate" and isinstance(value, (int, float)):
+                lines.append(f'aitoolkit_cache_lookups_total{{cache="{name}",result="{result}"}} {_number(value)}')
+    return "\n".join(lines) + "\n"
+
+
+def mount_metrics(app, path: str = METRICS_PATH):
+    """Serve ``render()`` at ``path`` on the FastAPI app Gradio launched."""
+    if not METRICS_ENABLED:
+        return
+    from fastapi.responses import Response
+
+    def metrics_endpoint():
+        return Response(render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route(path, metrics_endpoint, methods=["GET"], include_in_schema=False)
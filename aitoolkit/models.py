@@ -1,62 +1,235 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import re
+import threading
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
-import requests
-from huggingface_hub import InferenceClient
+from . import transport
+from .metrics import Trace, record_llm
+
+_CHAT_URLS = {
+    "together": "https://api.together.xyz/v1/chat/completions",
+    "groq": "https://api.groq.com/openai/v1/chat/completions",
+}
+
+# Requests per second allowed per provider, e.g. "openai=3,hf_inference=0.5".
+# Shared by every LLMClient in the process; unlisted providers are unthrottled.
+LLM_RATE_LIMITS = os.environ.get("LLM_RATE_LIMITS", "")
+
+
+class RateLimiter:
+    """Spaces request starts at least ``1 / rate`` seconds apart across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _parse_rate_limits(spec: str) -> Dict[str, float]:
+    limits: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            limits[name.strip()] = float(rate)
+    return limits
+
+
+_LIMITERS: Dict[str, RateLimiter] = {p: RateLimiter(r) for p, r in _parse_rate_limits(LLM_RATE_LIMITS).items()}
+
+
+# Decode speed simulated by provider=stub in tokens per second (0 = instant).
+STUB_LLM_TOKENS_PER_SEC = float(os.environ.get("STUB_LLM_TOKENS_PER_SEC", "0"))
+_STUB_CATEGORIES = re.compile(r"Categories \(up to (\d+) initiatives each\):\n((?:- .*\n?)+)")
+
+_TOKENIZERS: Dict[str, object] = {}
+_TOKENIZERS_LOCK = threading.Lock()
+# A failed tokenizer load is retried after this many seconds; until then counts use the heuristic.
+_TOKENIZER_RETRY_SECONDS = 60.0
+_TOKENIZER_FAILED: Dict[str, float] = {}
+
+
+def _load_tokenizer(provider: str, model: str):
+    """Token counter for the target model, or None if its tokenizer is unavailable.
+
+    Only a successful load is cached, so a transient failure (no network, a
+    hub hiccup) does not pin the process to the heuristic count.
+    """
+    key = f"{provider}:{model}"
+    with _TOKENIZERS_LOCK:
+        if key not in _TOKENIZERS:
+            failed = _TOKENIZER_FAILED.get(key)
+            if failed is not None and time.monotonic() - failed < _TOKENIZER_RETRY_SECONDS:
+                return None
+            try:
+                if provider == "openai":
+                    import tiktoken  # type: ignore
+
+                    try:
+                        enc = tiktoken.encoding_for_model(os.environ.get("OPENAI_MODEL", model))
+                    except KeyError:
+                        enc = tiktoken.get_encoding("cl100k_base")
+
+                    def tokenizer(texts: List[str]) -> List[int]:
+                        return [len(enc.encode(t)) for t in texts]
+
+                else:
+                    from transformers import AutoTokenizer
+
+                    hf = AutoTokenizer.from_pretrained(model)
+
+                    def tokenizer(texts: List[str]) -> List[int]:
+                        return [len(ids) for ids in hf(texts, add_special_tokens=False)["input_ids"]]
+
+            except Exception:  # unknown model id, no network, library missing
+                _TOKENIZER_FAILED[key] = time.monotonic()
+                return None
+            _TOKENIZER_FAILED.pop(key, None)
+            _TOKENIZERS[key] = tokenizer
+        return _TOKENIZERS[key]
+
+
+def set_rate_limit(provider: str, rate: Optional[float]):
+    """Set (or with ``None`` remove) the requests-per-second limit for ``provider``."""
+    if rate is None:
+        _LIMITERS.pop(provider, None)
+    else:
+        _LIMITERS[provider] = RateLimiter(rate)
 
 
 @dataclass
 class LLMConfig:
-    provider: str = os.environ.get("LLM_PROVIDER", "hf_inference")  # hf_inference|local|openai|together|groq
+    provider: str = os.environ.get("LLM_PROVIDER", "hf_inference")  # hf_inference|local|openai|together|groq|stub
     model: str = os.environ.get("HF_INFERENCE_MODEL", "Qwen/Qwen2.5-3B-Instruct")
     max_new_tokens: int = 600
     temperature: float = 0.4
     top_p: float = 0.9
     stop: Optional[List[str]] = None
+    # API base of openai/together/groq (e.g. "http://127.0.0.1:8000/v1" for a local OpenAI-compatible server)
+    base_url: Optional[str] = None
 
 
 class LLMClient:
-    def __init__(self, config: Optional[LLMConfig] = None):
+    def __init__(self, config: Optional[LLMConfig] = None, retries: bool = True):
+        """``retries=False`` turns off HTTP-level retries, for callers that fail over instead."""
         self.config = config or LLMConfig()
+        self.retries = retries
         self._init_provider()
 
     def _init_provider(self):
         p = self.config.provider
         if p == "hf_inference":
+            from huggingface_hub import InferenceClient
+
             token = os.environ.get("HUGGINGFACEHUB_API_TOKEN") or os.environ.get("HF_TOKEN")
             self.hf = InferenceClient(token=token)
         elif p == "openai":
             # Lazy import to avoid dependency unless needed
             from openai import OpenAI  # type: ignore
 
-            self.openai = OpenAI()
+            self.openai = OpenAI(base_url=self.config.base_url, **({} if self.retries else {"max_retries": 0}))
         elif p == "together":
             # Uses Together's API
             self.together_api_key = os.environ.get("TOGETHER_API_KEY")
         elif p == "groq":
             self.groq_api_key = os.environ.get("GROQ_API_KEY")
         elif p == "local":
-            from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-            import torch
+            from .local_llm import get_local_worker
 
-            model_id = self.config.model
-            self.tokenizer = AutoTokenizer.from_pretrained(model_id)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                model_id, torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-            )
-            self.pipe = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=0 if torch.cuda.is_available() else -1,
-            )
+            # Shared per model id; concurrent requests are batched by the worker
+            self.local = get_local_worker(self.config.model)
+        elif p == "stub":
+            # Deterministic, offline completions for benchmarks and tests
+            pass
         else:
             raise ValueError(f"Unsupported provider: {p}")
 
-    def generate(self, prompt: str, **kwargs) -> str:
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Token counts under the target model's tokenizer (~4 chars/token if unavailable)."""
+        if not texts:
+            return []
+        if self.config.provider == "local":
+            tok = self.local.tokenizer
+            return [len(ids) for ids in tok(texts, add_special_tokens=False)["input_ids"]]
+        counter = None if self.config.provider == "stub" else _load_tokenizer(self.config.provider, self.config.model)
+        if counter is None:
+            return [max(1, (len(t) + 3) // 4) for t in texts]
+        return counter(texts)
+
+    def _throttle(self):
+        limiter = _LIMITERS.get(self.config.provider)
+        if limiter is not None:
+            limiter.acquire()
+
+    def _usage(
+        self,
+        prompt: str,
+        completion: str,
+        seconds: float,
+        trace: Optional[Trace],
+        ttft: Optional[float] = None,
+        error: Optional[BaseException] = None,
+    ):
+        """Export token counts and throughput for one call, and add them to ``trace``."""
+        try:
+            prompt_tokens, completion_tokens = self.count_tokens([prompt, completion])
+        except Exception:  # accounting must never fail a generation
+            prompt_tokens = completion_tokens = 0
+        usage = record_llm(self.config.provider, prompt_tokens, completion_tokens, seconds, ttft, error)
+        if trace is not None:
+            trace.add_llm(usage)
+
+    def generate(self, prompt: str, trace: Optional[Trace] = None, **kwargs) -> str:
+        self._throttle()
+        start = time.perf_counter()
+        try:
+            text = self._generate(prompt, **kwargs)
+        except Exception as ex:
+            self._usage(prompt, "", time.perf_counter() - start, trace, error=ex)
+            raise
+        self._usage(prompt, text, time.perf_counter() - start, trace)
+        return text
+
+    def generate_stream(
+        self, prompt: str, trace: Optional[Trace] = None, abort: Optional[transport.StreamAbort] = None, **kwargs
+    ) -> Iterator[str]:
+        """Yield completion text incrementally (token deltas) for every provider.
+
+        ``abort`` lets another thread close the open response (HTTP providers),
+        failing this stream at once; an aborted call is not counted as an error.
+        """
+        self._throttle()
+        start = time.perf_counter()
+        ttft: Optional[float] = None
+        parts: List[str] = []
+        error: Optional[BaseException] = None
+        try:
+            for delta in self._generate_stream(prompt, abort=abort, **kwargs):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                parts.append(delta)
+                yield delta
+        except Exception as ex:
+            if abort is None or not abort.aborted:
+                error = ex
+            raise
+        finally:
+            self._usage(prompt, "".join(parts), time.perf_counter() - start, trace, ttft, error)
+
+    def _generate(self, prompt: str, **kwargs) -> str:
         p = self.config.provider
         if p == "hf_inference":
             model = self.config.model
@@ -70,61 +243,140 @@ class LLMClient:
             )
             return resp
         elif p == "local":
-            out = self.pipe(
+            return self.local.generate(
                 prompt,
                 max_new_tokens=kwargs.get("max_new_tokens", self.config.max_new_tokens),
                 temperature=kwargs.get("temperature", self.config.temperature),
                 top_p=kwargs.get("top_p", self.config.top_p),
-                do_sample=True,
             )
-            return out[0]["generated_text"]
         elif p == "openai":
             # Assumes model is a chat model id
             client = self.openai
             completion = client.chat.completions.create(
                 model=os.environ.get("OPENAI_MODEL", self.config.model),
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt},
-                ],
+                messages=_messages(prompt),
                 temperature=kwargs.get("temperature", self.config.temperature),
                 max_tokens=kwargs.get("max_new_tokens", self.config.max_new_tokens),
                 top_p=kwargs.get("top_p", self.config.top_p),
             )
             return completion.choices[0].message.content or ""
-        elif p == "together":
-            url = "https://api.together.xyz/v1/chat/completions"
-            headers = {"Authorization": f"Bearer {self.together_api_key}", "Content-Type": "application/json"}
-            data = {
-                "model": self.config.model,
-                "messages": [
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt},
-                ],
-                "temperature": kwargs.get("temperature", self.config.temperature),
-                "max_tokens": kwargs.get("max_new_tokens", self.config.max_new_tokens),
-                "top_p": kwargs.get("top_p", self.config.top_p),
-            }
-            r = requests.post(url, headers=headers, json=data, timeout=60)
-            r.raise_for_status()
-            j = r.json()
-            return j["choices"][0]["message"]["content"]
-        elif p == "groq":
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            headers = {"Authorization": f"Bearer {self.groq_api_key}", "Content-Type": "application/json"}
-            data = {
-                "model": self.config.model,
-                "messages": [
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt},
-                ],
-                "temperature": kwargs.get("temperature", self.config.temperature),
-                "max_tokens": kwargs.get("max_new_tokens", self.config.max_new_tokens),
-                "top_p": kwargs.get("top_p", self.config.top_p),
-            }
-            r = requests.post(url, headers=headers, json=data, timeout=60)
-            r.raise_for_status()
-            j = r.json()
-            return j["choices"][0]["message"]["content"]
+        elif p in ("together", "groq"):
+            return self._chat_completion(prompt, **kwargs)
+        elif p == "stub":
+            return "".join(self._stub_stream(prompt, kwargs.get("max_new_tokens", self.config.max_new_tokens)))
         else:
             raise ValueError(f"Unsupported provider: {p}")
+
+    def _generate_stream(self, prompt: str, abort: Optional[transport.StreamAbort] = None, **kwargs) -> Iterator[str]:
+        p = self.config.provider
+        max_new_tokens = kwargs.get("max_new_tokens", self.config.max_new_tokens)
+        temperature = kwargs.get("temperature", self.config.temperature)
+        top_p = kwargs.get("top_p", self.config.top_p)
+        if p == "hf_inference":
+            yield from self.hf.text_generation(
+                prompt,
+                model=self.config.model,
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                stop_sequences=kwargs.get("stop", self.config.stop),
+                stream=True,
+            )
+        elif p == "local":
+            yield from self.local.generate_stream(
+                prompt, max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p
+            )
+        elif p == "openai":
+            stream = self.openai.chat.completions.create(
+                model=os.environ.get("OPENAI_MODEL", self.config.model),
+                messages=_messages(prompt),
+                temperature=temperature,
+                max_tokens=max_new_tokens,
+                top_p=top_p,
+                stream=True,
+            )
+            if abort is not None:
+                abort.bind(stream.close)
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        elif p in ("together", "groq"):
+            yield from self._chat_completion_stream(prompt, abort=abort, **kwargs)
+        elif p == "stub":
+            yield from self._stub_stream(prompt, max_new_tokens)
+        else:
+            raise ValueError(f"Unsupported provider: {p}")
+
+    def _chat_request(self, prompt: str, stream: bool, **kwargs):
+        p = self.config.provider
+        api_key = self.together_api_key if p == "together" else self.groq_api_key
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        data = {
+            "model": self.config.model,
+            "messages": _messages(prompt),
+            "temperature": kwargs.get("temperature", self.config.temperature),
+            "max_tokens": kwargs.get("max_new_tokens", self.config.max_new_tokens),
+            "top_p": kwargs.get("top_p", self.config.top_p),
+            "stream": stream,
+        }
+        url = self.config.base_url.rstrip("/") + "/chat/completions" if self.config.base_url else _CHAT_URLS[p]
+        r = transport.post(url, headers=headers, json=data, stream=stream, retries=self.retries)
+        r.raise_for_status()
+        return r
+
+    def _chat_completion(self, prompt: str, **kwargs) -> str:
+        """OpenAI-compatible chat completion over the shared pooled session."""
+        j = self._chat_request(prompt, stream=False, **kwargs).json()
+        return j["choices"][0]["message"]["content"]
+
+    def _chat_completion_stream(
+        self, prompt: str, abort: Optional[transport.StreamAbort] = None, **kwargs
+    ) -> Iterator[str]:
+        """OpenAI-compatible server-sent events: ``data: {json}`` lines until ``[DONE]``."""
+        with self._chat_request(prompt, stream=True, **kwargs) as r:
+            if abort is not None:
+                abort.bind(lambda: transport.close_response(r))
+            for line in r.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:") :].strip()
+                if payload == "[DONE]":
+                    break
+                choices = json.loads(payload).get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+
+    def _stub_stream(self, prompt: str, max_new_tokens: int) -> Iterator[str]:
+        """Word deltas of ``_stub_completion``, paced at ``STUB_LLM_TOKENS_PER_SEC``."""
+        for delta in _stub_completion(prompt, max_new_tokens):
+            if STUB_LLM_TOKENS_PER_SEC > 0:
+                time.sleep(1.0 / STUB_LLM_TOKENS_PER_SEC)
+            yield delta
+
+
+def _stub_completion(prompt: str, max_new_tokens: int) -> List[str]:
+    """A plan-shaped answer derived only from the prompt, as word deltas (one per "token")."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    m = _STUB_CATEGORIES.search(prompt)
+    per_category = int(m.group(1)) if m else 1
+    categories = [l[2:].strip() for l in m.group(2).splitlines() if l.startswith("- ")] if m else ["General"]
+    lines = []
+    for c, category in enumerate(categories):
+        lines.append(f"### {category}")
+        for i in range(per_category):
+            tag = digest[(c * per_category + i) % 56 :][:8]
+            lines.append(
+                f"- **{category} initiative {i + 1} ({tag})** — Why now: stub. Impact: stub metric. Effort: M"
+            )
+        lines.append("")
+    words = "\n".join(lines).split(" ")[:max_new_tokens]
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def _messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt},
+    ]
@@ -21,6 +21,35 @@ SYSTEM_PROMPT = (
 )
 
 
+# Fixed instructions; everything request-specific follows them so every prompt
+# starts with the same text (see ``prompt_prefix``) and providers can reuse the
+# prefix's KV cache.
+TASK_INSTRUCTIONS = """
+Task:
+Translate the objective into a concise, categorized initiative plan. For each requested category, propose high‑impact initiatives. Each item must include:
+- Initiative name (bold, few words)
+- One‑sentence description
+- Why now (business value / risk)
+- Expected impact (with a measurable leading metric)
+- Effort level (S/M/L)
+
+Output strictly in Markdown using this format:
+
+### {Category}
+- **{Initiative Name}** — {description}
+  - Why now: {value}
+  - Impact: {metric}
+  - Effort: {S|M|L}
+
+Only include categories that have at least one meaningful initiative. Avoid filler. Be specific and pragmatic.
+""".strip()
+
+
+def prompt_prefix() -> str:
+    """The request-independent start of every generation prompt (system prompt + instructions)."""
+    return f"{SYSTEM_PROMPT}\n\n{TASK_INSTRUCTIONS}\n\n"
+
+
 def build_generation_prompt(
     objective: str,
     categories: Optional[List[str]] = None,
@@ -28,40 +57,22 @@ def build_generation_prompt(
     constraints: Optional[List[str]] = None,
     num_per_category: int = 3,
 ) -> str:
+    """Static instructions first, then categories, constraints, context and the objective last."""
     cats = categories or DEFAULT_CATEGORIES
     ctx = "\n\n".join([f"- {c}" for c in (context_snippets or [])])
     cons = "\n".join([f"- {c}" for c in (constraints or [])])
 
-    prompt = f"""
-Objective:
-{objective}
-
-Additional Context (optional):
-{ctx if ctx else '(none)'}
+    tail = f"""
+Categories (up to {num_per_category} initiatives each):
+{chr(10).join(['- ' + c for c in cats])}
 
 Constraints (optional):
 {cons if cons else '(none)'}
 
-Task:
-Translate the objective into a concise, categorized initiative plan. For each category below, propose up to {num_per_category} high‑impact initiatives. Each item must include:
-- Initiative name (bold, few words)
-- One‑sentence description
-- Why now (business value / risk)
-- Expected impact (with a measurable leading metric)
-- Effort level (S/M/L)
-
-Categories:
-{chr(10).join(['- ' + c for c in cats])}
-
-Output strictly in Markdown using this format:
-
-### {{Category}}
-- **{{Initiative Name}}** — {{description}}
-  - Why now: {{value}}
-  - Impact: {{metric}}
-  - Effort: {{S|M|L}}
+Additional Context (optional):
+{ctx if ctx else '(none)'}
 
-Only include categories that have at least one meaningful initiative. Avoid filler. Be specific and pragmatic.
+Objective:
+{objective}
 """.strip()
-    return prompt
-
+    return f"{TASK_INSTRUCTIONS}\n\n{tail}"
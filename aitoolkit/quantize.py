@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from .ann import recall_at_k
+from .embeddings import top_k_with_scores
+
+# Compact in-RAM copy of the index used for a fast first pass; the float32
+# segments stay on disk (memory-mapped) and only candidates are rescored.
+INDEX_QUANTIZATION = os.environ.get("INDEX_QUANTIZATION", "none")  # none|float16|int8
+# Candidates rescored exactly per requested hit.
+QUANT_RESCORE_FACTOR = int(os.environ.get("QUANT_RESCORE_FACTOR", "4"))
+
+_CHUNK_ROWS = 65536
+
+
+class QuantizedMatrix:
+    """float16 codes, or int8 codes with a symmetric per-dimension scale."""
+
+    def __init__(self, kind: str, codes: np.ndarray, scale: Optional[np.ndarray] = None):
+        if kind not in ("float16", "int8"):
+            raise ValueError(f"Unsupported quantization: {kind}")
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, kind: str) -> "QuantizedMatrix":
+        """Quantize chunk by chunk so a memory-mapped input is never fully resident."""
+        n = len(vectors)
+        if kind == "float16":
+            codes = np.empty(vectors.shape, dtype=np.float16)
+            for start in range(0, n, _CHUNK_ROWS):
+                codes[start : start + _CHUNK_ROWS] = vectors[start : start + _CHUNK_ROWS]
+            return cls(kind, codes)
+        absmax = np.zeros(vectors.shape[1], dtype=np.float32)
+        for start in range(0, n, _CHUNK_ROWS):
+            absmax = np.maximum(absmax, np.abs(vectors[start : start + _CHUNK_ROWS]).max(axis=0))
+        scale = np.maximum(absmax, 1e-12) / 127.0
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, n, _CHUNK_ROWS):
+            codes[start : start + _CHUNK_ROWS] = np.clip(
+                np.rint(vectors[start : start + _CHUNK_ROWS] / scale), -127, 127
+            )
+        return cls(kind, codes, scale.astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate inner products; the int8 scale is folded into the query."""
+        q = np.asarray(query, dtype=np.float32)
+        if self.scale is not None:
+            q = q * self.scale
+        out = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), _CHUNK_ROWS):
+            out[start : start + _CHUNK_ROWS] = self.codes[start : start + _CHUNK_ROWS].astype(np.float32) @ q
+        return out
+
+    def search(self, query: np.ndarray, vectors: np.ndarray, k: int, rescore_factor: int = QUANT_RESCORE_FACTOR):
+        """First pass over the codes, then exact rescoring of the best candidates."""
+        sims = self.scores(query)
+        n_cand = min(len(sims), max(k, k * rescore_factor))
+        if n_cand == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        cand = np.sort(np.argpartition(-sims, n_cand - 1)[:n_cand])
+        local, scores = top_k_with_scores(query, np.asarray(vectors[cand], dtype=np.float32), k)
+        return cand[local], scores
+
+
+def recall_report(index, queries: np.ndarray, k: int = 10) -> Dict[str, float]:
+    """recall@k of the configured search path against exact float32 search, plus memory use."""
+    recalls = [
+        recall_at_k([i for i, _ in index.search(q, k)], [i for i, _ in index.search(q, k, exact=True)])
+        for q in np.asarray(queries, dtype=np.float32)
+    ]
+    return {f"recall@{k}": float(np.mean(recalls)) if recalls else 1.0, **index.memory_footprint()}
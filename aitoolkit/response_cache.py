@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .embed_cache import normalize_text
+from .storage import DATA_DIR, ensure_data_dir
+
+RESPONSE_CACHE_PATH = os.path.join(DATA_DIR, "response_cache.sqlite")
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+# Minimum cosine similarity between objectives for a semantic hit.
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.92"))
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE", "1") != "0"
+
+
+def _digest(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def exact_key(prompt: str, llm_params: Dict[str, Any]) -> str:
+    """Tier 1: the final prompt plus model/sampling parameters."""
+    return _digest({"prompt": prompt, "llm": llm_params})
+
+
+def semantic_scope(
+    categories: List[str],
+    constraints: Optional[List[str]],
+    llm_params: Dict[str, Any],
+    index_generation: int,
+    **options: Any,
+) -> str:
+    """Tier 2 partition: only objectives generated under the same settings can match."""
+    return _digest(
+        {
+            "categories": sorted(categories),
+            "constraints": sorted(normalize_text(c).lower() for c in (constraints or [])),
+            "llm": llm_params,
+            "index_generation": index_generation,
+            "options": options,
+        }
+    )
+
+
+class ResponseCache:
+    """Two-tier (exact prompt, then similar objective) cache of generated plans.
+
+    Entries expire after ``ttl`` seconds; beyond ``max_entries`` the least
+    recently used are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str = RESPONSE_CACHE_PATH,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            ensure_data_dir()
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, scope TEXT NOT NULL, vec BLOB, prompt TEXT NOT NULL, "
+                "output TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses(scope)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        return self._conn
+
+    def _hit(self, key: str, prompt: str, output: str, tier: str, similarity: float = 1.0) -> Dict[str, Any]:
+        self._db().execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._db().commit()
+        return {"tier": tier, "prompt": prompt, "output": output, "similarity": similarity}
+
+    def get_exact(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT prompt, output FROM responses WHERE key = ? AND created > ?", (key, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self.exact_hits += 1
+            return self._hit(key, row[0], row[1], "exact")
+
+    def get_semantic(self, scope: str, vec: np.ndarray) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT key, vec, prompt, output FROM responses WHERE scope = ? AND vec IS NOT NULL AND created > ?",
+                (scope, time.time() - self.ttl),
+            ).fetchall()
+            if not rows:
+                return None
+            mat = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+            sims = mat @ np.asarray(vec, dtype=np.float32)
+            best = int(np.argmax(sims))
+            if sims[best] < self.similarity:
+                return None
+            self.semantic_hits += 1
+            key, _, prompt, output = rows[best]
+            return self._hit(key, prompt, output, "semantic", float(sims[best]))
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: str, scope: str, vec: Optional[np.ndarray], prompt: str, output: str):
+        now = time.time()
+        blob = np.asarray(vec, dtype=np.float32).tobytes() if vec is not None else None
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, blob, prompt, output, now, now),
+            )
+            db.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+            (count,) = db.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    global _CACHE
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _CACHE is None:
+        _CACHE = ResponseCache()
+    return _CACHE
@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import replace
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from . import transport
+from .metrics import LLM_ROUTE_DECISIONS, METRICS_ENABLED, Trace
+from .models import LLMClient, LLMConfig
+
+# Ordered routes tried for every LLM call, e.g.
+# "groq:llama-3.1-8b-instant,together:meta-llama/Llama-3.1-8B-Instruct-Turbo".
+# "provider:model@url" points an OpenAI-compatible provider (openai, together,
+# groq) at another API base such as a local mock. Empty = LLM_PROVIDER only.
+LLM_ROUTES = os.environ.get("LLM_ROUTES", "")
+# Consecutive failures that open a route's circuit breaker, and seconds it stays
+# open before a single trial request is let through.
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+# Hedging: start the next route when the current one has produced no token after
+# the p95 of its recent time-to-first-token (LLM_HEDGE_DELAY seconds until
+# LLM_HEDGE_MIN_SAMPLES are known); the first route to produce a token wins.
+# Every attempt is sampled, a cancelled one that had no token yet by its
+# waiting time so far (a lower bound), so slow streams keep the p95 honest.
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_DELAY = float(os.environ.get("LLM_HEDGE_DELAY", "2.0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+_TTFT_WINDOW = 200
+
+_DONE = object()
+
+
+def parse_routes(spec: str, base: LLMConfig) -> List[LLMConfig]:
+    """``LLMConfig`` per ``provider:model[@url]`` item of ``spec``; sampling settings come from ``base``."""
+    routes: List[LLMConfig] = []
+    for item in spec.split(","):
+        item, _, url = item.strip().partition("@")
+        provider, _, model = item.partition(":")
+        if provider.strip():
+            model = model.strip() or base.model
+            routes.append(replace(base, provider=provider.strip(), model=model, base_url=url.strip() or None))
+    return routes or [base]
+
+
+def route_name(config: LLMConfig) -> str:
+    name = f"{config.provider}:{config.model}"
+    return f"{name}@{config.base_url}" if config.base_url else name
+
+
+class CircuitBreaker:
+    """Fails fast for a route that keeps erroring.
+
+    Opens after ``failures`` consecutive errors. Once ``cooldown`` seconds
+    have passed one trial request is allowed (half-open): success closes the
+    breaker, failure re-opens it for another cooldown.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = max(1, failures)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._errors = 0
+        self._opened: Optional[float] = None
+        self._trial = False
+
+    def _state(self) -> str:
+        if self._opened is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self._opened >= self.cooldown else "open"
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._errors = 0
+            self._opened = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._errors += 1
+            if self._trial or self._errors >= self.failures:
+                self._opened = time.monotonic()
+            self._trial = False
+
+    def release(self):
+        """End a call that was abandoned without an outcome (a cancelled hedge)."""
+        with self._lock:
+            self._trial = False
+
+
+class RouteState:
+    """Process-wide health of one route: its breaker and recent time-to-first-token."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self._ttft: Deque[float] = deque(maxlen=_TTFT_WINDOW)
+
+    def add_ttft(self, seconds: float):
+        with self._lock:
+            self._ttft.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for a first token before hedging: the p95 of recent attempts."""
+        with self._lock:
+            samples = sorted(self._ttft)
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DELAY
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+
+_STATES: Dict[str, RouteState] = {}
+_STATES_LOCK = threading.Lock()
+
+
+def route_state(name: str) -> RouteState:
+    with _STATES_LOCK:
+        if name not in _STATES:
+            _STATES[name] = RouteState()
+        return _STATES[name]
+
+
+def _decide(trace: Optional[Trace], route: str, outcome: str, seconds: float, **attrs: Any):
+    if METRICS_ENABLED:
+        LLM_ROUTE_DECISIONS.inc(route=route, outcome=outcome)
+    if trace is not None:
+        trace.add_route({"route": route, "outcome": outcome, "ms": round(seconds * 1000.0, 1), **attrs})
+
+
+class _Attempt:
+    """One route's streaming call on its own thread, feeding ``(attempt, item)`` to ``events``.
+
+    Cancelling closes the attempt's HTTP response from the router's thread,
+    so a stalled provider releases its connection at once rather than at its
+    next delta or read timeout (hf_inference and local streams still stop at
+    their next delta).
+    """
+
+    def __init__(self, client: LLMClient, name: str, state: RouteState, hedge: bool, events: "queue.Queue[Any]"):
+        self.name = name
+        self.state = state
+        self.hedge = hedge
+        self.start = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self._client = client
+        self._events = events
+        self._cancelled = threading.Event()
+        self._abort = transport.StreamAbort()
+        self._settled = False
+        self._sample_lock = threading.Lock()
+        self._sampled = False
+
+    def run(self, prompt: str, trace: Optional[Trace], kwargs: Dict[str, Any]):
+        threading.Thread(target=self._loop, args=(prompt, trace, kwargs), name="llm-route", daemon=True).start()
+
+    def _loop(self, prompt: str, trace: Optional[Trace], kwargs: Dict[str, Any]):
+        stream = self._client.generate_stream(prompt, trace=trace, abort=self._abort, **kwargs)
+        try:
+            for delta in stream:
+                if self.ttft is None:
+                    # Timed here rather than when the router picks a winner, so losers are sampled too
+                    self.ttft = time.perf_counter() - self.start
+                    self._sample(self.ttft)
+                if self._cancelled.is_set():
+                    return
+                self._events.put((self, delta))
+            self._events.put((self, _DONE))
+        except Exception as ex:  # handed to the router, which fails over
+            if not self._cancelled.is_set():
+                self._events.put((self, ex))
+        finally:
+            stream.close()
+
+    def _settle(self, trace: Optional[Trace], outcome: str, error: Optional[BaseException] = None):
+        if self._settled:
+            return
+        self._settled = True
+        attrs: Dict[str, Any] = {"hedge": self.hedge}
+        if self.ttft is not None:
+            attrs["ttft_ms"] = round(self.ttft * 1000.0, 1)
+        if error is not None:
+            attrs["error"] = f"{type(error).__name__}: {error}"
+        _decide(trace, self.name, outcome, time.perf_counter() - self.start, **attrs)
+
+    def _sample(self, seconds: float):
+        """Add this attempt's time-to-first-token to the route's window, once."""
+        with self._sample_lock:
+            if self._sampled:
+                return
+            self._sampled = True
+        self.state.add_ttft(seconds)
+
+    def succeed(self, trace: Optional[Trace]):
+        self.state.breaker.success()
+        self._settle(trace, "ok")
+
+    def fail(self, trace: Optional[Trace], error: BaseException):
+        self.state.breaker.failure()
+        self._settle(trace, "error", error)
+
+    def cancel(self, trace: Optional[Trace]):
+        self._cancelled.set()
+        # Censored sample: no token yet after this long (a no-op if one arrived)
+        self._sample(time.perf_counter() - self.start)
+        self._abort.abort()
+        if not self._settled:
+            self.state.breaker.release()
+        self._settle(trace, "cancelled")
+
+
+class LLMRouter:
+    """``LLMClient`` interface over an ordered list of routes (provider + model).
+
+    Each call goes to the first route whose circuit breaker is closed and fails
+    over to the next on any error (timeouts, 429 and 5xx). With more than one
+    route the router owns retries: its clients make no HTTP-level retries, so
+    a failing route is left at once and its breaker counts every error (a
+    single route keeps the transport's retries). A stream that already produced text is not failed over. With
+    ``hedge`` a backup request is started on the next route when the current
+    one is slow to produce a first token; the loser is cancelled. Every
+    decision is recorded under ``routing`` in the request trace.
+    """
+
+    def __init__(self, configs: Optional[List[LLMConfig]] = None, hedge: bool = LLM_HEDGE):
+        self.configs = configs or parse_routes(LLM_ROUTES, LLMConfig())
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._clients: Dict[int, LLMClient] = {}
+        # The primary is built now, so warm-up loads a local model; backups on first use
+        self._client(0)
+
+    @property
+    def config(self) -> LLMConfig:
+        """The primary route's config (cache keys and rate limits are taken from it)."""
+        return self.configs[0]
+
+    def _client(self, i: int) -> LLMClient:
+        with self._lock:
+            if i not in self._clients:
+                self._clients[i] = LLMClient(self.configs[i], retries=len(self.configs) == 1)
+            return self._clients[i]
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return self._client(0).count_tokens(texts)
+
+    def _routes(self, trace: Optional[Trace]) -> Iterator[Tuple[int, str, RouteState]]:
+        """Routes in order, skipping (and recording) those whose breaker is open."""
+        for i, config in enumerate(self.configs):
+            name = route_name(config)
+            state = route_state(name)
+            if state.breaker.allow():
+                yield i, name, state
+            else:
+                _decide(trace, name, "breaker_open", 0.0)
+
+    def _unavailable(self) -> RuntimeError:
+        names = ", ".join(route_name(c) for c in self.configs)
+        return RuntimeError(f"No LLM route available (circuit open for all of: {names})")
+
+    def generate(self, prompt: str, trace: Optional[Trace] = None, **kwargs) -> str:
+        if self.hedge:
+            # Hedging needs the first-token signal, which only a stream gives
+            return "".join(self.generate_stream(prompt, trace=trace, **kwargs))
+        last: Optional[BaseException] = None
+        for i, name, state in self._routes(trace):
+            start = time.perf_counter()
+            try:
+                text = self._client(i).generate(prompt, trace=trace, **kwargs)
+            except Exception as ex:  # try the next route
+                state.breaker.failure()
+                _decide(trace, name, "error", time.perf_counter() - start, error=f"{type(ex).__name__}: {ex}")
+                last = ex
+                continue
+            state.breaker.success()
+            _decide(trace, name, "ok", time.perf_counter() - start)
+            return text
+        raise last or self._unavailable()
+
+    def _start(
+        self,
+        routes: Iterator[Tuple[int, str, RouteState]],
+        hedge: bool,
+        prompt: str,
+        trace: Optional[Trace],
+        kwargs: Dict[str, Any],
+        events: "queue.Queue[Any]",
+    ) -> Tuple[Optional[_Attempt], Optional[BaseException]]:
+        """Start the next available route; ``(None, error)`` if none could be started."""
+        error: Optional[BaseException] = None
+        for i, name, state in routes:
+            try:
+                client = self._client(i)
+            except Exception as ex:  # provider library or credentials missing
+                state.breaker.failure()
+                _decide(trace, name, "error", 0.0, hedge=hedge, error=f"{type(ex).__name__}: {ex}")
+                error = ex
+                continue
+            attempt = _Attempt(client, name, state, hedge, events)
+            attempt.run(prompt, trace, kwargs)
+            return attempt, None
+        return None, error
+
+    def generate_stream(self, prompt: str, trace: Optional[Trace] = None, **kwargs) -> Iterator[str]:
+        events: "queue.Queue[Any]" = queue.Queue()
+        routes = self._routes(trace)
+        running: List[_Attempt] = []
+        winner: Optional[_Attempt] = None
+        last: Optional[BaseException] = None
+        hedged = False
+        try:
+            # Until one attempt produces a token: fail over on errors, hedge on slowness
+            while winner is None:
+                if not running:
+                    attempt, error = self._start(routes, False, prompt, trace, kwargs, events)
+                    if attempt is None:
+                        raise error or last or self._unavailable()
+                    running.append(attempt)
+                    hedged = False
+                timeout = None
+                if self.hedge and not hedged:
+                    lead = running[0]
+                    timeout = max(0.0, lead.start + lead.state.hedge_delay() - time.perf_counter())
+                try:
+                    attempt, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedged = True
+                    backup, _ = self._start(routes, True, prompt, trace, kwargs, events)
+                    if backup is not None:
+                        running.append(backup)
+                    continue
+                if attempt not in running:
+                    continue
+                if isinstance(item, BaseException):
+                    running.remove(attempt)
+                    attempt.fail(trace, item)
+                    last = item
+                    continue
+                winner = attempt
+                for other in running:
+                    if other is not winner:
+                        other.cancel(trace)
+                running = [winner]
+                if item is _DONE:
+                    winner.succeed(trace)
+                    return
+                yield item
+            while True:
+                attempt, item = events.get()
+                if attempt is not winner:
+                    continue
+                if item is _DONE:
+                    winner.succeed(trace)
+                    return
+                if isinstance(item, BaseException):
+                    winner.fail(trace, item)
+                    raise item
+                yield item
+        finally:
+            # Reached with attempts still running only if the caller stopped early
+            for attempt in running:
+                attempt.cancel(trace)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# lazy: serve the UI immediately and load the embedding model (and the local
+# LLM when LLM_PROVIDER=local) in a background thread after launch.
+# eager: load them before launching, so the first request never waits.
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "lazy")
+
+_T0 = time.monotonic()
+_WALL0 = time.time()
+_MARKS: Dict[str, float] = {}
+_ERRORS: Dict[str, str] = {}
+_LOCK = threading.Lock()
+
+
+def _process_age() -> float:
+    """Seconds since the interpreter process started (Linux), else since this import."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+# Time spent before this module was imported (interpreter start, site imports).
+_OFFSET = _process_age()
+
+
+def mark(name: str) -> float:
+    """Record that ``name`` finished; returns seconds since process start."""
+    elapsed = _OFFSET + time.monotonic() - _T0
+    with _LOCK:
+        _MARKS[name] = round(elapsed, 3)
+    return elapsed
+
+
+def report() -> Dict[str, Any]:
+    with _LOCK:
+        return {
+            "started_at": _WALL0 - _OFFSET,
+            "mode": STARTUP_MODE,
+            "marks": dict(_MARKS),
+            "errors": dict(_ERRORS),
+        }
+
+
+def write_report(path: Optional[str] = None) -> Dict[str, Any]:
+    """Append this run's timings to ``DATA_DIR/startup_timings.jsonl`` and print a summary."""
+    from .storage import DATA_DIR, ensure_data_dir
+
+    rep = report()
+    ensure_data_dir()
+    with open(path or os.path.join(DATA_DIR, "startup_timings.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(rep) + "\n")
+    summary = ", ".join(f"{k}={v:.2f}s" for k, v in rep["marks"].items())
+    print(f"startup: {summary}" + (f" errors={rep['errors']}" if rep["errors"] else ""), flush=True)
+    return rep
+
+
+def _warm(write: bool = True):
+    from .agent import get_agent
+    from .embeddings import _encode
+    from .storage import get_index
+
+    try:
+        get_index()
+        mark("index_ready")
+    except Exception as ex:  # e.g. an unreadable manifest; searches report it too
+        _ERRORS["index"] = f"{type(ex).__name__}: {ex}"
+    try:
+        # Bypasses the embedding cache so the model is actually loaded.
+        _encode(["warm-up"])
+        mark("embedding_ready")
+    except Exception as ex:  # the first query will retry and surface the error
+        _ERRORS["embedding"] = f"{type(ex).__name__}: {ex}"
+    try:
+        # Builds the LLM client; for provider=local this loads the weights.
+        get_agent()
+        mark("llm_ready")
+    except Exception as ex:
+        _ERRORS["llm"] = f"{type(ex).__name__}: {ex}"
+    mark("ready")
+    if write:
+        write_report()
+
+
+def warm_up() -> Optional[threading.Thread]:
+    """Load models per ``STARTUP_MODE``: inline when eager, else in a daemon thread.
+
+    In lazy mode the report is written once warm-up finishes; in eager mode
+    warm-up precedes the launch, so the caller writes it after marking ``launched``.
+    """
+    if STARTUP_MODE == "eager":
+        _warm(write=False)
+        return None
+    worker = threading.Thread(target=_warm, name="warm-up", daemon=True)
+    worker.start()
+    return worker
@@ -1,17 +1,62 @@
 from __future__ import annotations
 
 import json
+import mmap
 import os
-from dataclasses import asdict, dataclass
-from typing import Any, Dict, List, Optional
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 import numpy as np
 
+from . import ann as ann_lib
+from . import quantize
+from .docstore import DocStore
+from .embeddings import top_k_with_scores
+from .metrics import INDEX_POOL_BYTES, INDEX_POOL_EVICTIONS, METRICS_ENABLED
+
 DATA_DIR = os.environ.get("DATA_DIR", "data")
 CONNECTIONS_PATH = os.path.join(DATA_DIR, "connections.json")
+# Legacy single-file index; migrated into the segmented store on first use.
 INDEX_META_PATH = os.path.join(DATA_DIR, "index_meta.json")
 INDEX_VECS_PATH = os.path.join(DATA_DIR, "index_vectors.npy")
 
+# Segmented index: every ingest writes an immutable vector segment (.npy) and its
+# rows' text/metadata into docs.sqlite (keyed by row id, with an FTS5 index);
+# manifest.json lists the live segments and is swapped atomically, so a crash
+# mid-write never exposes a partial segment. Row ids are allocated once and
+# never reused; deleted rows are tombstoned per segment until compaction drops them.
+INDEX_DIR = os.path.join(DATA_DIR, "index")
+# Namespaces (one per team or workspace) each have such an index of their own:
+# the default namespace lives in INDEX_DIR, others under NAMESPACES_DIR/<name>.
+# Indexes are opened on their first query and kept in an LRU pool; beyond
+# INDEX_POOL_BUDGET_MB of heap memory (quantized codes, ANN structures, vectors
+# not memory-mapped) the least recently queried are dropped. Memory-mapped
+# float32 segments are not counted: the OS pages them out on its own.
+DEFAULT_NAMESPACE = "default"
+NAMESPACES_DIR = os.path.join(DATA_DIR, "namespaces")
+INDEX_POOL_BUDGET_MB = float(os.environ.get("INDEX_POOL_BUDGET_MB", os.environ.get("INDEX_MEMORY_BUDGET_MB", "2048")))
+_NAMESPACE_NAME = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+INDEX_MAX_SEGMENTS = int(os.environ.get("INDEX_MAX_SEGMENTS", "16"))
+# Compact once this fraction of stored rows is tombstoned.
+INDEX_MAX_DEAD_FRACTION = float(os.environ.get("INDEX_MAX_DEAD_FRACTION", "0.2"))
+# Rows sampled to train IVF centroids; HNSW graphs are re-persisted once this
+# many rows were inserted since the last save (newer rows are replayed on load).
+ANN_TRAIN_SAMPLE = int(os.environ.get("ANN_TRAIN_SAMPLE", "100000"))
+HNSW_SAVE_EVERY = int(os.environ.get("HNSW_SAVE_EVERY", "5000"))
+# Rows per block in batched exact search (bounds the queries x rows score matrix).
+_SEARCH_BLOCK_ROWS = 65536
+# Hybrid retrieval: hits taken from each ranker (cosine, BM25) before fusion,
+# the reciprocal rank fusion constant, and RETRIEVAL_HYBRID=0 for vector-only.
+RETRIEVAL_DEPTH = int(os.environ.get("RETRIEVAL_DEPTH", "50"))
+RETRIEVAL_RRF_K = int(os.environ.get("RETRIEVAL_RRF_K", "60"))
+RETRIEVAL_HYBRID = os.environ.get("RETRIEVAL_HYBRID", "1") != "0"
+# Query terms occurring in more than this fraction of rows are not matched lexically.
+RETRIEVAL_MAX_DF = float(os.environ.get("RETRIEVAL_MAX_DF", "0.2"))
+
 
 @dataclass
 class Document:
@@ -25,11 +70,21 @@ def ensure_data_dir():
 
 
 def load_connections() -> List[Dict[str, Any]]:
+    """Saved connections; entries from before connection ids existed are given one."""
     ensure_data_dir()
     if not os.path.exists(CONNECTIONS_PATH):
         return []
     with open(CONNECTIONS_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+        conns = json.load(f)
+    if any("id" not in c for c in conns):
+        for c in conns:
+            c.setdefault("id", new_connection_id())
+        save_connections(conns)
+    return conns
+
+
+def new_connection_id() -> str:
+    return uuid.uuid4().hex[:12]
 
 
 def save_connections(conns: List[Dict[str, Any]]):
@@ -38,31 +93,1029 @@ def save_connections(conns: List[Dict[str, Any]]):
         json.dump(conns, f, indent=2)
 
 
-def append_to_index(docs: List[Document], vectors: np.ndarray):
-    ensure_data_dir()
-    # Append vectors
-    if os.path.exists(INDEX_VECS_PATH):
-        old = np.load(INDEX_VECS_PATH)
-        all_vecs = np.vstack([old, vectors])
+class _Namespace:
+    """Location, doc store and writer locks of one namespace's index."""
+
+    def __init__(self, name: str, index_dir: str):
+        self.name = name
+        self.dir = index_dir
+        self.manifest_path = os.path.join(index_dir, "manifest.json")
+        self.docs = DocStore(os.path.join(index_dir, "docs.sqlite"))
+        self.write_lock, self.compact_lock = _WRITER_LOCKS.setdefault(name, (threading.Lock(), threading.Lock()))
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+
+_NAMESPACES: Dict[str, _Namespace] = {}
+_NAMESPACES_LOCK = threading.Lock()
+# Writer locks by namespace name. They outlive the _Namespace entries, which
+# the pool drops on eviction, so a writer still holding a dropped entry and
+# one using its replacement exclude each other.
+_WRITER_LOCKS: Dict[str, Tuple[threading.Lock, threading.Lock]] = {}
+
+
+def _checked_name(name: Optional[str]) -> str:
+    name = name or DEFAULT_NAMESPACE
+    if name not in _NAMESPACES and not _NAMESPACE_NAME.fullmatch(name):
+        raise ValueError(f"Invalid namespace {name!r}: use lowercase letters, digits, '-' and '_'")
+    return name
+
+
+def _index_dir(name: str) -> str:
+    return INDEX_DIR if name == DEFAULT_NAMESPACE else os.path.join(NAMESPACES_DIR, name)
+
+
+def _namespace(name: Optional[str]) -> _Namespace:
+    name = _checked_name(name)
+    ns = _NAMESPACES.get(name)
+    if ns is not None:
+        return ns
+    with _NAMESPACES_LOCK:
+        if name not in _NAMESPACES:
+            _NAMESPACES[name] = _Namespace(name, _index_dir(name))
+        return _NAMESPACES[name]
+
+
+def _release_namespace(name: str):
+    """Close an evicted namespace's doc store and forget it, unless a write holds it.
+
+    A query still holding the evicted handle reopens the doc store on its next read.
+    """
+    with _NAMESPACES_LOCK:
+        ns = _NAMESPACES.get(name)
+        if ns is None or ns.write_lock.locked() or ns.compact_lock.locked():
+            return
+        del _NAMESPACES[name]
+    ns.docs.close()
+
+
+def normalize_namespace(name: Optional[str]) -> str:
+    """``name`` as stored (trimmed, lowercased; blank is the default namespace); ValueError if malformed."""
+    return _checked_name((name or "").strip().lower())
+
+
+def list_namespaces() -> List[str]:
+    """Namespaces that have an index on disk; the default one is always listed.
+
+    Reads the directory only: listing does not open (or register) any namespace.
+    """
+    names = {DEFAULT_NAMESPACE}
+    if os.path.isdir(NAMESPACES_DIR):
+        names.update(
+            name
+            for name in os.listdir(NAMESPACES_DIR)
+            if _NAMESPACE_NAME.fullmatch(name) and os.path.exists(os.path.join(_index_dir(name), "manifest.json"))
+        )
+    return sorted(names)
+
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+
+def _atomic_write_json(path: str, obj: Any):
+    tmp = _tmp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _atomic_save_npy(path: str, arr: np.ndarray):
+    tmp = _tmp_path(path)
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _empty_manifest() -> Dict[str, Any]:
+    return {
+        "version": 1,
+        "generation": 0,
+        "next_segment": 0,
+        "next_row": 0,
+        "segments": [],
+        "retired": [],
+        "ann": None,
+    }
+
+
+def _read_manifest(ns: _Namespace) -> Dict[str, Any]:
+    if not os.path.exists(ns.manifest_path):
+        return _empty_manifest()
+    with open(ns.manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if "next_row" not in manifest:
+        # Written before rows could be dropped, so row ids are still positions
+        offset = 0
+        for seg in manifest["segments"]:
+            seg["base"] = offset
+            offset += seg["count"]
+        manifest["next_row"] = offset
+    return manifest
+
+
+def _next_name(manifest: Dict[str, Any], prefix: str) -> str:
+    name = f"{prefix}-{manifest['next_segment']:06d}"
+    manifest["next_segment"] += 1
+    return name
+
+
+def _new_segment(
+    ns: _Namespace, manifest: Dict[str, Any], vectors: np.ndarray, ids: Optional[np.ndarray] = None
+) -> Dict[str, Any]:
+    """Write a segment; new rows get the next row ids, a merge passes the ids its rows keep.
+
+    A segment's ids are ``base, base + 1, ...`` unless a merge left gaps, in
+    which case they are written next to the vectors.
+    """
+    seg_id = _next_name(manifest, "seg")
+    vec_file = f"{seg_id}.npy"
+    _atomic_save_npy(ns.path(vec_file), np.asarray(vectors, dtype=np.float32))
+    seg = {"id": seg_id, "vectors": vec_file, "count": len(vectors)}
+    if ids is None:
+        seg["base"] = manifest["next_row"]
+        manifest["next_row"] += len(vectors)
     else:
-        all_vecs = vectors
-    np.save(INDEX_VECS_PATH, all_vecs)
+        seg["base"] = int(ids[0])
+        if int(ids[-1]) - int(ids[0]) + 1 != len(ids):
+            seg["ids"] = f"{seg_id}.ids.npy"
+            _atomic_save_npy(ns.path(seg["ids"]), np.asarray(ids, dtype=np.int64))
+    return seg
 
-    # Append meta
-    meta = []
-    if os.path.exists(INDEX_META_PATH):
-        with open(INDEX_META_PATH, "r", encoding="utf-8") as f:
-            meta = json.load(f)
-    meta.extend([asdict(d) for d in docs])
-    with open(INDEX_META_PATH, "w", encoding="utf-8") as f:
-        json.dump(meta, f, indent=2)
 
+def _segment_ids(ns: _Namespace, seg: Dict[str, Any]) -> np.ndarray:
+    """Row ids of a segment's rows, ascending."""
+    if seg.get("ids"):
+        return np.load(ns.path(seg["ids"]))
+    return np.arange(seg["base"], seg["base"] + seg["count"], dtype=np.int64)
 
-def load_index():
-    if not os.path.exists(INDEX_VECS_PATH) or not os.path.exists(INDEX_META_PATH):
-        return None, []
+
+def _segment_dead(ns: _Namespace, seg: Dict[str, Any]) -> np.ndarray:
+    """Positions (within the segment) of its tombstoned rows, ascending."""
+    if seg.get("dead"):
+        return np.load(ns.path(seg["dead"]))
+    return np.zeros(0, dtype=np.int64)
+
+
+def _dead_fraction(manifest: Dict[str, Any]) -> float:
+    rows = _row_count(manifest)
+    return sum(seg.get("dead_rows", 0) for seg in manifest["segments"]) / rows if rows else 0.0
+
+
+def _save_assignments(ns: _Namespace, seg: Dict[str, Any], ann: Dict[str, Any], assignments: np.ndarray):
+    """Persist a segment's IVF cell ids, tagged with the centroids they refer to."""
+    name = f"{seg['id']}.{ann['centroids'][:-4]}.npy"
+    _atomic_save_npy(ns.path(name), assignments.astype(np.int32))
+    seg["assign"] = name
+
+
+def _save_quantized(ns: _Namespace, seg: Dict[str, Any], vectors: np.ndarray) -> Optional[quantize.QuantizedMatrix]:
+    """Write the compact first-pass copy of a segment when quantization is enabled."""
+    kind = quantize.INDEX_QUANTIZATION
+    if kind == "none":
+        return None
+    qm = quantize.QuantizedMatrix.from_vectors(vectors, kind)
+    entry = {"kind": kind, "codes": f"{seg['id']}.{kind}.npy"}
+    _atomic_save_npy(ns.path(entry["codes"]), qm.codes)
+    if qm.scale is not None:
+        entry["scale"] = f"{seg['id']}.{kind}-scale.npy"
+        _atomic_save_npy(ns.path(entry["scale"]), qm.scale)
+    seg["quant"] = entry
+    return qm
+
+
+def _load_quantized(ns: _Namespace, seg: Dict[str, Any], vectors: np.ndarray) -> Optional[quantize.QuantizedMatrix]:
+    kind = quantize.INDEX_QUANTIZATION
+    if kind == "none":
+        return None
+    entry = seg.get("quant") or {}
+    if entry.get("kind") != kind:
+        return quantize.QuantizedMatrix.from_vectors(vectors, kind)
+    scale = np.load(ns.path(entry["scale"])) if entry.get("scale") else None
+    return quantize.QuantizedMatrix(kind, np.load(ns.path(entry["codes"])), scale)
+
+
+def _segment_files(seg: Dict[str, Any]) -> List[str]:
+    quant = seg.get("quant") or {}
+    names = [
+        seg["vectors"],
+        seg.get("meta"),
+        seg.get("ids"),
+        seg.get("dead"),
+        seg.get("assign"),
+        quant.get("codes"),
+        quant.get("scale"),
+    ]
+    return [name for name in names if name]
+
+
+def _migrate_legacy(ns: _Namespace, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """Adopt a pre-segment index_vectors.npy/index_meta.json pair as segment 0."""
+    if manifest["segments"] or not (os.path.exists(INDEX_VECS_PATH) and os.path.exists(INDEX_META_PATH)):
+        return manifest
     vecs = np.load(INDEX_VECS_PATH)
     with open(INDEX_META_PATH, "r", encoding="utf-8") as f:
         meta = json.load(f)
-    return vecs, meta
+    manifest["segments"].append(_new_segment(ns, manifest, vecs))
+    ns.docs.put(0, meta)
+    manifest["generation"] += 1
+    _atomic_write_json(ns.manifest_path, manifest)
+    os.remove(INDEX_VECS_PATH)
+    os.remove(INDEX_META_PATH)
+    return manifest
+
+
+def _migrate_segment_meta(ns: _Namespace, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """Move per-segment metadata JSON files into the doc store, keeping row ids."""
+    for seg in manifest["segments"]:
+        if seg.get("meta"):
+            with open(ns.path(seg["meta"]), "r", encoding="utf-8") as f:
+                ns.docs.put(seg["base"], json.load(f))
+            manifest["retired"] = manifest.get("retired", []) + [seg.pop("meta")]
+    manifest["generation"] += 1
+    _atomic_write_json(ns.manifest_path, manifest)
+    return manifest
+
+
+def load_manifest(namespace: str = DEFAULT_NAMESPACE) -> Dict[str, Any]:
+    ns = _namespace(namespace)
+    ensure_data_dir()
+    os.makedirs(ns.dir, exist_ok=True)
+    manifest = _read_manifest(ns)
+    if not manifest["segments"] and ns.name == DEFAULT_NAMESPACE and os.path.exists(INDEX_VECS_PATH):
+        with ns.write_lock:
+            manifest = _migrate_legacy(ns, _read_manifest(ns))
+    if any(seg.get("meta") for seg in manifest["segments"]):
+        with ns.write_lock:
+            manifest = _read_manifest(ns)
+            if any(seg.get("meta") for seg in manifest["segments"]):
+                manifest = _migrate_segment_meta(ns, manifest)
+    return manifest
+
+
+def _load_segment(ns: _Namespace, seg: Dict[str, Any], mmap_mode: Optional[str] = None) -> np.ndarray:
+    return np.load(ns.path(seg["vectors"]), mmap_mode=mmap_mode)
+
+
+def _row_count(manifest: Dict[str, Any]) -> int:
+    """Rows stored in the segments, tombstoned ones included."""
+    return sum(seg["count"] for seg in manifest["segments"])
+
+
+def _ann_due(manifest: Dict[str, Any]) -> bool:
+    """Whether the ANN structure for this manifest should be (re)built."""
+    backend = ann_lib.ANN_BACKEND
+    rows = _row_count(manifest)
+    if backend == "exact" or rows < ann_lib.ANN_MIN_ROWS:
+        return False
+    if backend == "hnsw" and not ann_lib.hnsw_available():
+        return False
+    ann = manifest.get("ann") or {}
+    if ann.get("backend") != backend:
+        return True
+    if backend == "ivf":
+        return rows > 4 * ann["trained_rows"]
+    return rows - ann["count"] >= HNSW_SAVE_EVERY
+
+
+def append_to_index(docs: List[Document], vectors: np.ndarray, namespace: str = DEFAULT_NAMESPACE):
+    """Write docs/vectors as a new segment; cost is O(len(docs)), not O(corpus).
+
+    Rows are stored in the doc store before the manifest names the segment;
+    rows left by an append that crashed in between are overwritten by the next
+    one and are never returned, since searches only see ids below ``next_row``.
+    """
+    if len(docs) == 0:
+        return
+    ns = _namespace(namespace)
+    load_manifest(ns.name)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    with ns.write_lock:
+        manifest = _read_manifest(ns)
+        docs_meta = [asdict(d) for d in docs]
+        start = manifest["next_row"]
+        seg = _new_segment(ns, manifest, vectors)
+        ns.docs.put(start, docs_meta)
+        ann = manifest.get("ann") or {}
+        assignments = None
+        if ann.get("backend") == "ivf":
+            centroids = np.load(ns.path(ann["centroids"]))
+            assignments = ann_lib.assign(vectors, centroids)
+            _save_assignments(ns, seg, ann, assignments)
+        quant = _save_quantized(ns, seg, vectors)
+        manifest["segments"].append(seg)
+        manifest["generation"] += 1
+        _atomic_write_json(ns.manifest_path, manifest)
+        handle = _POOL.loaded(ns.name)
+        if handle is not None:
+            handle.extend(manifest, docs_meta, assignments, quant)
+        due = len(manifest["segments"]) > INDEX_MAX_SEGMENTS or _ann_due(manifest)
+    if due:
+        _start_maintenance(ns.name)
+
+
+def tombstone_rows(row_ids: Iterable[int], namespace: str = DEFAULT_NAMESPACE) -> int:
+    """Delete rows by id; returns how many were live.
+
+    Each affected segment gets a new tombstone file (segments stay immutable)
+    and search skips those rows from the next query on; their text leaves the
+    doc store right after the manifest swap. Compaction later drops the
+    vectors, and runs in the background once ``INDEX_MAX_DEAD_FRACTION`` of
+    the rows are dead.
+    """
+    ids = np.unique(np.asarray(list(row_ids), dtype=np.int64))
+    if len(ids) == 0:
+        return 0
+    ns = _namespace(namespace)
+    load_manifest(ns.name)
+    with ns.write_lock:
+        manifest = _read_manifest(ns)
+        removed: List[np.ndarray] = []
+        for seg in manifest["segments"]:
+            seg_ids = _segment_ids(ns, seg)
+            local = np.searchsorted(seg_ids, ids)
+            local = local[local < len(seg_ids)]
+            local = local[np.isin(seg_ids[local], ids)]
+            dead = _segment_dead(ns, seg)
+            fresh = np.setdiff1d(local, dead)
+            if len(fresh) == 0:
+                continue
+            if seg.get("dead"):
+                manifest["retired"] = manifest.get("retired", []) + [seg["dead"]]
+            seg["dead"] = f"{_next_name(manifest, seg['id'] + '.dead')}.npy"
+            _atomic_save_npy(ns.path(seg["dead"]), np.union1d(dead, fresh).astype(np.int64))
+            seg["dead_rows"] = len(dead) + len(fresh)
+            removed.append(seg_ids[fresh])
+        if not removed:
+            return 0
+        manifest["generation"] += 1
+        _atomic_write_json(ns.manifest_path, manifest)
+        removed_ids = np.concatenate(removed)
+        ns.docs.delete(removed_ids.tolist())
+        due = _dead_fraction(manifest) > INDEX_MAX_DEAD_FRACTION
+    if due:
+        _start_maintenance(ns.name)
+    return len(removed_ids)
+
+
+def _start_maintenance(namespace: str):
+    threading.Thread(target=maintain_index, args=(namespace,), name="index-maintenance", daemon=True).start()
+
+
+def _drop_retired(ns: _Namespace, manifest: Dict[str, Any]):
+    for name in manifest.get("retired", []):
+        path = ns.path(name)
+        if os.path.exists(path):
+            os.remove(path)
+    manifest["retired"] = []
+
+
+def compact_index(namespace: str = DEFAULT_NAMESPACE) -> bool:
+    """Merge all live segments into one, dropping tombstoned rows. Returns True if a merge happened.
+
+    Surviving rows keep their order and their row ids, so the doc store is not
+    rewritten; only the dropped rows leave it. Dropping rows shifts positions,
+    so an HNSW graph is discarded and rebuilt by the next maintenance run.
+    The merge itself runs outside the write lock so ingest is never blocked on
+    it; segments appended meanwhile stay after the merged one, and rows
+    tombstoned meanwhile are carried over as tombstones of the merged segment.
+    Files of replaced segments are deleted on the following maintenance run,
+    giving concurrent readers that still hold the old manifest time to finish.
+    """
+    ns = _namespace(namespace)
+    if not ns.compact_lock.acquire(blocking=False):
+        return False
+    try:
+        # Migrations take the write lock themselves, so they run before it is held here
+        load_manifest(ns.name)
+        with ns.write_lock:
+            manifest = _read_manifest(ns)
+            _drop_retired(ns, manifest)
+            _atomic_write_json(ns.manifest_path, manifest)
+            snapshot = list(manifest["segments"])
+        if len(snapshot) <= 1 and not any(seg.get("dead") for seg in snapshot):
+            return False
+
+        keeps = []
+        for seg in snapshot:
+            keep = np.ones(seg["count"], dtype=bool)
+            keep[_segment_dead(ns, seg)] = False
+            keeps.append(keep)
+        vecs = np.vstack([_load_segment(ns, seg)[keep] for seg, keep in zip(snapshot, keeps)])
+        ids = np.concatenate([_segment_ids(ns, seg)[keep] for seg, keep in zip(snapshot, keeps)])
+        dropped = np.concatenate([_segment_ids(ns, seg)[~keep] for seg, keep in zip(snapshot, keeps)])
+        assign_files = [seg.get("assign") for seg in snapshot]
+
+        with ns.write_lock:
+            manifest = _read_manifest(ns)
+            current = {seg["id"]: seg for seg in manifest["segments"]}
+            late = [
+                _segment_ids(ns, seg)[np.setdiff1d(_segment_dead(ns, current[seg["id"]]), _segment_dead(ns, seg))]
+                for seg in snapshot
+                if current[seg["id"]].get("dead") != seg.get("dead")
+            ]
+            merged = []
+            if len(ids):
+                seg = _new_segment(ns, manifest, vecs, ids)
+                ann = manifest.get("ann") or {}
+                if ann.get("backend") == "ivf" and all(a and ann["centroids"][:-4] in a for a in assign_files):
+                    assignments = np.concatenate(
+                        [np.load(ns.path(a))[keep] for a, keep in zip(assign_files, keeps)]
+                    )
+                    _save_assignments(ns, seg, ann, assignments)
+                _save_quantized(ns, seg, vecs)
+                if late:
+                    dead = np.searchsorted(ids, np.concatenate(late)).astype(np.int64)
+                    seg["dead"] = f"{_next_name(manifest, seg['id'] + '.dead')}.npy"
+                    _atomic_save_npy(ns.path(seg["dead"]), np.sort(dead))
+                    seg["dead_rows"] = len(dead)
+                merged = [seg]
+            merged_ids = {seg["id"] for seg in snapshot}
+            rest = [seg for seg in manifest["segments"] if seg["id"] not in merged_ids]
+            manifest["segments"] = merged + rest
+            replaced = snapshot + [current[seg["id"]] for seg in snapshot]
+            retired = manifest.get("retired", []) + [name for seg in replaced for name in _segment_files(seg)]
+            ann = manifest.get("ann") or {}
+            if len(dropped) and ann.get("backend") == "hnsw":
+                retired.append(ann["graph"])
+                manifest["ann"] = None
+            manifest["retired"] = list(dict.fromkeys(retired))
+            manifest["generation"] += 1
+            _atomic_write_json(ns.manifest_path, manifest)
+        if len(dropped):
+            # Already gone unless a crash interrupted tombstone_rows
+            ns.docs.delete(dropped.tolist())
+        return True
+    finally:
+        ns.compact_lock.release()
+
+
+def build_ann_index(force: bool = False, namespace: str = DEFAULT_NAMESPACE) -> bool:
+    """Train/persist the configured ANN structure. Returns True if it changed.
+
+    IVF: k-means centroids are trained on a row sample, then every segment's
+    cell assignments are written next to its vectors; segments appended later
+    are assigned at append time. HNSW: the graph is extended with rows added
+    since the last save and written to a new file.
+    """
+    ns = _namespace(namespace)
+    if not ns.compact_lock.acquire(blocking=False):
+        return False
+    try:
+        manifest = load_manifest(ns.name)
+        if not force and not _ann_due(manifest):
+            return False
+        backend = ann_lib.ANN_BACKEND
+        if backend == "exact" or not manifest["segments"]:
+            return False
+        state = get_index(ns.name).state
+        total = state.total
+        old = manifest.get("ann") or {}
+
+        if backend == "ivf":
+            rng = np.random.default_rng(0)
+            sample_ids = np.sort(rng.choice(total, min(total, ANN_TRAIN_SAMPLE), replace=False))
+            centroids = ann_lib.train_ivf(state.gather(sample_ids))
+            assigned = {seg.id: ann_lib.assign(seg.vectors, centroids) for seg in state.segments}
+            with ns.write_lock:
+                manifest = _read_manifest(ns)
+                ann = {"backend": "ivf", "centroids": f"{_next_name(manifest, 'ivf')}.npy", "trained_rows": total}
+                _atomic_save_npy(ns.path(ann["centroids"]), centroids)
+                retired = [old.get("centroids")] + [seg.get("assign") for seg in manifest["segments"]]
+                for seg in manifest["segments"]:
+                    assignments = assigned.get(seg["id"])
+                    if assignments is None:
+                        assignments = ann_lib.assign(_load_segment(ns, seg, mmap_mode="r"), centroids)
+                    _save_assignments(ns, seg, ann, assignments)
+                _commit_ann(ns, manifest, ann, retired)
+        else:
+            graph = state.ann if isinstance(state.ann, ann_lib.HNSWIndex) else None
+            if graph is None:
+                graph = ann_lib.HNSWIndex(dim=state.dim)
+                graph.add(state.gather(np.arange(total)), 0)
+            with ns.write_lock:
+                manifest = _read_manifest(ns)
+                ann = {"backend": "hnsw", "graph": f"{_next_name(manifest, 'hnsw')}.bin", "count": len(graph)}
+                graph.save(ns.path(ann["graph"]))
+                _commit_ann(ns, manifest, ann, [old.get("graph")])
+        return True
+    finally:
+        ns.compact_lock.release()
+
+
+def _commit_ann(ns: _Namespace, manifest: Dict[str, Any], ann: Dict[str, Any], retired: List[Optional[str]]):
+    manifest["ann"] = ann
+    manifest["retired"] = manifest.get("retired", []) + [name for name in retired if name]
+    manifest["generation"] += 1
+    _atomic_write_json(ns.manifest_path, manifest)
+
+
+def maintain_index(namespace: str = DEFAULT_NAMESPACE):
+    """Background upkeep after appends and deletes: compaction, then ANN (re)build."""
+    manifest = load_manifest(namespace)
+    if len(manifest["segments"]) > INDEX_MAX_SEGMENTS or _dead_fraction(manifest) > INDEX_MAX_DEAD_FRACTION:
+        compact_index(namespace)
+    build_ann_index(namespace=namespace)
+
+
+def load_index(namespace: str = DEFAULT_NAMESPACE):
+    """The whole live index in memory as ``(vectors, metadata list)``; queries use ``get_index()`` instead."""
+    ns = _namespace(namespace)
+    manifest = load_manifest(ns.name)
+    if not manifest["segments"]:
+        return None, []
+    parts = [_load_segment(ns, seg) for seg in manifest["segments"]]
+    vecs = np.vstack(parts) if len(parts) > 1 else parts[0]
+    ids = np.concatenate([_segment_ids(ns, seg) for seg in manifest["segments"]])
+    keep = np.ones(len(ids), dtype=bool)
+    offset = 0
+    for seg in manifest["segments"]:
+        keep[offset + _segment_dead(ns, seg)] = False
+        offset += seg["count"]
+    if not keep.all():
+        vecs, ids = vecs[keep], ids[keep]
+    live = set(ids.tolist())
+    return vecs, [meta for row_id, meta in ns.docs.scan(manifest["next_row"]) if row_id in live]
+
+
+def rrf_fuse(rankings: List[List[Tuple[int, float]]], k: int, rrf_k: int = RETRIEVAL_RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal rank fusion: each row scores ``sum(1 / (rrf_k + rank))`` over the rankings it appears in."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (row_id, _) in enumerate(ranking, start=1):
+            fused[row_id] = fused.get(row_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda h: -h[1])[:k]
+
+
+def _content_hash(meta: Dict[str, Any]) -> Optional[str]:
+    return (meta.get("metadata") or {}).get("hash")
+
+
+@dataclass
+class _Segment:
+    id: str
+    vectors: np.ndarray
+    count: int
+    ids: np.ndarray
+    assign: Optional[np.ndarray] = None
+    quant: Optional[quantize.QuantizedMatrix] = None
+    # Tombstoned positions within the segment, and the file they were read from
+    dead: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    dead_file: Optional[str] = None
+
+
+def _open_segment(ns: _Namespace, entry: Dict[str, Any], vectors: np.ndarray, **kwargs: Any) -> _Segment:
+    ids, dead = _segment_ids(ns, entry), _segment_dead(ns, entry)
+    return _Segment(entry["id"], vectors, entry["count"], ids, dead=dead, dead_file=entry.get("dead"), **kwargs)
+
+
+@dataclass
+class _IndexState:
+    """Snapshot searched by queries; replaced wholesale whenever the index changes.
+
+    Searches work on positions (segment order, tombstoned rows included) and
+    report row ids, the doc store's keys.
+    """
+
+    segments: List[_Segment]
+    offsets: np.ndarray
+    ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    # Per position, whether the row is tombstoned; None while nothing is
+    dead: Optional[np.ndarray] = None
+    next_row: int = 0
+    ann: Any = None
+    ann_key: Optional[str] = None
+
+    @property
+    def total(self) -> int:
+        """Stored rows, tombstoned ones included."""
+        return int(self.offsets[-1])
+
+    @property
+    def dead_count(self) -> int:
+        return sum(len(seg.dead) for seg in self.segments)
+
+    def positions(self, row_ids: np.ndarray) -> np.ndarray:
+        """Positions of live row ids; -1 for ids that are tombstoned or not stored."""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, row_ids)
+        found = pos < len(self.ids)
+        found[found] = self.ids[pos[found]] == row_ids[found]
+        if self.dead is not None:
+            found[found] = ~self.dead[pos[found]]
+        return np.where(found, pos, -1)
+
+    @property
+    def dim(self) -> int:
+        return int(self.segments[0].vectors.shape[1]) if self.segments else 0
+
+    def locate(self, row_id: int) -> Tuple[_Segment, int]:
+        s = int(np.searchsorted(self.offsets, row_id, side="right")) - 1
+        return self.segments[s], row_id - int(self.offsets[s])
+
+    def gather(self, ids: np.ndarray) -> np.ndarray:
+        """Fetch vectors for global row ids from the (memory-mapped) segments."""
+        ids = np.asarray(ids, dtype=np.int64)
+        seg_idx = np.searchsorted(self.offsets, ids, side="right") - 1
+        out = np.empty((len(ids), self.dim), dtype=np.float32)
+        for s in np.unique(seg_idx):
+            mask = seg_idx == s
+            out[mask] = self.segments[s].vectors[ids[mask] - self.offsets[s]]
+        return out
+
+
+def _dead_mask(segments: List[_Segment], offsets: np.ndarray) -> Optional[np.ndarray]:
+    if not any(len(seg.dead) for seg in segments):
+        return None
+    mask = np.zeros(int(offsets[-1]), dtype=bool)
+    for seg, offset in zip(segments, offsets):
+        mask[offset + seg.dead] = True
+    return mask
+
+
+def _build_state(
+    ns: _Namespace,
+    segments: List[_Segment], manifest_ann: Optional[Dict[str, Any]], previous: _IndexState, next_row: int
+) -> _IndexState:
+    sizes = [seg.count for seg in segments]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    ids = np.concatenate([seg.ids for seg in segments]) if segments else np.zeros(0, dtype=np.int64)
+    state = _IndexState(
+        segments=segments, offsets=offsets, ids=ids, dead=_dead_mask(segments, offsets), next_row=next_row
+    )
+    ann = manifest_ann or {}
+    if ann.get("backend") != ann_lib.ANN_BACKEND:
+        # Built under another ANN_BACKEND (e.g. before ANN became opt-in); search exactly
+        ann = {}
+    if ann.get("backend") == "ivf":
+        centroids = np.load(ns.path(ann["centroids"]))
+        ivf = ann_lib.IVFFlatIndex(centroids)
+        for seg, offset in zip(segments, offsets):
+            if seg.assign is None:
+                seg.assign = ann_lib.assign(seg.vectors, centroids)
+            ivf.add(seg.assign, int(offset))
+        state.ann, state.ann_key = ivf, ann["centroids"]
+    elif ann.get("backend") == "hnsw" and ann_lib.hnsw_available():
+        if previous.ann_key == ann["graph"]:
+            graph = previous.ann
+        else:
+            graph = ann_lib.HNSWIndex.load(ns.path(ann["graph"]), dim=state.dim)
+        if len(graph) < state.total:
+            graph.add(state.gather(np.arange(len(graph), state.total)), len(graph))
+        state.ann, state.ann_key = graph, ann["graph"]
+    return state
+
+
+class IndexHandle:
+    """Lazily loaded view of one namespace's segmented index.
+
+    Vectors are memory-mapped per segment and only segments that are new since
+    the last load are read; staleness is detected from the manifest's stat
+    stamp and generation counter, so an unchanged index costs one ``os.stat``.
+    """
+
+    def __init__(self, namespace: str = DEFAULT_NAMESPACE):
+        self.ns = _namespace(namespace)
+        self.namespace = self.ns.name
+        self._lock = threading.Lock()
+        self.generation = -1
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._manifest_ann: Optional[Dict[str, Any]] = None
+        self.state = _IndexState(segments=[], offsets=np.zeros(1, dtype=np.int64))
+        self._vectors: Optional[np.ndarray] = None
+        self._hashes: Optional[Set[str]] = None
+
+    def _manifest_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.ns.manifest_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self) -> "IndexHandle":
+        if self._stamp is not None and self._stamp == self._manifest_stamp():
+            return self
+        stamp = self._manifest_stamp()
+        manifest = load_manifest(self.namespace)
+        with self._lock:
+            self._stamp = stamp
+            if manifest["generation"] == self.generation:
+                return self
+            ann_changed = self._manifest_ann != manifest.get("ann")
+            loaded = {seg.id: seg for seg in self.state.segments}
+            segments = []
+            for entry in manifest["segments"]:
+                seg = loaded.get(entry["id"])
+                if seg is None:
+                    vecs = _load_segment(self.ns, entry, mmap_mode="r")
+                    seg = _open_segment(self.ns, entry, vecs, quant=_load_quantized(self.ns, entry, vecs))
+                else:
+                    if seg.dead_file != entry.get("dead"):
+                        # Copied: the previous state may still be searched
+                        seg = replace(seg, dead=_segment_dead(self.ns, entry), dead_file=entry.get("dead"))
+                    if ann_changed:
+                        seg.assign = None
+                if seg.assign is None and entry.get("assign"):
+                    seg.assign = np.load(self.ns.path(entry["assign"]))
+                segments.append(seg)
+            self._manifest_ann = manifest.get("ann")
+            state = _build_state(self.ns, segments, self._manifest_ann, self.state, manifest["next_row"])
+            self._set(state, manifest["generation"])
+        return self
+
+    def extend(
+        self,
+        manifest: Dict[str, Any],
+        meta: List[Dict[str, Any]],
+        assignments: Optional[np.ndarray] = None,
+        quant: Optional[quantize.QuantizedMatrix] = None,
+    ):
+        """Apply a just-committed append in place, avoiding a reload on the next query.
+
+        The new segment's vectors are memory-mapped from the file just written,
+        like every other segment, rather than kept as an in-RAM copy.
+        """
+        with self._lock:
+            if self.generation != manifest["generation"] - 1:
+                return
+            old = self.state
+            entry = manifest["segments"][-1]
+            vectors = np.load(self.ns.path(entry["vectors"]), mmap_mode="r")
+            seg = _open_segment(self.ns, entry, vectors, assign=assignments, quant=quant)
+            offsets = np.append(old.offsets, old.total + len(meta))
+            state = _IndexState(
+                segments=old.segments + [seg],
+                offsets=offsets,
+                ids=np.concatenate([old.ids, seg.ids]),
+                dead=None if old.dead is None else np.concatenate([old.dead, np.zeros(seg.count, dtype=bool)]),
+                next_row=manifest["next_row"],
+                ann_key=old.ann_key,
+            )
+            if isinstance(old.ann, ann_lib.IVFFlatIndex) and assignments is not None:
+                state.ann = old.ann.copy()
+                state.ann.add(assignments, old.total)
+            elif isinstance(old.ann, ann_lib.HNSWIndex):
+                old.ann.add(vectors, old.total)
+                state.ann = old.ann
+            hashes = self._hashes
+            self._set(state, manifest["generation"])
+            if hashes is not None:
+                self._hashes = hashes | {h for h in (_content_hash(m) for m in meta) if h}
+            self._stamp = self._manifest_stamp()
+
+    def _set(self, state: _IndexState, generation: int):
+        self.state = state
+        self._vectors = None
+        self._hashes = None
+        self.generation = generation
+
+    def __len__(self) -> int:
+        """Live rows (tombstoned ones excluded)."""
+        return self.state.total - self.state.dead_count
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        segments = self.state.segments
+        if self._vectors is None and segments:
+            self._vectors = segments[0].vectors if len(segments) == 1 else np.vstack([s.vectors for s in segments])
+        return self._vectors
+
+    def connection_rows(self, connection: str, sources: List[str] = ()) -> Dict[str, List[int]]:
+        """Content hash -> live row ids of the hashes a connection owns (see ``DocStore.owned``)."""
+        state = self.state
+        rows = self.ns.docs.owned(connection, list(sources), state.next_row)
+        live = state.positions(np.array([i for i, _ in rows], dtype=np.int64)) >= 0
+        owned: Dict[str, List[int]] = {}
+        for (row_id, digest), ok in zip(rows, live):
+            if ok and digest:
+                owned.setdefault(digest, []).append(row_id)
+        return owned
+
+    def claim(self, connection: str, hashes: Iterable[str]):
+        """Record the content hashes of a connection's latest fetch (see ``DocStore.claim``)."""
+        self.ns.docs.claim(connection, list(hashes))
+
+    def adopt(self, connection: str, sources: Iterable[str]):
+        """Tag a connection's pre-connection-id rows with it (see ``DocStore.adopt``)."""
+        self.ns.docs.adopt(connection, list(sources))
+
+    def release(self, connection: str, hashes: Iterable[str]) -> Set[str]:
+        """Drop a connection's claim on hashes; returns those no connection claims any more."""
+        return self.ns.docs.release(connection, list(hashes))
+
+    def memory_footprint(self) -> Dict[str, Any]:
+        """Bytes of the in-RAM search matrix versus a fully loaded float32 index."""
+        state = self.state
+        quantized = sum(seg.quant.nbytes for seg in state.segments if seg.quant is not None)
+        float32_bytes = state.total * state.dim * 4
+        return {
+            "rows": state.total,
+            "dim": state.dim,
+            "quantization": quantize.INDEX_QUANTIZATION,
+            "float32_bytes": float32_bytes,
+            "resident_bytes": quantized if quantize.INDEX_QUANTIZATION != "none" else float32_bytes,
+        }
+
+    @property
+    def heap_bytes(self) -> int:
+        """Memory the pool accounts this index for: arrays on the heap, not memory-mapped ones."""
+        state = self.state
+        total = _heap_nbytes(state.ids) + _heap_nbytes(state.dead) + int(getattr(state.ann, "nbytes", 0))
+        for seg in state.segments:
+            total += _heap_nbytes(seg.vectors) + _heap_nbytes(seg.ids) + _heap_nbytes(seg.dead)
+            total += _heap_nbytes(seg.assign) + (seg.quant.nbytes if seg.quant is not None else 0)
+        vectors = self._vectors
+        if vectors is not None and not any(vectors is seg.vectors for seg in state.segments):
+            total += _heap_nbytes(vectors)
+        return total
+
+    def content_hashes(self) -> Set[str]:
+        """Chunk content hashes present in the index, for de-duplicating ingest."""
+        hashes = self._hashes
+        if hashes is None:
+            hashes = self.ns.docs.hashes(self.state.next_row)
+            self._hashes = hashes
+        return hashes
+
+    def meta_at(self, row_id: int) -> Optional[Dict[str, Any]]:
+        """Metadata of one row, by row id."""
+        return self.ns.docs.get([row_id])[0]
+
+    def meta_for(self, row_ids: List[int]) -> List[Optional[Dict[str, Any]]]:
+        """Metadata for just these rows, read from the doc store in one query.
+
+        A row deleted after the search that returned it comes back as None.
+        """
+        return self.ns.docs.get(row_ids)
+
+    def search(self, query_vec: np.ndarray, k: int = 5, exact: bool = False) -> List[Tuple[int, float]]:
+        """Top-k ``(row_id, score)`` by cosine similarity.
+
+        Uses the ANN structure when one is built and the index is large enough;
+        otherwise scans each segment without concatenating them, over the
+        quantized codes with exact rescoring if quantization is enabled.
+        ``exact=True`` forces a full-precision brute-force scan. Tombstoned
+        rows are over-fetched and filtered out; should the ANN candidates run
+        short of ``k`` live rows the scan is used instead.
+        """
+        state = self.state
+        if state.ann is not None and not exact and state.total >= ann_lib.ANN_MIN_ROWS:
+            pos, scores = state.ann.search(query_vec, k + min(state.dead_count, 3 * k), state.gather)
+            live = [(int(p), float(s)) for p, s in zip(pos, scores) if p < state.total]
+            if state.dead is not None:
+                live = [(p, s) for p, s in live if not state.dead[p]]
+            if len(live) >= k or state.dead is None:
+                return [(int(state.ids[p]), s) for p, s in live[:k]]
+        hits: List[Tuple[int, float]] = []
+        for seg in state.segments:
+            kk = k + len(seg.dead)
+            if seg.quant is not None and not exact:
+                local, scores = seg.quant.search(query_vec, seg.vectors, kk)
+            else:
+                local, scores = top_k_with_scores(query_vec, seg.vectors, kk)
+            keep = ~np.isin(local, seg.dead) if len(seg.dead) else slice(None)
+            hits.extend((int(i), float(sc)) for i, sc in zip(seg.ids[local][keep], np.asarray(scores)[keep]))
+        hits.sort(key=lambda h: -h[1])
+        return hits[:k]
+
+    def search_batch(self, query_vecs: np.ndarray, k: int = 5) -> List[List[Tuple[int, float]]]:
+        """Exact top-k for many queries at once: one matrix multiply per segment block.
+
+        For batch runs this beats per-query search (ANN included) because the
+        whole query block shares a single pass over each segment's vectors;
+        segments are scanned in ``_SEARCH_BLOCK_ROWS`` slices to bound memory.
+        """
+        state = self.state
+        queries = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+        if state.total == 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+        ids_parts, score_parts = [], []
+        for seg in state.segments:
+            for start in range(0, seg.count, _SEARCH_BLOCK_ROWS):
+                sims = queries @ np.asarray(seg.vectors[start : start + _SEARCH_BLOCK_ROWS], dtype=np.float32).T
+                dead = seg.dead[(seg.dead >= start) & (seg.dead < start + sims.shape[1])] - start
+                sims[:, dead] = -np.inf
+                kk = min(k, sims.shape[1])
+                idx = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+                ids_parts.append(seg.ids[idx + start])
+                score_parts.append(np.take_along_axis(sims, idx, axis=1))
+        ids = np.hstack(ids_parts)
+        scores = np.hstack(score_parts)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        ids = np.take_along_axis(ids, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        return [
+            [(int(i), float(s)) for i, s in zip(row_ids, row_scores) if s != -np.inf]
+            for row_ids, row_scores in zip(ids, scores)
+        ]
+
+    def lexical_search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Top-k ``(row_id, bm25)`` from the doc store's FTS5 index."""
+        state = self.state
+        hits = self.ns.docs.search(query, k, state.next_row, RETRIEVAL_MAX_DF)
+        if state.dead is None or not hits:
+            return hits
+        # Tombstoned rows normally left the doc store already; this covers a crash in between
+        live = state.positions(np.array([i for i, _ in hits], dtype=np.int64)) >= 0
+        return [hit for hit, ok in zip(hits, live) if ok]
+
+    def hybrid_search(
+        self,
+        query: str,
+        query_vec: np.ndarray,
+        k: int = 5,
+        vector_hits: Optional[List[Tuple[int, float]]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Top-k ``(row_id, fused score)`` from cosine and BM25 rankings.
+
+        Exact terms (product names, error codes, metric names) that the
+        embedding model blurs are caught by BM25; the two rankings, each
+        ``RETRIEVAL_DEPTH`` deep, are combined by reciprocal rank fusion.
+        ``vector_hits`` lets batched callers pass a precomputed cosine ranking.
+        """
+        depth = max(k, RETRIEVAL_DEPTH)
+        if vector_hits is None:
+            vector_hits = self.search(query_vec, k=depth)
+        if not RETRIEVAL_HYBRID:
+            return vector_hits[:k]
+        return rrf_fuse([vector_hits, self.lexical_search(query, depth)], k)
+
+
+def _heap_nbytes(array: Optional[np.ndarray]) -> int:
+    """Bytes an array holds on the heap; memory-mapped arrays and views of them count 0."""
+    base = array
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return 0
+        base = getattr(base, "base", None)
+    return 0 if array is None else int(array.nbytes)
+
+
+class IndexPool:
+    """Namespace index handles, least recently queried first, bounded by a memory budget.
+
+    A namespace's index is loaded on its first query. Once the heap size of the
+    loaded indexes (``IndexHandle.heap_bytes``) exceeds ``budget_bytes``, the
+    coldest are dropped until it fits, their doc stores closed; the index just
+    queried always stays, even if it alone is larger. An evicted handle stays
+    valid for queries already holding it and is reloaded from disk the next
+    time its namespace is queried.
+    """
+
+    def __init__(self, budget_bytes: float = INDEX_POOL_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._handles: "OrderedDict[str, IndexHandle]" = OrderedDict()
+
+    def get(self, namespace: str = DEFAULT_NAMESPACE) -> IndexHandle:
+        name = _namespace(namespace).name
+        with self._lock:
+            handle = self._handles.get(name)
+            if handle is None:
+                handle = self._handles[name] = IndexHandle(name)
+            self._handles.move_to_end(name)
+        handle.refresh()
+        self._evict(keep=name)
+        return handle
+
+    def loaded(self, namespace: str) -> Optional[IndexHandle]:
+        """The namespace's handle if it is in the pool, without loading or touching it."""
+        with self._lock:
+            return self._handles.get(namespace)
+
+    def _evict(self, keep: str):
+        evicted = []
+        with self._lock:
+            sizes = {name: handle.heap_bytes for name, handle in self._handles.items()}
+            total = sum(sizes.values())
+            for name in list(self._handles):
+                if total <= self.budget_bytes:
+                    break
+                if name != keep:
+                    del self._handles[name]
+                    evicted.append(name)
+                    total -= sizes[name]
+                    if METRICS_ENABLED:
+                        INDEX_POOL_EVICTIONS.inc(namespace=name)
+        for name in evicted:
+            _release_namespace(name)
+        if METRICS_ENABLED:
+            INDEX_POOL_BYTES.set(total)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = {name: handle.heap_bytes for name, handle in self._handles.items()}
+        return {"budget_bytes": self.budget_bytes, "heap_bytes": sum(sizes.values()), "namespaces": sizes}
+
+
+_POOL = IndexPool()
+
 
+def get_index(namespace: str = DEFAULT_NAMESPACE) -> IndexHandle:
+    """Return the namespace's index handle, loading it on first use and reloading only if its manifest changed."""
+    return _POOL.get(namespace)
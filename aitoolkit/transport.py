@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import os
+import socket
+import threading
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One pooled, keep-alive session shared by LLM providers, web research and
+# connectors. Pool sizes are per host; retries back off on 429/5xx and honour
+# Retry-After. Callers that handle failure themselves (the LLM router, which
+# fails over to another route) use a second pool with no retries.
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "60"))
+HTTP_POOL_HOSTS = int(os.environ.get("HTTP_POOL_HOSTS", "32"))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.5"))
+
+Timeout = Union[float, Tuple[float, float]]
+
+_SESSIONS: Dict[bool, requests.Session] = {}
+_SESSION_LOCK = threading.Lock()
+
+
+def _build_session(retries: bool = True) -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=0,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry if retries else 0
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(retries: bool = True) -> requests.Session:
+    """The shared session; ``retries=False`` gives the one that never retries."""
+    session = _SESSIONS.get(retries)
+    if session is None:
+        with _SESSION_LOCK:
+            session = _SESSIONS.get(retries)
+            if session is None:
+                session = _SESSIONS[retries] = _build_session(retries)
+    return session
+
+
+def timeouts(read: Optional[float] = None) -> Tuple[float, float]:
+    """(connect, read) timeout; ``read`` overrides the configured default."""
+    read = HTTP_READ_TIMEOUT if read is None else read
+    return min(HTTP_CONNECT_TIMEOUT, read), read
+
+
+def request(
+    method: str, url: str, timeout: Optional[Timeout] = None, retries: bool = True, **kwargs
+) -> requests.Response:
+    if timeout is None or isinstance(timeout, (int, float)):
+        timeout = timeouts(timeout)
+    return get_session(retries).request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def close_response(response: requests.Response):
+    """Close a streaming response from another thread.
+
+    Shutting the socket down first wakes a reader blocked on it, which then
+    fails at once instead of waiting for the next byte or the read timeout.
+    """
+    conn = getattr(response.raw, "_connection", None) or getattr(response.raw, "connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+class StreamAbort:
+    """Handle another thread uses to abort an LLM stream mid-flight.
+
+    The provider code ``bind``s a callable that closes its open response;
+    ``abort`` runs it (or, if the response is not open yet, ``bind`` runs it
+    as soon as it is).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._close: Optional[Callable[[], None]] = None
+        self.aborted = False
+
+    def bind(self, close: Callable[[], None]):
+        with self._lock:
+            if not self.aborted:
+                self._close = close
+                return
+        close()
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            close, self._close = self._close, None
+        if close is not None:
+            close()
@@ -2,33 +2,54 @@ from __future__ import annotations
 
 import base64
 import json
+import os
 from typing import Any, Dict, List, Optional
 
 import gradio as gr
 import numpy as np
 
-from .agent import InitiativeAgent
-from .connectors.base import ConnectorConfig
-from .connectors.http import HTTPConnector
-from .connectors.upload import UploadConnector
-from .embeddings import embed_texts
+from .agent import GENERATION_MODE, get_agent
+from .jobs import get_job_queue
 from .prompts import DEFAULT_CATEGORIES
 from .storage import (
+    DEFAULT_NAMESPACE,
     Document,
-    append_to_index,
     ensure_data_dir,
+    list_namespaces,
     load_connections,
-    save_connections,
 )
 
+# How often the Data Sources tab refreshes job progress.
+INGEST_POLL_SECONDS = float(os.environ.get("INGEST_POLL_SECONDS", "2"))
+
 
 def _conn_to_row(c: Dict[str, Any]) -> List[str]:
-    return [c.get("name", "(unnamed)"), c.get("type", "?"), json.dumps(c.get("params", {}))[:80]]
+    return [
+        c.get("name", "(unnamed)"),
+        c.get("namespace", DEFAULT_NAMESPACE),
+        c.get("type", "?"),
+        json.dumps(c.get("params", {}))[:80],
+    ]
+
+
+def _job_to_row(j: Dict[str, Any]) -> List[Any]:
+    return [j["id"], j["name"], j["type"], j["status"], j["docs"], j["chunks"], j["removed"], (j["error"] or "")[:80]]
+
+
+def _conn_choices(conns: List[Dict[str, Any]]) -> List[Any]:
+    return [
+        (f"{c.get('name', '(unnamed)')} ({c.get('type', '?')}, {c.get('namespace', DEFAULT_NAMESPACE)})", c["id"])
+        for c in conns
+    ]
+
+
+def _namespace_choices(conns: List[Dict[str, Any]]) -> List[str]:
+    # Includes namespaces whose first source is still queued
+    return sorted(set(list_namespaces()) | {c.get("namespace", DEFAULT_NAMESPACE) for c in conns})
 
 
 def build_ui() -> gr.Blocks:
     ensure_data_dir()
-    agent = InitiativeAgent()
 
     with gr.Blocks(theme=gr.themes.Soft()) as demo:
         gr.Markdown("""
@@ -41,6 +62,11 @@ def build_ui() -> gr.Blocks:
             with gr.Row():
                 use_internal = gr.Checkbox(value=True, label="Use Data Sources")
                 use_web = gr.Checkbox(value=False, label="Use Web Research")
+                gen_ns = gr.Dropdown(
+                    choices=_namespace_choices(load_connections()),
+                    value=DEFAULT_NAMESPACE,
+                    label="Namespace",
+                )
             with gr.Row():
                 cats = gr.CheckboxGroup(
                     choices=DEFAULT_CATEGORIES,
@@ -49,48 +75,73 @@ def build_ui() -> gr.Blocks:
                 )
                 num_per = gr.Slider(1, 5, value=3, step=1, label="Initiatives per Category")
             constraints = gr.Textbox(label="Constraints (optional)", placeholder="comma-separated constraints", lines=2)
+            per_cat = gr.Checkbox(
+                value=GENERATION_MODE == "per_category", label="Generate categories in parallel"
+            )
             run = gr.Button("Generate", variant="primary")
             with gr.Row():
                 out_md = gr.Markdown(label="Plan", elem_id="output-md")
             with gr.Accordion("Details", open=False):
                 dbg = gr.Textbox(label="Debug Prompt", lines=6)
                 ctx = gr.JSON(label="Generation Context")
+                timings = gr.JSON(label="Timings & Usage")
 
-            def _on_generate(o, ui, ui_flag, uw_flag, cs, n):
+            def _on_generate(o, ui, ui_flag, uw_flag, cs, n, pc, ns):
                 parsed_constraints = [c.strip() for c in (cs or "").split(",") if c.strip()]
-                res = agent.generate(
+                # Stream partial Markdown so the plan starts rendering at the first token
+                for res in get_agent().generate_stream(
                     objective=o,
                     categories=ui,
                     use_internal=bool(ui_flag),
                     use_web=bool(uw_flag),
                     constraints=parsed_constraints,
                     num_per_category=int(n),
-                )
-                return res["output_markdown"], res["prompt"], {
-                    "used_internal": res["used_internal"],
-                    "used_web": res["used_web"],
-                    "context_count": res["context_count"],
-                }
+                    mode="per_category" if pc else "single",
+                    namespace=ns or DEFAULT_NAMESPACE,
+                ):
+                    yield res["output_markdown"], res["prompt"], {
+                        "used_internal": res["used_internal"],
+                        "used_web": res["used_web"],
+                        "context_count": res["context_count"],
+                        "context": res.get("context"),
+                        "cache": res.get("cache"),
+                        "mode": res.get("mode"),
+                        "failed_categories": res.get("failed_categories", []),
+                    }, res.get("trace")
 
             # Note: order of args must match function
-            run.click(_on_generate, [obj, cats, use_internal, use_web, constraints, num_per], [out_md, dbg, ctx])
+            run.click(
+                _on_generate,
+                [obj, cats, use_internal, use_web, constraints, num_per, per_cat, gen_ns],
+                [out_md, dbg, ctx, timings],
+            )
 
         with gr.Tab("Data Sources"):
-            gr.Markdown("Add and manage connections to multiple data sources.")
+            gr.Markdown(
+                "Add and manage connections to multiple data sources. "
+                "Each namespace (team or workspace) has its own index and is searched separately."
+            )
             with gr.Row():
                 table = gr.Dataframe(
-                    headers=["Name", "Type", "Params"],
+                    headers=["Name", "Namespace", "Type", "Params"],
                     value=[_conn_to_row(c) for c in load_connections()],
                     interactive=False,
                     label="Configured Connections",
                     row_count=(len(load_connections()) or 1),
-                    col_count=(3),
+                    col_count=(4),
                 )
             with gr.Row():
                 with gr.Column():
                     mode = gr.Radio(["Upload", "URL"], value="Upload", label="Connection Type")
                     name = gr.Textbox(label="Name", placeholder="e.g., Support CSV")
-                    upload = gr.File(label="Upload (CSV/JSON/TXT)", file_types=[".csv", ".json", ".txt"], type="filepath", visible=True)
+                    source_ns = gr.Dropdown(
+                        choices=_namespace_choices(load_connections()),
+                        value=DEFAULT_NAMESPACE,
+                        allow_custom_value=True,
+                        label="Namespace",
+                        info="Pick one or type a new name (lowercase letters, digits, - and _)",
+                    )
+                    upload = gr.File(label="Upload (CSV/JSON/JSONL/TXT)", file_types=[".csv", ".json", ".jsonl", ".txt"], type="filepath", visible=True)
                     url = gr.Textbox(label="URL", visible=False)
                     auth = gr.Dropdown(["none", "basic", "bearer"], value="none", label="Auth", visible=False)
                     username = gr.Textbox(label="Username", visible=False)
@@ -119,63 +170,90 @@ def build_ui() -> gr.Blocks:
                         )
                 mode.change(_toggle_fields, [mode], [upload, url, auth, username, password, token])
 
-                def _add_source(m, n, f, u, a, un, pw, tk):
-                    conns = load_connections()
-                    if m == "Upload":
-                        if f is None:
-                            raise gr.Error("Please upload a file.")
-                        # f is a filepath
-                        import os, mimetypes
-                        filename = os.path.basename(f)
-                        with open(f, "rb") as fh:
-                            content = fh.read()
-                        mime = mimetypes.guess_type(filename)[0] or "text/plain"
-                        cfg = ConnectorConfig(
-                            type="upload",
-                            name=n or filename,
-                            params={
-                                "filename": filename,
-                                "mime": mime,
-                                "content": content,
-                            },
-                        )
-                        docs = UploadConnector(cfg).fetch()
-                    else:
-                        if not u:
-                            raise gr.Error("Please provide a URL.")
-                        cfg = ConnectorConfig(
-                            type="http",
-                            name=n or u,
-                            params={
-                                "url": u,
-                                "auth_type": a or "none",
-                                "username": un or "",
-                                "password": pw or "",
-                                "token": tk or "",
-                            },
-                        )
-                        docs = HTTPConnector(cfg).fetch()
-
-                    # Embed and append
-                    vectors = embed_texts([d.text for d in docs])
-                    append_to_index(docs, vectors)
-
-                    # Save connection (without raw content)
-                    safe_params = dict(cfg.params)
-                    if safe_params.get("content"):
-                        safe_params["content"] = f"<bytes:{len(safe_params['content'])}>"
-                    conns.append({"type": cfg.type, "name": cfg.name, "params": safe_params})
-                    save_connections(conns)
-                    return [
-                        _conn_to_row(c) for c in conns
-                    ], gr.update(row_count=len(conns))
-
-                add_btn.click(
-                    _add_source,
-                    [mode, name, upload, url, auth, username, password, token],
-                    [table, table],
+                def _add_source(m, n, ns, f, u, a, un, pw, tk):
+                    try:
+                        if m == "Upload":
+                            if f is None:
+                                raise gr.Error("Please upload a file.")
+                            # f is a filepath
+                            import os, mimetypes
+                            filename = os.path.basename(f)
+                            mime = mimetypes.guess_type(filename)[0] or "text/plain"
+                            get_job_queue().submit(
+                                "upload", n or filename, {"filename": filename, "mime": mime, "path": f}, ns
+                            )
+                        else:
+                            if not u:
+                                raise gr.Error("Please provide a URL.")
+                            get_job_queue().submit(
+                                "http",
+                                n or u,
+                                {
+                                    "url": u,
+                                    "auth_type": a or "none",
+                                    "username": un or "",
+                                    "password": pw or "",
+                                    "token": tk or "",
+                                },
+                                ns,
+                            )
+                    except ValueError as ex:  # malformed namespace name
+                        raise gr.Error(str(ex))
+                    # Fetch, chunk, embed and index run on the ingestion workers;
+                    # the tables below pick up progress on the next poll
+                    return _refresh_tables()
+
+            with gr.Row():
+                refresh_conn = gr.Dropdown(
+                    choices=_conn_choices(load_connections()), label="Connection to refresh", scale=2
+                )
+                refresh_file = gr.File(
+                    label="New version (uploads only)",
+                    file_types=[".csv", ".json", ".jsonl", ".txt"],
+                    type="filepath",
+                    scale=2,
+                )
+                refresh_btn = gr.Button("Refresh Source", scale=1)
+
+            def _refresh_source(conn_id, f):
+                if not conn_id:
+                    raise gr.Error("Please choose a connection.")
+                try:
+                    # Only new or changed chunks are embedded; chunks no longer in the source are removed
+                    get_job_queue().refresh(conn_id, f)
+                except ValueError as ex:
+                    raise gr.Error(str(ex))
+                return _refresh_tables()
+
+            with gr.Row():
+                jobs_table = gr.Dataframe(
+                    headers=["Job", "Name", "Type", "Status", "Docs", "Chunks", "Removed", "Error"],
+                    value=[_job_to_row(j) for j in get_job_queue().list()],
+                    interactive=False,
+                    label="Ingestion Jobs",
                 )
 
+            def _refresh_tables():
+                conns = load_connections()
+                namespaces = _namespace_choices(conns)
+                return (
+                    gr.update(value=[_conn_to_row(c) for c in conns], row_count=len(conns) or 1),
+                    [_job_to_row(j) for j in get_job_queue().list()],
+                    gr.update(choices=_conn_choices(conns)),
+                    gr.update(choices=namespaces),
+                    gr.update(choices=namespaces),
+                )
+
+            tables = [table, jobs_table, refresh_conn, source_ns, gen_ns]
+            add_btn.click(
+                _add_source,
+                [mode, name, source_ns, upload, url, auth, username, password, token],
+                tables,
+            )
+            refresh_btn.click(_refresh_source, [refresh_conn, refresh_file], tables)
+            poll = gr.Timer(INGEST_POLL_SECONDS)
+            poll.tick(_refresh_tables, None, tables)
+
         with gr.Tab("About"):
             gr.Markdown(
                 """
@@ -1,14 +1,31 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlparse
 
-from duckduckgo_search import DDGS
 import requests
-from bs4 import BeautifulSoup
+
+from .http_cache import cached_get_text
+
+# Wall-clock budget for a whole research step (search + page fetches), bytes read
+# per page before the body is cut off, and simultaneous fetches per host.
+WEB_RESEARCH_BUDGET = float(os.environ.get("WEB_RESEARCH_BUDGET", "8"))
+WEB_MAX_BYTES = int(os.environ.get("WEB_MAX_BYTES", str(2 * 1024 * 1024)))
+WEB_PER_HOST_LIMIT = int(os.environ.get("WEB_PER_HOST_LIMIT", "2"))
+WEB_MAX_WORKERS = int(os.environ.get("WEB_MAX_WORKERS", "8"))
+
+_HOST_SLOTS: Dict[str, threading.BoundedSemaphore] = {}
+_HOST_SLOTS_LOCK = threading.Lock()
 
 
 def web_search(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
     """DuckDuckGo search (no API key). Returns list of {title, href, body}."""
+    from duckduckgo_search import DDGS
+
     results: List[Dict[str, Any]] = []
     with DDGS() as ddgs:
         for r in ddgs.text(query, max_results=max_results):
@@ -16,10 +33,32 @@ def web_search(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
     return results
 
 
-def fetch_page_text(url: str, timeout: int = 30) -> str:
-    r = requests.get(url, timeout=timeout)
-    r.raise_for_status()
-    html = r.text
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc.lower()
+    with _HOST_SLOTS_LOCK:
+        if host not in _HOST_SLOTS:
+            _HOST_SLOTS[host] = threading.BoundedSemaphore(WEB_PER_HOST_LIMIT)
+        return _HOST_SLOTS[host]
+
+
+def _read_capped(r: requests.Response, max_bytes: int, deadline: Optional[float]) -> str:
+    """Read at most ``max_bytes`` of the body, giving up once ``deadline`` passes."""
+    chunks: List[bytes] = []
+    size = 0
+    for chunk in r.iter_content(chunk_size=64 * 1024):
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"deadline exceeded reading {r.url}")
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    body = b"".join(chunks)[:max_bytes]
+    return body.decode(r.encoding or "utf-8", errors="ignore")
+
+
+def html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     for tag in soup(["script", "style", "noscript"]):
         tag.decompose()
@@ -28,3 +67,58 @@ def fetch_page_text(url: str, timeout: int = 30) -> str:
     lines = [l for l in lines if l]
     return "\n".join(lines)
 
+
+def fetch_page_text(
+    url: str,
+    timeout: float = 30,
+    max_bytes: int = WEB_MAX_BYTES,
+    deadline: Optional[float] = None,
+) -> str:
+    """Fetch a page's visible text through the shared HTTP cache.
+
+    With a ``deadline`` the request is made once, without the session's retries
+    and their backoff, so it cannot outlive the deadline by more than a chunk read.
+    """
+    if deadline is not None:
+        timeout = min(timeout, max(0.1, deadline - time.monotonic()))
+    text, _ = cached_get_text(
+        url,
+        lambda r: html_to_text(_read_capped(r, max_bytes, deadline)),
+        timeout=timeout,
+        variant="page",
+        retries=deadline is None,
+    )
+    return text
+
+
+def fetch_pages(urls: List[str], budget: float = WEB_RESEARCH_BUDGET, deadline: Optional[float] = None) -> Dict[str, str]:
+    """Fetch pages concurrently; return whatever finished before the deadline.
+
+    Fetches that have not started when the budget runs out are cancelled;
+    running ones make a single attempt with timeouts derived from the deadline
+    and abort between body chunks once it has passed, so their threads wind
+    down shortly after it.
+    """
+    deadline = deadline if deadline is not None else time.monotonic() + budget
+    results: Dict[str, str] = {}
+
+    def task(url: str):
+        slot = _host_slot(url)
+        if not slot.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            return
+        try:
+            if time.monotonic() < deadline:
+                results[url] = fetch_page_text(url, deadline=deadline)
+        finally:
+            slot.release()
+
+    urls = [u for u in dict.fromkeys(urls) if u]
+    if not urls:
+        return results
+    pool = ThreadPoolExecutor(max_workers=min(WEB_MAX_WORKERS, len(urls)), thread_name_prefix="web-fetch")
+    try:
+        futures = [pool.submit(task, u) for u in urls]
+        wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return {u: results[u] for u in urls if u in results}
@@ -1,16 +1,33 @@
 import os
 
+from aitoolkit import startup
+
 import gradio as gr
 from dotenv import load_dotenv
 
+from aitoolkit.metrics import mount_metrics
 from aitoolkit.ui import build_ui
 
 
 def main():
     load_dotenv(override=False)
+    startup.mark("imports")
     demo = build_ui()
+    startup.mark("ui_built")
     server_port = int(os.environ.get("PORT", 7860))
-    demo.queue().launch(server_name="0.0.0.0", server_port=server_port, show_error=True)
+    if startup.STARTUP_MODE == "eager":
+        startup.warm_up()
+    app, _, _ = demo.queue().launch(
+        server_name="0.0.0.0", server_port=server_port, show_error=True, prevent_thread_lock=True
+    )
+    # Prometheus scrape target on the same server, e.g. http://host:7860/metrics
+    mount_metrics(app)
+    startup.mark("launched")
+    if startup.STARTUP_MODE == "eager":
+        startup.write_report()
+    else:
+        startup.warm_up()
+    demo.block_thread()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+import argparse
+import json
+
+from dotenv import load_dotenv
+
+from aitoolkit.agent import BATCH_CONCURRENCY, InitiativeAgent
+from aitoolkit.batch import run_batch
+from aitoolkit.models import set_rate_limit
+
+
+def main():
+    load_dotenv(override=False)
+    parser = argparse.ArgumentParser(description="Generate initiative plans for a JSONL/CSV file of objectives.")
+    parser.add_argument("input", help="objectives .jsonl or .csv")
+    parser.add_argument("-o", "--output", default="plans.jsonl", help="results JSONL (appended to when resuming)")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--rate", type=float, help="max LLM requests per second for the configured provider")
+    parser.add_argument("--mode", choices=["single", "per_category"], help="default generation mode")
+    parser.add_argument("--web", action="store_true", help="enable web research for rows that do not set use_web")
+    parser.add_argument("--namespace", help="index to retrieve from for rows that do not set namespace")
+    parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of resuming")
+    args = parser.parse_args()
+
+    agent = InitiativeAgent()
+    if args.rate:
+        set_rate_limit(agent.llm.config.provider, args.rate)
+    defaults = {}
+    if args.mode:
+        defaults["mode"] = args.mode
+    if args.web:
+        defaults["use_web"] = True
+    if args.namespace:
+        defaults["namespace"] = args.namespace
+    summary = run_batch(
+        args.input,
+        args.output,
+        agent=agent,
+        concurrency=args.concurrency,
+        resume=not args.no_resume,
+        defaults=defaults,
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
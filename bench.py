@@ -0,0 +1,40 @@
+import argparse
+import json
+
+from aitoolkit.benchmark import BENCH_DIM, SUITES, run_benchmarks
+
+
+def _ints(value: str):
+    return [int(float(v)) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, retrieval, connectors and generation.")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--sizes", type=_ints, default=[1000, 10000, 100000], help="index corpus sizes, e.g. 1e3,1e4,1e6")
+    parser.add_argument("--dim", type=int, default=BENCH_DIM, help="synthetic vector width for the index suite")
+    parser.add_argument("--queries", type=int, default=50, help="queries per search benchmark")
+    parser.add_argument("--embed-texts", type=int, default=1000, help="texts embedded by the embed suite")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per synthetic upload file")
+    parser.add_argument("--requests", type=int, default=20, help="objectives generated by the generate suite")
+    parser.add_argument("-o", "--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        [s.strip() for s in args.suites.split(",") if s.strip()],
+        args.sizes,
+        dim=args.dim,
+        queries=args.queries,
+        embed_texts=args.embed_texts,
+        rows=args.rows,
+        requests=args.requests,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# Module-level paths (DATA_DIR, index and cache locations) are read at import time
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="aitoolkit-tests-"))
+os.environ.setdefault("RESPONSE_CACHE", "0")
+
+
+@pytest.fixture
+def serve():
+    """Start a local HTTP server for a handler class; returns its base URL."""
+    servers = []
+
+    def start(handler) -> str:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
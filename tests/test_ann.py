@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+import pytest
+
+from aitoolkit import ann, quantize, storage
+from aitoolkit.embeddings import top_k_with_scores
+from aitoolkit.quantize import QuantizedMatrix, recall_report
+
+K = 10
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """Overlapping clusters of unit vectors (embeddings are far from uniform) and queries near rows."""
+    rng = np.random.default_rng(7)
+    centers = rng.standard_normal((64, 48)).astype(np.float32)
+    rows = centers[rng.integers(0, 64, 8000)] + 1.5 * rng.standard_normal((8000, 48)).astype(np.float32)
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    queries = rows[rng.choice(len(rows), 50, replace=False)] + 0.1 * rng.standard_normal((50, 48)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return rows, queries
+
+
+def exact(rows, query):
+    return top_k_with_scores(query, rows, K)[0]
+
+
+def test_recall_at_k():
+    assert ann.recall_at_k(np.array([1, 2, 3]), np.array([3, 4, 1, 2])) == 0.75
+    assert ann.recall_at_k(np.array([]), np.array([])) == 1.0
+
+
+def test_ivf_recall_against_exact(corpus):
+    rows, queries = corpus
+    centroids = ann.train_ivf(rows, nlist=64)
+    index = ann.IVFFlatIndex(centroids)
+    # Two parts, as two appended segments would be
+    index.add(ann.assign(rows[:5000], centroids), 0)
+    index.add(ann.assign(rows[5000:], centroids), 5000)
+
+    def recall(nprobe):
+        found = [index.search(q, K, lambda ids: rows[ids], nprobe=nprobe)[0] for q in queries]
+        return np.mean([ann.recall_at_k(ids, exact(rows, q)) for ids, q in zip(found, queries)])
+
+    assert recall(8) >= 0.85
+    assert recall(2) < recall(8) < recall(32)
+    # Probing every list is exhaustive
+    assert recall(64) == 1.0
+
+
+@pytest.mark.parametrize("kind", ["int8", "float16"])
+def test_quantized_recall_against_exact(corpus, kind):
+    rows, queries = corpus
+    quant = QuantizedMatrix.from_vectors(rows, kind)
+    assert quant.nbytes < rows.nbytes / 1.9
+    recalls = [ann.recall_at_k(quant.search(q, rows, K)[0], exact(rows, q)) for q in queries]
+    assert np.mean(recalls) >= 0.98
+
+
+def test_index_recall_report_with_ivf_and_int8(corpus, monkeypatch):
+    rows, queries = corpus
+    monkeypatch.setattr(ann, "ANN_BACKEND", "ivf")
+    monkeypatch.setattr(ann, "ANN_MIN_ROWS", 1000)
+    monkeypatch.setattr(ann, "ANN_NLIST", 64)
+    monkeypatch.setattr(quantize, "INDEX_QUANTIZATION", "int8")
+    docs = [storage.Document(f"row {i}", "test://recall", {"hash": f"recall-{i}"}) for i in range(len(rows))]
+    storage.append_to_index(docs[:4000], rows[:4000], namespace="recall")
+    storage.append_to_index(docs[4000:], rows[4000:], namespace="recall")
+    # An append past ANN_MIN_ROWS may already be building it in the background
+    deadline = time.monotonic() + 30
+    while not isinstance(storage.get_index("recall").state.ann, ann.IVFFlatIndex):
+        storage.build_ann_index(namespace="recall")
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    report = recall_report(storage.get_index("recall"), queries, k=K)
+    assert report["quantization"] == "int8"
+    assert report["recall@10"] >= 0.85
@@ -0,0 +1,38 @@
+import json
+
+import numpy as np
+
+from aitoolkit import agent as agent_module
+from aitoolkit.batch import _normalize, run_batch
+from aitoolkit.models import LLMClient, LLMConfig
+
+
+def fake_embed(texts):
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((len(texts), 8)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_normalize_lowercases_namespace():
+    assert _normalize({"objective": "x", "namespace": " Team-A "}, 1)["namespace"] == "team-a"
+
+
+def test_invalid_namespace_fails_only_its_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(agent_module, "embed_texts", fake_embed)
+    source = tmp_path / "objectives.jsonl"
+    rows = [{"id": "ok", "objective": "cut costs"}, {"id": "bad", "objective": "grow", "namespace": "team a!"}]
+    source.write_text("\n".join(json.dumps(r) for r in rows) + "\n")
+    out = tmp_path / "plans.jsonl"
+    summary = run_batch(str(source), str(out), agent=agent_module.InitiativeAgent(LLMClient(LLMConfig(provider="stub"))), resume=False)
+    assert summary == {"skipped": 0, "succeeded": 1, "failed": 1}
+    records = {r["id"]: r for r in map(json.loads, out.read_text().splitlines())}
+    assert records["ok"]["output_markdown"] and "error" not in records["ok"]
+    assert "Invalid namespace" in records["bad"]["error"]
+
+
+def test_non_positive_group_size_prompts_one_category_each(monkeypatch):
+    monkeypatch.setattr(agent_module, "embed_texts", fake_embed)
+    agent = agent_module.InitiativeAgent(LLMClient(LLMConfig(provider="stub")))
+    result = agent.generate("cut costs", categories=["Ops", "Sales"], use_internal=False, mode="per_category", group_size=0)
+    prompts = result["prompt"].split("\n\n---\n\n")
+    assert len(prompts) == 2 and "Ops" in prompts[0] and "Sales" in prompts[1]
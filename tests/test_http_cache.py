@@ -0,0 +1,99 @@
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from aitoolkit.http_cache import HTTPCache
+
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class Origin(BaseHTTPRequestHandler):
+    """Serves versioned text; ``requests`` logs (path, status) of every request."""
+
+    protocol_version = "HTTP/1.1"
+    version = {"/etag": 1, "/modified": 1}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = f"{self.path} v{self.version.get(self.path, 1)}".encode()
+        headers = {"Content-Type": "text/plain"}
+        status = 200
+        if self.path == "/etag":
+            etag = f'"v{self.version["/etag"]}"'
+            headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+            if self.headers.get("If-None-Match") == etag:
+                status = 304
+        elif self.path == "/modified":
+            headers.update({"Last-Modified": LAST_MODIFIED, "Cache-Control": "max-age=0"})
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED and self.version["/modified"] == 1:
+                status = 304
+        elif self.path == "/fresh":
+            headers["Cache-Control"] = "max-age=60"
+        elif self.path == "/private":
+            body = f"for {self.headers.get('Authorization')}".encode()
+            headers["Cache-Control"] = "max-age=60"
+        elif self.path == "/no-store":
+            headers["Cache-Control"] = "no-store"
+        self.requests.append((self.path, status))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0" if status == 304 else str(len(body)))
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def origin(serve):
+    Origin.version = {"/etag": 1, "/modified": 1}
+    Origin.requests = []
+    return serve(Origin)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HTTPCache(path=str(tmp_path / "http_cache.sqlite"), ttl=60)
+
+
+def text(r):
+    return r.text
+
+
+def test_etag_revalidation(origin, cache):
+    assert cache.fetch(f"{origin}/etag", text)[0] == "/etag v1"
+    assert cache.fetch(f"{origin}/etag", text)[0] == "/etag v1"
+    assert Origin.requests == [("/etag", 200), ("/etag", 304)]
+    Origin.version["/etag"] = 2
+    assert cache.fetch(f"{origin}/etag", text)[0] == "/etag v2"
+    assert cache.stats()["revalidated"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_last_modified_revalidation(origin, cache):
+    assert cache.fetch(f"{origin}/modified", text)[0] == "/modified v1"
+    assert cache.fetch(f"{origin}/modified", text)[0] == "/modified v1"
+    assert Origin.requests == [("/modified", 200), ("/modified", 304)]
+
+
+def test_fresh_entries_skip_the_network(origin, cache):
+    for _ in range(3):
+        assert cache.fetch(f"{origin}/fresh", text)[0] == "/fresh v1"
+    assert Origin.requests == [("/fresh", 200)]
+    assert cache.stats()["hits"] == 2
+
+
+def test_entries_are_keyed_by_credentials(origin, cache):
+    alice = cache.fetch(f"{origin}/private", text, headers={"Authorization": "Bearer alice"})[0]
+    bob = cache.fetch(f"{origin}/private", text, headers={"Authorization": "Bearer bob"})[0]
+    assert (alice, bob) == ("for Bearer alice", "for Bearer bob")
+    assert cache.fetch(f"{origin}/private", text, headers={"Authorization": "Bearer alice"})[0] == alice
+    assert len(Origin.requests) == 2
+
+
+def test_no_store_is_not_cached(origin, cache):
+    cache.fetch(f"{origin}/no-store", text)
+    cache.fetch(f"{origin}/no-store", text)
+    assert Origin.requests == [("/no-store", 200), ("/no-store", 200)]
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from aitoolkit import storage
+
+
+def test_listing_and_normalizing_do_not_register_namespaces(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, "NAMESPACES_DIR", str(tmp_path))
+    for name in ("team-a", "empty", "Not Valid"):
+        os.makedirs(tmp_path / name)
+    (tmp_path / "team-a" / "manifest.json").write_text("{}")
+    before = set(storage._NAMESPACES)
+    for _ in range(3):  # as the UI polls
+        assert storage.list_namespaces() == ["default", "team-a"]
+    assert storage.normalize_namespace(" Team-B ") == "team-b"
+    assert storage.normalize_namespace("") == storage.DEFAULT_NAMESPACE
+    with pytest.raises(ValueError):
+        storage.normalize_namespace("team b!")
+    assert set(storage._NAMESPACES) == before
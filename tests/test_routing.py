@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from aitoolkit import routing
+from aitoolkit.metrics import Trace
+from aitoolkit.models import LLMConfig
+from aitoolkit.routing import LLMRouter, parse_routes
+
+
+def provider(reply: str, status: int = 200, delay: float = 0.0, stall: bool = False):
+    """Handler for a mock OpenAI-compatible chat endpoint.
+
+    ``stall`` sends the stream's headers and then no token until the client
+    hangs up; ``hits`` counts requests and ``closed`` is set once a stalled
+    stream's client disconnected.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        hits = 0
+        closed = threading.Event()
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            type(self).hits += 1
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if status != 200:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            time.sleep(delay)
+            if not body["stream"]:
+                data = json.dumps({"choices": [{"message": {"content": reply}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.flush()
+            if stall:
+                self.connection.settimeout(10)
+                self.connection.recv(1)  # returns once the client closes
+                type(self).closed.set()
+                return
+            for word in reply.split(" "):
+                self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}}]})}\n\n".encode())
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    return Handler
+
+
+def router(*urls: str, hedge: bool = False) -> LLMRouter:
+    spec = ",".join(f"together:mock-{i}@{url}/v1" for i, url in enumerate(urls))
+    return LLMRouter(parse_routes(spec, LLMConfig(provider="stub")), hedge=hedge)
+
+
+def outcomes(trace: Trace):
+    return [(d["route"].split("@")[0], d["outcome"]) for d in trace.to_dict()["routing"]]
+
+
+def test_failover_is_immediate(serve):
+    failing = provider("", status=500)
+    r = router(serve(failing), serve(provider("fallback reply")))
+    trace = Trace()
+    start = time.perf_counter()
+    assert r.generate("hi", trace=trace) == "fallback reply"
+    # No HTTP-level retries (and their backoff) before moving on
+    assert time.perf_counter() - start < 1.0
+    assert failing.hits == 1
+    assert outcomes(trace) == [("together:mock-0", "error"), ("together:mock-1", "ok")]
+
+
+def test_breaker_opens_after_repeated_failures(serve, monkeypatch):
+    failing = provider("", status=503)
+    r = router(serve(failing), serve(provider("ok")))
+    for _ in range(routing.LLM_BREAKER_FAILURES):
+        r.generate("hi")
+    trace = Trace()
+    assert r.generate("hi", trace=trace) == "ok"
+    assert outcomes(trace)[0] == ("together:mock-0", "breaker_open")
+    assert failing.hits == routing.LLM_BREAKER_FAILURES
+
+
+def test_stream_fails_over_before_the_first_token(serve):
+    r = router(serve(provider("", status=502)), serve(provider("streamed reply")))
+    assert "".join(r.generate_stream("hi")).split() == ["streamed", "reply"]
+
+
+def test_all_routes_failing_raises(serve):
+    r = router(serve(provider("", status=500)), serve(provider("", status=500)))
+    with pytest.raises(Exception):
+        r.generate("hi")
+
+
+def test_hedge_cancels_a_stalled_route(serve, monkeypatch):
+    monkeypatch.setattr(routing, "LLM_HEDGE_DELAY", 0.2)
+    stalled = provider("", stall=True)
+    r = router(serve(stalled), serve(provider("backup reply")), hedge=True)
+    trace = Trace()
+    assert "".join(r.generate_stream("hi", trace=trace)).split() == ["backup", "reply"]
+    assert outcomes(trace) == [("together:mock-0", "cancelled"), ("together:mock-1", "ok")]
+    # The loser's connection is closed on cancel, not at its next token or read timeout
+    assert stalled.closed.wait(2.0)
+
+
+def test_cancelled_attempts_count_towards_the_hedge_delay(serve, monkeypatch):
+    monkeypatch.setattr(routing, "LLM_HEDGE_MIN_SAMPLES", 3)
+    r = router(serve(provider("", stall=True)), serve(provider("backup reply", delay=0.3)), hedge=True)
+    state = routing.route_state(routing.route_name(r.configs[0]))
+    for _ in range(3):
+        state.add_ttft(0.01)  # the route used to be fast
+    for _ in range(3):
+        assert "".join(r.generate_stream("hi")).split() == ["backup", "reply"]
+    # Each loss is sampled at its waiting time (>= the backup's 0.3 s), so the p95 follows the slowdown
+    assert state.hedge_delay() >= 0.3
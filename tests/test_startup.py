@@ -0,0 +1,16 @@
+from aitoolkit import agent, embeddings, startup, storage
+
+
+def test_warm_up_records_an_index_error_and_carries_on(monkeypatch):
+    def broken_index(*args, **kwargs):
+        raise OSError("manifest unreadable")
+
+    monkeypatch.setattr(storage, "get_index", broken_index)
+    monkeypatch.setattr(embeddings, "_encode", lambda texts: None)
+    monkeypatch.setattr(agent, "get_agent", lambda: None)
+    monkeypatch.setattr(startup, "_ERRORS", {})
+    monkeypatch.setattr(startup, "_MARKS", {})
+    startup._warm(write=False)
+    rep = startup.report()
+    assert rep["errors"] == {"index": "OSError: manifest unreadable"}
+    assert "index_ready" not in rep["marks"] and {"embedding_ready", "llm_ready", "ready"} <= set(rep["marks"])
@@ -0,0 +1,30 @@
+import json
+
+from aitoolkit.connectors.base import ConnectorConfig
+from aitoolkit.connectors.upload import UploadConnector
+
+
+def fetch(content: bytes, filename: str = "data.json"):
+    config = ConnectorConfig(type="upload", name="test", params={"filename": filename, "content": content})
+    return [(doc.metadata["mime"], doc.text) for doc in UploadConnector(config).fetch()]
+
+
+def test_json_array_is_read_record_by_record():
+    assert fetch(b'[1, {"x": 2}]') == [("application/json", '[1, {"x": 2}]')]
+
+
+def test_ndjson_saved_as_json_keeps_every_line():
+    parts = fetch(b'{"a": 1}\n{"b": 2}\n{"c": [3, 4]}\n')
+    assert [mime for mime, _ in parts] == ["application/json"]
+    assert json.loads(parts[0][1]) == [{"a": 1}, {"b": 2}, {"c": [3, 4]}]
+
+
+def test_malformed_json_falls_back_to_text():
+    parts = fetch(b'[1, 2, {"x": oops}, 4]\ntrailing notes\n')
+    assert parts[0] == ("application/json", "[1, 2]")
+    assert parts[1][0] == "text/plain"
+    assert '{"x": oops}' in parts[1][1] and "trailing notes" in parts[1][1]
+
+
+def test_plain_text_named_json_is_indexed_as_text():
+    assert fetch(b"meeting notes\nsecond line\n") == [("text/plain", "meeting notes\nsecond line\n")]
@@ -0,0 +1,46 @@
+import time
+from http.server import BaseHTTPRequestHandler
+
+from aitoolkit.web import fetch_pages
+
+
+class Site(BaseHTTPRequestHandler):
+    """``/busy`` always answers 503; ``/slow`` stalls past any test budget."""
+
+    protocol_version = "HTTP/1.1"
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        Site.hits[self.path] = Site.hits.get(self.path, 0) + 1
+        if self.path == "/busy":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/slow":
+            time.sleep(3)
+        body = f"<html><body><p>{self.path} text</p></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_research_fetches_are_not_retried(serve):
+    Site.hits = {}
+    site = serve(Site)
+    assert fetch_pages([f"{site}/busy", f"{site}/page"], budget=2.0) == {f"{site}/page": "/page text"}
+    assert Site.hits["/busy"] == 1
+
+
+def test_fetch_pages_returns_at_the_deadline(serve):
+    Site.hits = {}
+    site = serve(Site)
+    start = time.monotonic()
+    assert fetch_pages([f"{site}/slow", f"{site}/page"], budget=0.5) == {f"{site}/page": "/page text"}
+    assert time.monotonic() - start < 1.5